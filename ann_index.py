@@ -0,0 +1,228 @@
+# Kanan AI – approximate nearest-neighbour index for large face galleries
+# Pure NumPy inverted-file (IVF) index over 128-d face encodings.
+# Vectors are bucketed by their nearest k-means centroid; a query only scans
+# the n_probe closest buckets, so n_probe trades recall for latency.
+
+import os
+
+import numpy as np
+
+from face_gallery import ENCODING_DIM, _as_matrix, pairwise_distances
+
+DEFAULT_N_PROBE = 8
+MIN_TRAIN_SIZE = 1024  # below this an exact scan is already fast
+
+
+def _kmeans(data: np.ndarray, k: int, iters: int = 12, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd's k-means with random init; returns (k, dim) centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = pairwise_distances(data, centroids).argmin(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        # Re-seed empty clusters from random points so every list is usable
+        if empty.any():
+            sums[empty] = data[rng.choice(len(data), size=int(empty.sum()))]
+            counts[empty] = 1
+        centroids = (sums / counts[:, None]).astype(np.float32)
+    return centroids
+
+
+class _Bucket:
+    """Growable contiguous block of vectors plus their row ids.
+
+    Readers only look at `rows`, a (vecs, ids, sq) tuple swapped in whole
+    after the new slots are written; slots already published are never
+    rewritten, so a search never sees the three arrays at different lengths.
+    """
+
+    def __init__(self):
+        self._vecs = np.empty((8, ENCODING_DIM), dtype=np.float32)
+        self._ids = np.empty(8, dtype=np.int64)
+        self._sq = np.empty(8, dtype=np.float32)  # squared norms, reused by every query
+        self.n = 0
+        self.rows = (self._vecs[:0], self._ids[:0], self._sq[:0])
+
+    def extend(self, vecs: np.ndarray, ids: np.ndarray) -> None:
+        need = self.n + len(vecs)
+        if need > len(self._vecs):
+            cap = max(need, 2 * len(self._vecs))
+            v = np.empty((cap, ENCODING_DIM), dtype=np.float32)
+            v[:self.n] = self._vecs[:self.n]
+            i = np.empty(cap, dtype=np.int64)
+            i[:self.n] = self._ids[:self.n]
+            sq = np.empty(cap, dtype=np.float32)
+            sq[:self.n] = self._sq[:self.n]
+            self._vecs, self._ids, self._sq = v, i, sq
+        self._vecs[self.n:need] = vecs
+        self._ids[self.n:need] = ids
+        self._sq[self.n:need] = np.einsum("ij,ij->i", vecs, vecs)
+        self.rows = (self._vecs[:need], self._ids[:need], self._sq[:need])
+        self.n = need
+
+
+class IVFIndex:
+    """Inverted-file index returning (distances, row ids) like an exact scan.
+
+    Rows are numbered in insertion order. Until the index has been trained
+    (explicitly or automatically once MIN_TRAIN_SIZE rows are present) it
+    answers queries exactly.
+
+    One thread may add or train while others search: searches read a single
+    (centroids, buckets, pending) tuple that writers replace whole.
+    """
+
+    def __init__(self, n_lists=None, n_probe: int = DEFAULT_N_PROBE,
+                 min_train_size: int = MIN_TRAIN_SIZE, seed: int = 0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_train_size = min_train_size
+        self.seed = seed
+        self._state = (None, (), ())   # (centroids, buckets, rows added before training)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def centroids(self):
+        return self._state[0]
+
+    @property
+    def trained(self) -> bool:
+        return self._state[0] is not None
+
+    # ---------- building ----------
+    def train(self, vectors=None) -> None:
+        """Fit centroids (on `vectors`, or on every row added so far) and bucket all rows."""
+        centroids, buckets, pending = self._state
+        pending_ids = None
+        if centroids is not None:
+            if vectors is None:
+                return  # already trained on the rows it holds
+            # Retraining on new vectors: re-bucket every row already indexed
+            rows = [b.rows for b in buckets if b.n]
+            pending = tuple(r[0] for r in rows)
+            pending_ids = np.concatenate([r[1] for r in rows]) if rows else None
+        pending = np.concatenate(pending) if pending else np.empty((0, ENCODING_DIM), dtype=np.float32)
+        data = pending if vectors is None else _as_matrix(vectors)
+        if not len(data):
+            return
+        k = self.n_lists or max(1, int(np.sqrt(len(data))))
+        k = min(k, len(data))
+        # k-means on a bounded sample keeps training time flat for huge galleries
+        rng = np.random.default_rng(self.seed)
+        sample = data if len(data) <= 64 * k else data[rng.choice(len(data), 64 * k, replace=False)]
+        centroids = _kmeans(sample, k, seed=self.seed)
+        buckets = tuple(_Bucket() for _ in range(k))
+        if len(pending):
+            ids = np.arange(len(pending)) if pending_ids is None else pending_ids
+            _assign(centroids, buckets, pending, ids)
+        # Publish only once every row is bucketed
+        self.n_lists = k
+        self._state = (centroids, buckets, ())
+
+    def add(self, vectors) -> np.ndarray:
+        """Insert rows incrementally; returns their row ids."""
+        vecs = _as_matrix(vectors)
+        ids = np.arange(self._count, self._count + len(vecs))
+        centroids, buckets, pending = self._state
+        if centroids is not None:
+            _assign(centroids, buckets, vecs, ids)
+            self._count += len(vecs)
+        else:
+            self._state = (None, (), pending + (vecs,))
+            self._count += len(vecs)
+            if self._count >= self.min_train_size:
+                self.train()
+        return ids
+
+    # ---------- search ----------
+    def search(self, probes, k: int = 1, n_probe=None):
+        """k nearest rows per probe: (distances (P, k), ids (P, k)), -1 where missing."""
+        probes = _as_matrix(probes)
+        P = len(probes)
+        centroids, buckets, pending = self._state
+        if not P or (centroids is None and not pending):
+            return np.full((P, k), np.inf, dtype=np.float32), np.full((P, k), -1, dtype=np.int64)
+
+        if centroids is None:
+            data = np.concatenate(pending)
+            return self._topk(pairwise_distances(probes, data), np.arange(len(data)), k)
+
+        n_lists = len(centroids)
+        n_probe = min(n_probe or self.n_probe, n_lists)
+        cd = pairwise_distances(probes, centroids)
+        probe_lists = np.argpartition(cd, n_probe - 1, axis=1)[:, :n_probe] \
+            if n_probe < n_lists else np.broadcast_to(np.arange(n_lists), (P, n_lists))
+
+        # Gather every bucket any probe selected and score them in one product;
+        # rows from buckets a probe did not select are masked out afterwards.
+        picked = [(l, buckets[l].rows) for l in np.unique(probe_lists)]
+        picked = [(l, r) for l, r in picked if len(r[1])]
+        if not picked:
+            return np.full((P, k), np.inf, dtype=np.float32), np.full((P, k), -1, dtype=np.int64)
+        vecs = np.concatenate([r[0] for _, r in picked])
+        ids = np.concatenate([r[1] for _, r in picked])
+        sq = np.concatenate([r[2] for _, r in picked])
+        d = pairwise_distances(probes, vecs, sq)
+        if P > 1 and n_probe < n_lists:
+            # Each candidate row's list id, looked up in a mask over all lists
+            row_list = np.repeat([l for l, _ in picked], [len(r[1]) for _, r in picked])
+            selected = np.zeros((P, n_lists), dtype=bool)
+            selected[np.arange(P)[:, None], probe_lists] = True
+            d[~selected[:, row_list]] = np.inf
+        return self._topk(d, ids, k)
+
+    @staticmethod
+    def _topk(d: np.ndarray, ids: np.ndarray, k: int):
+        """Sorted k smallest entries per row of d, mapped through ids."""
+        P, M = d.shape
+        out_d = np.full((P, k), np.inf, dtype=np.float32)
+        out_i = np.full((P, k), -1, dtype=np.int64)
+        m = min(k, M)
+        part = np.argpartition(d, m - 1, axis=1)[:, :m] if m < M else \
+            np.broadcast_to(np.arange(M), (P, M))
+        part_d = np.take_along_axis(d, part, axis=1)
+        order = np.argsort(part_d, axis=1, kind="stable")
+        part = np.take_along_axis(part, order, axis=1)
+        out_d[:, :m] = np.take_along_axis(part_d, order, axis=1)
+        out_i[:, :m] = np.where(np.isfinite(out_d[:, :m]), ids[part], -1)
+        return out_d, out_i
+
+
+def _assign(centroids: np.ndarray, buckets, vecs: np.ndarray, ids: np.ndarray) -> None:
+    lists = pairwise_distances(vecs, centroids).argmin(axis=1)
+    for l in np.unique(lists):
+        sel = lists == l
+        buckets[l].extend(vecs[sel], ids[sel])
+
+
+# ---------- builders ----------
+def build_from_npy(path: str = "faces_data.npy", **kwargs):
+    """Index the legacy pickled {"encodings", "names"} file. Returns (index, names)."""
+    data = np.load(path, allow_pickle=True).item()
+    index = IVFIndex(**kwargs)
+    if len(data["names"]):
+        index.add(data["encodings"])
+    return index, list(data["names"])
+
+
+def build_from_folder(folder: str = "uploads", **kwargs):
+    """Encode every image in folder (name = file stem). Returns (index, names)."""
+    import face_recognition
+
+    index = IVFIndex(**kwargs)
+    names = []
+    for fn in sorted(os.listdir(folder)):
+        if not fn.lower().endswith((".jpg", ".jpeg", ".png")):
+            continue
+        img = face_recognition.load_image_file(os.path.join(folder, fn))
+        enc = face_recognition.face_encodings(img)
+        if enc:
+            index.add(enc[0])
+            names.append(os.path.splitext(fn)[0])
+    return index, names
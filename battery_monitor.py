@@ -0,0 +1,209 @@
+# Kanan AI – battery, temperature and load aware power governor
+# A battery source is anything with read() -> BatteryReading or None:
+#   SysfsBattery  /sys/class/power_supply/BAT*/{capacity,status} (UPS HATs, laptops)
+#   FileBattery   a text file "42" or "42 charging" (testing, or a helper
+#                 script that polls an INA219 / Pico and writes the file)
+# PowerGovernor polls the source, the CPU temperature and the load average
+# and picks a performance tier. Each tier sets how often and at what
+# resolution faces are detected, how often frames go to the cloud and the
+# camera capture rate. Stepping down happens at once; stepping back up
+# waits for `hold` polls in a row, so a tier does not flap at a threshold.
+
+import glob
+import logging
+import os
+import threading
+from collections import namedtuple
+
+import metrics
+
+log = logging.getLogger("kanan.power")
+
+BatteryReading = namedtuple("BatteryReading", ["percent", "charging"])
+
+# detect_fps     max frames per second through face detection/tracking (None = every frame)
+# detect_every   full HOG detection every N processed frames, optical flow in between
+# detect_width   width of the image faces are detected in (height keeps the aspect ratio)
+# cloud_interval seconds between cloud uploads (None = no uploads)
+# capture_fps    frames decoded per second by the camera thread (None = camera rate)
+Tier = namedtuple("Tier", ["name", "detect_fps", "detect_every", "detect_width",
+                           "cloud_interval", "capture_fps"])
+
+TIERS = [
+    Tier("performance", None, 5,  320, 4.0,  None),
+    Tier("balanced",    10.0, 5,  320, 6.0,  15.0),
+    Tier("saver",       5.0,  8,  256, 12.0, 10.0),
+    Tier("critical",    2.0,  12, 192, None, 5.0),
+]
+TIER_NAMES = [t.name for t in TIERS]
+
+# Lowest tier index each condition allows (checked top to bottom, first match wins)
+BATTERY_RULES = [(15, 3), (35, 2), (60, 1)]     # percent <= threshold -> tier
+TEMP_RULES = [(80.0, 3), (75.0, 2), (70.0, 1)]  # deg C >= threshold -> tier (Pi throttles at 80-85)
+LOAD_RULES = [(2.0, 2), (1.2, 1)]               # 1-minute load per core >= threshold -> tier
+
+
+class FileBattery:
+    """Reads "percent [charging]" from a text file; missing/unreadable file -> None."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                parts = fh.read().split()
+            return BatteryReading(float(parts[0]), len(parts) > 1 and parts[1].lower() == "charging")
+        except (OSError, ValueError, IndexError):
+            return None
+
+
+class SysfsBattery:
+    """Linux power_supply battery (capacity in percent, status Charging/Full/Discharging)."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @classmethod
+    def find(cls, root="/sys/class/power_supply"):
+        for path in sorted(glob.glob(os.path.join(root, "*"))):
+            try:
+                with open(os.path.join(path, "type"), encoding="utf-8") as fh:
+                    if fh.read().strip() == "Battery":
+                        return cls(path)
+            except OSError:
+                continue
+        return None
+
+    def read(self):
+        try:
+            with open(os.path.join(self.path, "capacity"), encoding="utf-8") as fh:
+                percent = float(fh.read().strip())
+            with open(os.path.join(self.path, "status"), encoding="utf-8") as fh:
+                status = fh.read().strip().lower()
+        except (OSError, ValueError):
+            return None
+        return BatteryReading(percent, status in ("charging", "full"))
+
+
+def battery_source():
+    """KANAN_BATTERY_FILE if set, else the first sysfs battery, else None (mains powered)."""
+    path = os.environ.get("KANAN_BATTERY_FILE")
+    if path:
+        return FileBattery(path)
+    return SysfsBattery.find()
+
+
+def cpu_temperature(path="/sys/class/thermal/thermal_zone0/temp"):
+    """SoC temperature in deg C, or None where the kernel does not expose it."""
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return int(fh.read().strip()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+
+def cpu_load():
+    """1-minute load average per core, or None."""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (OSError, AttributeError):
+        return None
+
+
+def _rule_tier(value, rules, above: bool) -> int:
+    if value is None:
+        return 0
+    for threshold, tier in rules:
+        if (value >= threshold) if above else (value <= threshold):
+            return tier
+    return 0
+
+
+class PowerGovernor(threading.Thread):
+    """Polls battery/temperature/load every `interval` seconds and sets `tier`.
+
+    on_change(old, new) runs on the governor thread after each tier change.
+    pin (a tier name, e.g. from KANAN_POWER_TIER) fixes the tier regardless of inputs;
+    an unknown name is logged and ignored.
+    """
+
+    def __init__(self, source=None, interval: float = 10.0, on_change=None, hold: int = 3,
+                 temp_fn=cpu_temperature, load_fn=cpu_load, pin=None):
+        super().__init__(name="power-governor", daemon=True)
+        self.source = source
+        self.interval = interval
+        self.on_change = on_change
+        self.hold = hold
+        self.temp_fn = temp_fn
+        self.load_fn = load_fn
+        if pin and pin not in TIER_NAMES:
+            log.warning(f"Unknown power tier {pin!r} (use one of {', '.join(TIER_NAMES)}); not pinning")
+            pin = None
+        self.pin = pin
+        self.tier = TIERS[TIER_NAMES.index(pin)] if pin else TIERS[0]
+        self.battery = None       # last BatteryReading (None: no battery or unreadable)
+        self.temperature = None
+        self.load = None
+        self.changes = 0
+        self._better = 0          # polls in a row that asked for a higher-performance tier
+        self._halt = threading.Event()
+        metrics.gauge("kanan_power_tier", "Performance tier (0 = performance ... 3 = critical)",
+                      fn=lambda: TIERS.index(self.tier))
+        metrics.gauge("kanan_battery_percent", "Battery charge",
+                      fn=lambda: self.battery.percent if self.battery else float("nan"))
+        metrics.gauge("kanan_cpu_temperature_celsius", "SoC temperature",
+                      fn=lambda: self.temperature if self.temperature is not None else float("nan"))
+
+    def wanted(self) -> int:
+        """Tier index the current readings call for (the most conservative rule wins)."""
+        if self.pin:
+            return TIER_NAMES.index(self.pin)
+        b = self.battery
+        battery = 0 if b is None or b.charging else _rule_tier(b.percent, BATTERY_RULES, above=False)
+        return max(battery,
+                   _rule_tier(self.temperature, TEMP_RULES, above=True),
+                   _rule_tier(self.load, LOAD_RULES, above=True))
+
+    def poll(self) -> Tier:
+        self.battery = self.source.read() if self.source is not None else None
+        self.temperature = self.temp_fn()
+        self.load = self.load_fn()
+        current, want = TIERS.index(self.tier), self.wanted()
+        if want > current:
+            self._better = 0
+            self._set(TIERS[want])
+        elif want < current:
+            self._better += 1
+            if self._better >= self.hold:
+                self._better = 0
+                self._set(TIERS[want])
+        else:
+            self._better = 0
+        return self.tier
+
+    def _set(self, tier: Tier) -> None:
+        old, self.tier = self.tier, tier
+        self.changes += 1
+        log.info(f"🔋 Power tier {old.name} -> {tier.name} ({self.describe()})")
+        if self.on_change is not None:
+            self.on_change(old, tier)
+
+    def describe(self) -> str:
+        b = self.battery
+        parts = [f"battery {b.percent:.0f}%{' charging' if b.charging else ''}" if b else "battery n/a"]
+        parts.append(f"{self.temperature:.1f} °C" if self.temperature is not None else "temp n/a")
+        parts.append(f"load {self.load:.2f}/core" if self.load is not None else "load n/a")
+        return ", ".join(parts)
+
+    def run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                log.warning(f"power governor poll failed: {e}")
+            if self._halt.wait(self.interval):
+                break
+
+    def stop(self) -> None:
+        self._halt.set()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# Local stand-in for the cloud /analyze endpoint (OCR + object detection).
+# It returns a fixed response after a simulated network delay: a fixed
+# latency plus upload time at the given bandwidth. That makes payload size
+# matter the way it does on a real uplink. Point kanan_ai at it with
+#
+#   python benchmarks/analyze_stub.py --port 8000 --latency-ms 150 --kbps 800
+#   KANAN_CLOUD_URL=http://127.0.0.1:8000/analyze python kanan_ai.py
+
+import argparse, threading, time
+from flask import Flask, jsonify, request
+
+RESPONSE = {"objects": ["chair (0.91)", "laptop (0.84)", "person (0.99)"], "text": "EXIT"}
+
+
+def create_app(latency_ms: float = 150.0, kbps: float = 0.0, response=None):
+    """Flask app with POST /analyze; app.config["STUB_LOG"] records (bytes, delay) per request."""
+    app = Flask(__name__)
+    app.config["STUB_LOG"] = []
+    lock = threading.Lock()
+
+    @app.route("/analyze", methods=["POST"])
+    def analyze():
+        f = request.files.get("file")
+        if f is None:
+            return jsonify({"error": "No file uploaded"}), 400
+        size = len(f.read())
+        delay = latency_ms / 1000.0 + (size * 8 / (kbps * 1000.0) if kbps else 0.0)
+        time.sleep(delay)
+        with lock:
+            app.config["STUB_LOG"].append((size, delay))
+        return jsonify(response or RESPONSE)
+
+    return app
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Stand-in /analyze server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--latency-ms", type=float, default=150.0, help="fixed delay per request")
+    ap.add_argument("--kbps", type=float, default=0.0, help="simulated uplink bandwidth (0 = unlimited)")
+    args = ap.parse_args()
+    create_app(args.latency_ms, args.kbps).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
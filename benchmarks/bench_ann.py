@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# Recall@1 and queries/second of the IVF index against exact search.
+# Uses synthetic 128-d encodings shaped like dlib's: one centre per identity,
+# probes are noisy copies of a centre (same person, new photo).
+#
+#   python benchmarks/bench_ann.py --identities 20000 --queries 2000
+
+import argparse, os, sys, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ann_index import IVFIndex
+from face_gallery import pairwise_distances
+
+
+def synthetic_encodings(n, rng, spread=0.09):
+    # dlib encodings are roughly N(0, 0.09) per dimension: distinct people ~1.0 apart
+    return rng.normal(0.0, spread, size=(n, 128)).astype(np.float32)
+
+
+def exact_top1(probes, data, batch=256):
+    out = np.empty(len(probes), dtype=np.int64)
+    for s in range(0, len(probes), batch):
+        out[s:s + batch] = pairwise_distances(probes[s:s + batch], data).argmin(axis=1)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--identities", type=int, default=20000)
+    ap.add_argument("--queries", type=int, default=2000)
+    ap.add_argument("--noise", type=float, default=0.03, help="per-dim std of probe noise")
+    ap.add_argument("--n-lists", type=int, default=None)
+    ap.add_argument("--n-probe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    ap.add_argument("--batch", type=int, default=1, help="probes per search call (faces per request)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    data = synthetic_encodings(args.identities, rng)
+    truth_rows = rng.integers(0, len(data), size=args.queries)
+    probes = data[truth_rows] + rng.normal(0, args.noise, size=(args.queries, 128)).astype(np.float32)
+
+    t = time.perf_counter()
+    exact = exact_top1(probes, data, args.batch)
+    exact_qps = args.queries / (time.perf_counter() - t)
+    print(f"gallery={args.identities} queries={args.queries}")
+    print(f"{'method':<16}{'recall@1':>10}{'qps':>12}")
+    print(f"{'exact':<16}{1.0:>10.3f}{exact_qps:>12.0f}")
+
+    t = time.perf_counter()
+    index = IVFIndex(n_lists=args.n_lists)
+    index.add(data)
+    index.train()
+    print(f"(IVF build {time.perf_counter() - t:.2f}s, {index.n_lists} lists)")
+
+    for n_probe in args.n_probe:
+        if n_probe > index.n_lists:
+            continue
+        found = np.empty(args.queries, dtype=np.int64)
+        t = time.perf_counter()
+        for s in range(0, args.queries, args.batch):
+            _, ids = index.search(probes[s:s + args.batch], k=1, n_probe=n_probe)
+            found[s:s + args.batch] = ids[:, 0]
+        qps = args.queries / (time.perf_counter() - t)
+        recall = float(np.mean(found == exact))
+        print(f"{'ivf n_probe=' + str(n_probe):<16}{recall:>10.3f}{qps:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
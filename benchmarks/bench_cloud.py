@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# Cloud upload path: one-shot requests.post (the old cloud_detect) vs.
+# CloudClient (keep-alive session + RTT-adaptive JPEG). Runs against the
+# in-process analyze_stub unless --url is given; --kbps simulates a slow
+# uplink, where the adaptive client should step down to smaller frames.
+#
+#   python benchmarks/bench_cloud.py --kbps 500 --uploads 30
+
+import argparse, logging, os, sys, threading, time
+import cv2
+import numpy as np
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from cloud_client import CloudClient
+from analyze_stub import create_app
+
+
+def sample_frame(i):
+    """Camera-sized frame with some texture so JPEG sizes are realistic."""
+    rng = np.random.default_rng(i)
+    frame = cv2.GaussianBlur(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8), (7, 7), 0)
+    cv2.putText(frame, f"EXIT {i}", (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 3, (255, 255, 255), 5)
+    return frame
+
+
+def one_shot(url, frame, timeout):
+    _, buf = cv2.imencode(".jpg", cv2.resize(frame, (480, 360)))
+    t = time.monotonic()
+    r = requests.post(url, files={"file": ("frame.jpg", buf.tobytes(), "image/jpeg")}, timeout=timeout)
+    r.raise_for_status()
+    return time.monotonic() - t, len(buf)
+
+
+def summary(label, rtts, sizes):
+    rtts = sorted(rtts)
+    print(f"{label:<10}{1000 * rtts[len(rtts) // 2]:>10.0f}{1000 * rtts[int(0.95 * (len(rtts) - 1))]:>10.0f}"
+          f"{sum(sizes) / len(sizes) / 1024:>10.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Cloud upload benchmark")
+    ap.add_argument("--url", help="real /analyze endpoint (default: local stub)")
+    ap.add_argument("--uploads", type=int, default=20)
+    ap.add_argument("--latency-ms", type=float, default=100.0)
+    ap.add_argument("--kbps", type=float, default=1000.0)
+    ap.add_argument("--timeout", type=float, default=5.0)
+    args = ap.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        server = make_server("127.0.0.1", 0, create_app(args.latency_ms, args.kbps), threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/analyze"
+
+    frames = [sample_frame(i) for i in range(8)]
+    print(f"{'client':<10}{'p50 ms':>10}{'p95 ms':>10}{'avg KiB':>10}")
+    rtts, sizes = [], []
+    for i in range(args.uploads):
+        rtt, size = one_shot(url, frames[i % len(frames)], args.timeout)
+        rtts.append(rtt)
+        sizes.append(size)
+    summary("one-shot", rtts, sizes)
+
+    client = CloudClient(url, timeout=args.timeout)
+    before = 0
+    sizes = []
+    for i in range(args.uploads):
+        client.analyze(frames[i % len(frames)])
+        sizes.append(client.stats["bytes"] - before)
+        before = client.stats["bytes"]
+    summary("adaptive", list(client.rtts), sizes)
+    print(client.report())
+    client.close()
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Latency and match-distance impact of the face_worker profiles.
+# Every image is run through each profile; "drift" is the distance between a
+# face's encoding under that profile and under "accurate" (the enrollment
+# setting), i.e. how much closer to the 0.5 match tolerance a profile pushes.
+#
+#   python benchmarks/bench_profiles.py uploads/*.jpg --repeat 3
+
+import argparse, glob, os, sys, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_worker import PROFILES, process_upload
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare detection/encoding profiles")
+    ap.add_argument("images", nargs="*", help="sample images (default: uploads/*)")
+    ap.add_argument("--repeat", type=int, default=3, help="timed runs per image and profile")
+    args = ap.parse_args()
+
+    paths = args.images or sorted(
+        p for p in glob.glob("uploads/*") if p.lower().endswith((".jpg", ".jpeg", ".png"))
+    )
+    if not paths:
+        sys.exit("No sample images given and none found in uploads/")
+    blobs = [open(p, "rb").read() for p in paths]
+
+    reference = [process_upload(b, "accurate") for b in blobs]
+    print(f"{len(paths)} images, {args.repeat} runs each")
+    print(f"{'profile':<10}{'mean ms':>10}{'p95 ms':>10}{'faces':>7}{'found':>7}{'drift':>8}{'max drift':>11}")
+    for name in PROFILES:
+        times, drift, faces, found = [], [], 0, 0
+        for blob, ref in zip(blobs, reference):
+            for _ in range(args.repeat):
+                t = time.perf_counter()
+                out = process_upload(blob, name)
+                times.append((time.perf_counter() - t) * 1000)
+            if "error" in out or "error" in ref:
+                continue
+            faces += len(ref["encodings"])
+            found += len(out["encodings"])
+            if len(ref["encodings"]) and len(out["encodings"]):
+                # Pair each reference face with the closest face this profile found
+                d = np.linalg.norm(ref["encodings"][:, None] - out["encodings"][None], axis=2)
+                drift.extend(d.min(axis=1))
+        drift = np.array(drift) if drift else np.array([np.nan])
+        print(f"{name:<10}{np.mean(times):>10.1f}{np.percentile(times, 95):>10.1f}"
+              f"{faces:>7}{found:>7}{np.nanmean(drift):>8.3f}{np.nanmax(drift):>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
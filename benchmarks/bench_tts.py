@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# Time-to-first-audio of the old per-sentence Piper spawn vs. piper_tts.
+# "spawn" reproduces the previous kanan_ai path (new piper process + temp WAV
+# + fixed sleeps per sentence); "persistent" is PiperTTS cold (first time a
+# phrase is heard) and "cached" the same phrases again. Audio goes to a null
+# sink, so only synthesis/plumbing is measured.
+#
+#   python benchmarks/bench_tts.py --model piper_models/en_US-ryan-medium.onnx
+#   python benchmarks/bench_tts.py --stub     # fake piper with a model-load delay
+
+import argparse, os, shutil, statistics, subprocess, sys, tempfile, time, wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from piper_tts import PiperTTS, split_sentences
+
+PHRASES = [
+    "Alice is there",
+    "Text says: Exit. Platform two.",
+    "I see chair, table, laptop",
+    "Picture saved as snapshot_1.jpg",
+    "Bob is there",
+]
+
+# Stand-in for the piper CLI: sleeps to mimic loading the voice, then writes
+# 0.3 s of silence per line (to --output_file, or to --output_dir and prints the path).
+STUB = r'''#!/usr/bin/env python3
+import sys, time, wave, os, itertools
+args = dict(zip(sys.argv[1::2], sys.argv[2::2]))
+time.sleep(float(os.environ.get("STUB_LOAD", "0.8")))
+def synth(path, text):
+    time.sleep(0.01 * len(text))
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1); w.setsampwidth(2); w.setframerate(22050)
+        w.writeframes(b"\0\0" * 6615)
+if "--output_file" in args:
+    synth(args["--output_file"], sys.stdin.read())
+else:
+    for n, line in zip(itertools.count(), sys.stdin):
+        path = os.path.join(args["--output_dir"], f"{n}.wav")
+        synth(path, line)
+        print(path, flush=True)
+'''
+
+
+class NullSink:
+    def write(self, pcm):
+        pass
+
+    def close(self):
+        pass
+
+
+def spawn_first_audio(piper, model, text):
+    """Seconds until the first sentence is ready to play, old kanan_ai style."""
+    t = time.perf_counter()
+    chunk = split_sentences(text)[0]
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmpf:
+        wav_path = tmpf.name
+    try:
+        subprocess.run([piper, "--model", model, "--output_file", wav_path,
+                        "--length_scale", "1.1", "--sentence_silence", "0.25"],
+                       input=chunk.encode("utf-8"), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        time.sleep(0.2)  # the fixed pause before aplay
+        with wave.open(wav_path, "rb") as w:
+            w.readframes(w.getnframes())
+    finally:
+        os.remove(wav_path)
+    return time.perf_counter() - t
+
+
+def persistent_first_audio(tts, phrases):
+    out = []
+    for p in phrases:
+        tts.say(p)
+        tts.drain()
+        out.append(tts.first_audio[-1])
+    return out
+
+
+def row(label, secs):
+    ms = [s * 1000 for s in secs]
+    print(f"{label:<12}{statistics.median(ms):>10.1f}{max(ms):>10.1f}{len(ms):>6}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Piper time-to-first-audio benchmark")
+    ap.add_argument("--piper", default=shutil.which("piper") or "piper")
+    ap.add_argument("--model", default=os.path.expanduser("~/FaceRecognition/piper_models/en_US-ryan-medium.onnx"))
+    ap.add_argument("--stub", action="store_true", help="use a fake piper (no voice model needed)")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_tts_")
+    try:
+        if args.stub:
+            args.piper = os.path.join(tmp, "piper")
+            with open(args.piper, "w") as fh:
+                fh.write(STUB)
+            os.chmod(args.piper, 0o755)
+            args.model = os.path.join(tmp, "voice.onnx")
+            open(args.model, "w").close()
+
+        print(f"{'path':<12}{'p50 ms':>10}{'max ms':>10}{'n':>6}")
+        row("spawn", [spawn_first_audio(args.piper, args.model, p) for p in PHRASES])
+
+        tts = PiperTTS(args.piper, args.model, sink=NullSink())
+        if not tts.start():
+            sys.exit("piper not available")
+        tts.say("warm up")  # process start + model load happen once, off the hot path
+        tts.drain()
+        row("persistent", persistent_first_audio(tts, PHRASES))
+        row("cached", persistent_first_audio(tts, PHRASES))
+        print(f"cache hits {tts.cache.hits}, misses {tts.cache.misses}")
+        tts.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
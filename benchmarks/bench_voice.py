@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# Offline voice-command benchmark: recorded WAVs through the old path
+# (full-vocabulary Vosk on every 8000-sample block) and the new one
+# (energy gate + command grammar + 1600-sample blocks). Reports real-time
+# factor (decode CPU / audio length) and command accuracy.
+#
+# Each WAV must be 16 kHz mono 16-bit. The expected command comes from a
+# manifest CSV (path,command) or from the file name prefix before "__",
+# e.g. recordings/battery__02.wav; use "none" for clips that must not
+# trigger anything.
+#
+#   python benchmarks/bench_voice.py recordings/*.wav --model ~/FaceRecognition/vosk-model --pad 5
+
+import argparse, csv, json, os, sys, time, wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from voice_commands import BLOCK_SIZE, COMMAND_PHRASES, CommandListener, CommandTable
+from vosk import Model, KaldiRecognizer, SetLogLevel
+
+
+def load_wav(path, pad_s):
+    with wave.open(path, "rb") as w:
+        if w.getframerate() != 16000 or w.getnchannels() != 1 or w.getsampwidth() != 2:
+            sys.exit(f"{path}: need 16 kHz mono 16-bit")
+        audio = w.readframes(w.getnframes())
+    # Silence around the command, as between real commands
+    pad = b"\0\0" * int(pad_s * 16000)
+    return pad + audio + pad
+
+
+def expected_commands(paths, manifest):
+    if manifest:
+        with open(manifest, newline="") as fh:
+            return {row[0]: row[1] for row in csv.reader(fh) if row}
+    return {p: os.path.basename(p).split("__")[0] for p in paths}
+
+
+def table(hits):
+    """Command table whose handlers append the command name to hits."""
+    t = CommandTable()
+    for name, phrases in COMMAND_PHRASES.items():
+        t.add(name, phrases, lambda arg, n=name: hits.append(n))
+    return t
+
+
+def run_baseline(model, audio):
+    """Old _voice_thread: full vocabulary, every 0.5 s block, no gate."""
+    rec = KaldiRecognizer(model, 16000)
+    names = []
+    t = table(names)
+    cpu = time.thread_time()
+    for i in range(0, len(audio), 16000):
+        if rec.AcceptWaveform(audio[i:i + 16000]):
+            t.dispatch(json.loads(rec.Result()).get("text", ""))
+    t.dispatch(json.loads(rec.FinalResult()).get("text", ""))
+    cpu = time.thread_time() - cpu
+    return cpu, names
+
+
+def run_gated(model, audio):
+    names = []
+    listener = CommandListener(model, KaldiRecognizer, table(names))
+    cpu = time.thread_time()
+    for i in range(0, len(audio), BLOCK_SIZE * 2):
+        listener.feed(audio[i:i + BLOCK_SIZE * 2])
+    listener.feed(b"\0\0" * BLOCK_SIZE * 10)  # trailing quiet closes an open segment
+    cpu = time.thread_time() - cpu
+    return cpu, names, listener.stats["decoded_s"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Voice command RTF/accuracy benchmark")
+    ap.add_argument("wavs", nargs="+")
+    ap.add_argument("--model", default=os.path.expanduser("~/FaceRecognition/vosk-model"))
+    ap.add_argument("--manifest", help="CSV of path,expected_command")
+    ap.add_argument("--pad", type=float, default=3.0, help="seconds of silence before and after each clip")
+    args = ap.parse_args()
+
+    SetLogLevel(-1)
+    model = Model(args.model)
+    expected = expected_commands(args.wavs, args.manifest)
+    totals = {"baseline": [0.0, 0], "gated": [0.0, 0]}
+    audio_s = decoded_s = 0.0
+    print(f"{'clip':<32}{'expected':<13}{'baseline':<13}{'gated':<13}")
+    for path in args.wavs:
+        audio = load_wav(path, args.pad)
+        want = expected.get(path, "none")
+        audio_s += len(audio) / 32000
+        cpu_b, got_b = run_baseline(model, audio)
+        cpu_g, got_g, dec = run_gated(model, audio)
+        decoded_s += dec
+        results = {}
+        for label, cpu, got in (("baseline", cpu_b, got_b), ("gated", cpu_g, got_g)):
+            ok = got == ([] if want == "none" else [want])
+            totals[label][0] += cpu
+            totals[label][1] += ok
+            results[label] = (",".join(got) or "none") + ("" if ok else " ✗")
+        print(f"{os.path.basename(path):<32}{want:<13}{results['baseline']:<13}{results['gated']:<13}")
+
+    n = len(args.wavs)
+    print(f"\n{audio_s:.0f} s of audio, gate passed {decoded_s:.0f} s to the decoder")
+    for label, (cpu, ok) in totals.items():
+        print(f"{label:<10} RTF {cpu / audio_s:.3f}   accuracy {ok}/{n} ({100.0 * ok / n:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# Local load generator for server.py's /recognize endpoint.
+# Runs a closed loop of N concurrent clients per level and reports
+# requests/second, p50/p99 latency and how many requests were shed (503).
+# Every request carries different bytes (a nonce after the JPEG's end
+# marker), so the server's upload cache never answers; --repeat-image
+# sends identical bytes to measure cache hits instead.
+#
+#   python server.py --production --workers 4 &
+#   python benchmarks/loadgen.py --image uploads/Alan.jpg --concurrency 1 4 16 64
+
+import argparse, io, json, threading, time, uuid
+import urllib.error, urllib.request
+
+import numpy as np
+
+
+def synthetic_jpeg(width=640, height=480):
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    arr = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+def multipart(field, filename, data):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; "
+        f"filename=\"{filename}\"\r\nContent-Type: image/jpeg\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def run_level(url, next_body, concurrency, duration):
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+
+    def client():
+        while time.monotonic() < stop:
+            body, ctype = next_body()
+            req = urllib.request.Request(url, data=body, headers={"Content-Type": ctype})
+            t = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=60) as r:
+                    r.read()
+                    status = r.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+                if status == 503:
+                    time.sleep(float(e.headers.get("Retry-After", 1)) * 0.1)
+            except OSError:
+                status = "error"
+            dt = time.perf_counter() - t
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(dt)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    lat = np.array(latencies) * 1000
+    return {
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "rps": len(latencies) / wall,
+        "p50_ms": float(np.percentile(lat, 50)) if len(lat) else None,
+        "p99_ms": float(np.percentile(lat, 99)) if len(lat) else None,
+        "rejected_503": statuses.get(503, 0),
+        "statuses": {str(k): v for k, v in statuses.items()},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load test /recognize")
+    ap.add_argument("--url", default="http://127.0.0.1:5000/recognize")
+    ap.add_argument("--image", help="JPEG to send (default: synthetic 640x480)")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    ap.add_argument("--json", help="also write results to this file")
+    ap.add_argument("--repeat-image", action="store_true",
+                    help="send identical bytes every time (measures the server's result cache)")
+    args = ap.parse_args()
+
+    data = open(args.image, "rb").read() if args.image else synthetic_jpeg()
+    same = multipart("file", "load.jpg", data)
+    # Decoders stop at the JPEG end marker, so trailing bytes only change the hash
+    next_body = (lambda: same) if args.repeat_image else \
+        (lambda: multipart("file", "load.jpg", data + uuid.uuid4().bytes))
+
+    print(f"{'conc':>5}{'rps':>9}{'p50 ms':>10}{'p99 ms':>10}{'503s':>7}")
+    results = []
+    for c in args.concurrency:
+        r = run_level(args.url, next_body, c, args.duration)
+        results.append(r)
+        fmt = lambda v: f"{v:10.1f}" if v is not None else f"{'-':>10}"
+        print(f"{c:>5}{r['rps']:>9.1f}{fmt(r['p50_ms'])}{fmt(r['p99_ms'])}{r['rejected_503']:>7}")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
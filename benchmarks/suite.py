@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# Offline benchmark suite: gallery load, enrollment, detection/encoding at
+# several resolutions, matching against synthetic galleries, /match and
+# /recognize via the Flask test client, and Piper time-to-first-audio with a
+# stub voice. Generated frames contain no real face, so without --images the
+# /recognize numbers cover decoding and detection only; encoding and matching
+# are measured on synthetic encodings (matching, /match) instead.
+# Needs no camera, network, microphone or speaker. Sections whose libraries
+# are missing (e.g. face_recognition) are recorded as skipped.
+#
+# Results go to a flat JSON file ({"meta": ..., "results": {"section.metric":
+# value}}). Metrics ending in _ms are lower-is-better, _per_s higher-is-better.
+# --compare marks regressions against an earlier run and exits 1 if any.
+#
+#   python benchmarks/suite.py --out bench.json
+#   python benchmarks/suite.py --quick --compare bench.json --tolerance 0.2
+
+import argparse, glob, io, json, os, platform, statistics, subprocess, sys, tempfile, threading, time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from face_gallery import FaceGallery
+from gallery_store import GalleryStore
+
+RESOLUTIONS = [(320, 240), (640, 480), (1280, 960)]
+GALLERY_SIZES = [10, 100, 1_000, 10_000, 100_000]
+
+
+# ---------- helpers ----------
+def timed(fn, repeat=5, warmup=1):
+    """Median wall time of fn() in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) * 1000)
+    return statistics.median(times)
+
+
+def synthetic_encodings(n, rng):
+    # dlib encodings are roughly N(0, 0.09) per dimension
+    return rng.normal(0.0, 0.09, size=(n, 128)).astype(np.float32)
+
+
+def fixture_images(folder, rng, count=4):
+    """RGB uint8 arrays: images from folder if given, else generated scenes."""
+    if folder:
+        from PIL import Image
+        paths = sorted(p for p in glob.glob(os.path.join(folder, "*"))
+                       if p.lower().endswith((".jpg", ".jpeg", ".png")))
+        return [np.asarray(Image.open(p).convert("RGB")) for p in paths[:count]]
+    import cv2
+    out = []
+    for i in range(count):
+        img = cv2.GaussianBlur(rng.integers(0, 255, (960, 1280, 3), dtype=np.uint8), (9, 9), 0)
+        cv2.ellipse(img, (640, 430), (170, 230), 0, 0, 360, (180, 150, 130), -1)  # face-sized, not a face
+        out.append(img)
+    return out
+
+
+def resize(img, size):
+    import cv2
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+
+def jpeg_bytes(img):
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.fromarray(img).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+# ---------- sections ----------
+def bench_gallery_load(args, rng, tmp, images):
+    """Legacy pickled .npy + list gallery vs. memory-mapped GalleryStore."""
+    out = {}
+    for n in (1_000, 10_000) if args.quick else (1_000, 10_000, 100_000):
+        enc = synthetic_encodings(n, rng)
+        names = [f"person_{i}" for i in range(n)]
+        npy = os.path.join(tmp, f"legacy_{n}.npy")
+        np.save(npy, {"encodings": list(enc), "names": names}, allow_pickle=True)
+        store_dir = os.path.join(tmp, f"store_{n}")
+        GalleryStore(store_dir).append(names, enc)
+
+        def legacy():
+            data = np.load(npy, allow_pickle=True).item()
+            FaceGallery.from_lists(data["encodings"], data["names"])
+
+        def mapped():
+            s = GalleryStore(store_dir, repair=False)
+            FaceGallery.from_labels(s.encodings(), s.labels(), s.identities)
+
+        out[f"npy_{n}_ms"] = timed(legacy, repeat=3)
+        out[f"store_{n}_ms"] = timed(mapped, repeat=3)
+    return out
+
+
+def bench_enrollment(args, rng, tmp, images):
+    """Append-only store + gallery insert rate, and image -> encoding rate."""
+    out = {}
+    n = 200 if args.quick else 1000
+    enc = synthetic_encodings(n, rng)
+    store = GalleryStore(os.path.join(tmp, "enroll_store"))
+    gallery = FaceGallery()
+    t = time.perf_counter()
+    for i in range(n):
+        store.append([f"p{i}"], enc[i:i + 1])   # one fsync'd record per enrollment, as /register_face
+        gallery.add(f"p{i}", enc[i])
+    out["store_append_per_s"] = n / (time.perf_counter() - t)
+
+    t = time.perf_counter()
+    FaceGallery().add_many([f"p{i}" for i in range(n)], enc)
+    out["gallery_add_many_per_s"] = n / (time.perf_counter() - t)
+
+    try:
+        from face_worker import PROFILES, encode_image
+    except ImportError as e:
+        out["images_skipped"] = str(e)
+        return out
+    p = PROFILES["accurate"]
+    t = time.perf_counter()
+    for img in images:
+        encode_image(img, num_jitters=p["num_jitters"], model=p["model"], upsample=p["upsample"])
+    out["images_per_s"] = len(images) / (time.perf_counter() - t)
+    return out
+
+
+def bench_detection(args, rng, tmp, images):
+    """HOG detection and 128-d encoding cost per frame size."""
+    try:
+        import face_recognition
+    except ImportError as e:
+        return {"skipped": str(e)}
+    out = {}
+    for w, h in RESOLUTIONS:
+        frames = [resize(img, (w, h)) for img in images]
+        box = [(h // 4, 3 * w // 4, 3 * h // 4, w // 4)]  # fixed face-sized box: encoding cost only
+        for up in (0, 1):
+            out[f"detect_{w}x{h}_up{up}_ms"] = timed(
+                lambda: [face_recognition.face_locations(f, number_of_times_to_upsample=up) for f in frames],
+                repeat=3) / len(frames)
+        out[f"encode_{w}x{h}_ms"] = timed(
+            lambda: [face_recognition.face_encodings(f, box, num_jitters=1, model="large") for f in frames],
+            repeat=3) / len(frames)
+    return out
+
+
+def bench_matching(args, rng, tmp, images):
+    """One probe (a face in a frame) and a batch of 16, exact and IVF-indexed:
+    best() as the device uses it, match(k=TOP_K) as the server does."""
+    out = {}
+    sizes = [s for s in GALLERY_SIZES if not args.quick or s <= 10_000]
+    for n in sizes:
+        enc = synthetic_encodings(n, rng)
+        names = [f"person_{i}" for i in range(n)]
+        rows = rng.integers(0, n, size=16)
+        probes = enc[rows] + rng.normal(0, 0.03, size=(16, 128)).astype(np.float32)
+        exact = FaceGallery.from_matrix(enc, names, tolerance=0.5)
+        out[f"exact_{n}_1_ms"] = timed(lambda: exact.best(probes[:1]), repeat=20)
+        out[f"exact_{n}_16_ms"] = timed(lambda: exact.best(probes), repeat=10)
+        out[f"exact_{n}_16_top3_ms"] = timed(lambda: exact.match(probes, k=3), repeat=10)
+        if n >= 1_000:
+            indexed = FaceGallery.from_matrix(enc, names, tolerance=0.5)
+            indexed.enable_index(min_train_size=1_000)
+            indexed.best(probes[:1])  # builds the index outside the timing
+            out[f"ivf_{n}_1_ms"] = timed(lambda: indexed.best(probes[:1]), repeat=20)
+            out[f"ivf_{n}_16_ms"] = timed(lambda: indexed.best(probes), repeat=10)
+            out[f"ivf_{n}_16_top3_ms"] = timed(lambda: indexed.match(probes, k=3), repeat=10)
+    return out
+
+
+def bench_server(args, rng, tmp, images):
+    """End-to-end /match and /recognize through the Flask test client (dev mode, in-process)."""
+    cwd = os.getcwd()
+    os.chdir(tmp)  # server.py keeps its store and uploads relative to the working directory
+    try:
+        import server
+    except ImportError as e:
+        return {"skipped": str(e)}
+    finally:
+        os.chdir(cwd)
+    out = {}
+    n = 10_000  # above ANN_MIN_SIZE, so matching goes through the IVF index as in production
+    known = synthetic_encodings(n, rng)
+    store = GalleryStore(os.path.join(tmp, "recognize_store"))
+    store.append([f"person_{i}" for i in range(n)], known)
+    server.gallery = server.new_gallery(store)
+    for t in threading.enumerate():
+        if t.name == "gallery-index":
+            t.join()  # background index build, outside the timings
+    client = server.app.test_client()
+
+    # /match: parse, gallery match (IVF once the gallery is large enough) and JSON reply,
+    # for the faces of one frame (4 noisy copies of enrolled encodings)
+    probes = known[rng.integers(0, n, size=4)] + rng.normal(0, 0.03, size=(4, 128)).astype(np.float32)
+    body = probes.astype("<f4").tobytes()
+
+    def match(invalidate=True):
+        if invalidate:
+            server.result_cache.invalidate()
+        r = client.post("/match", data=body, content_type="application/octet-stream")
+        assert r.status_code == 200, r.data
+        return r.get_json()["results"]
+    out["match_4_faces_ms"] = timed(match, repeat=20)
+    out["match_4_faces_cached_ms"] = timed(lambda: match(invalidate=False), repeat=20)
+    out["match_recognized"] = sum(r["name"] != "Not Recognized" for r in match())
+
+    faces = 0
+    for w, h in RESOLUTIONS:
+        blobs = [jpeg_bytes(resize(img, (w, h))) for img in images]
+        for profile in ("fast", "accurate"):
+            def post():
+                server.result_cache.invalidate()  # measure the full path, not cache hits
+                for b in blobs:
+                    r = client.post(f"/recognize?profile={profile}",
+                                    data={"file": (io.BytesIO(b), "frame.jpg")},
+                                    content_type="multipart/form-data")
+                    assert r.status_code == 200, r.data
+            out[f"recognize_{w}x{h}_{profile}_ms"] = timed(post, repeat=3) / len(blobs)
+        r = client.post("/recognize?profile=accurate", data={"file": (io.BytesIO(blobs[0]), "frame.jpg")},
+                        content_type="multipart/form-data")
+        faces += len(r.get_json()["faces"])
+    if not faces:
+        # Decoding and an empty detection only: nothing was encoded or matched
+        out["recognize_note"] = "no faces in the fixture images; pass --images for encode + match"
+
+    def resend():
+        for b in blobs:  # answered from the upload cache filled by the last post()
+            client.post("/recognize?profile=accurate", data={"file": (io.BytesIO(b), "frame.jpg")},
+                        content_type="multipart/form-data")
+    out["recognize_cached_ms"] = timed(resend, repeat=3) / len(blobs)
+    return out
+
+
+def bench_tts(args, rng, tmp, images):
+    """Time to first audio with a stub piper (simulated voice load) and a null sink."""
+    from bench_tts import STUB, NullSink, PHRASES, persistent_first_audio, spawn_first_audio
+    from piper_tts import PiperTTS
+    piper = os.path.join(tmp, "piper")
+    with open(piper, "w") as fh:
+        fh.write(STUB)
+    os.chmod(piper, 0o755)
+    model = os.path.join(tmp, "voice.onnx")
+    open(model, "w").close()
+    os.environ.setdefault("STUB_LOAD", "0.5")
+
+    out = {"spawn_first_audio_ms": 1000 * statistics.median(
+        spawn_first_audio(piper, model, p) for p in PHRASES[:3])}
+    tts = PiperTTS(piper, model, sink=NullSink())
+    tts.start()
+    tts.say("warm up")
+    tts.drain()
+    out["persistent_first_audio_ms"] = 1000 * statistics.median(persistent_first_audio(tts, PHRASES))
+    out["cached_first_audio_ms"] = 1000 * statistics.median(persistent_first_audio(tts, PHRASES))
+    tts.close()
+    return out
+
+
+SECTIONS = ["gallery_load", "enrollment", "detection", "matching", "server", "tts"]
+
+
+# ---------- comparison ----------
+def compare(results, old_path, tolerance):
+    """Print metrics that got worse by more than tolerance; returns their count."""
+    with open(old_path, "r", encoding="utf-8") as fh:
+        old = json.load(fh)["results"]
+    worse = 0
+    print(f"\n{'metric':<44}{'before':>12}{'after':>12}{'change':>9}")
+    for key in sorted(set(old) & set(results)):
+        a, b = old[key], results[key]
+        if not isinstance(a, (int, float)) or not isinstance(b, (int, float)) or not a:
+            continue
+        if key.endswith("_ms"):
+            change = b / a - 1
+        elif key.endswith("_per_s"):
+            change = a / b - 1 if b else float("inf")
+        else:
+            continue
+        flag = ""
+        if change > tolerance:
+            flag = "  REGRESSION"
+            worse += 1
+        print(f"{key:<44}{a:>12.3f}{b:>12.3f}{100 * change:>+8.0f}%{flag}")
+    return worse
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline Kanan benchmark suite")
+    ap.add_argument("--only", nargs="+", choices=SECTIONS, help="run just these sections")
+    ap.add_argument("--images", help="folder of face photos to use instead of generated frames")
+    ap.add_argument("--quick", action="store_true", help="smaller sizes (galleries up to 10k)")
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--compare", help="earlier results file to check for regressions")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown before flagging (0.15 = 15%%)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    images = fixture_images(args.images, rng)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="kanan_bench_") as tmp:
+        for name in args.only or SECTIONS:
+            fn = globals()[f"bench_{name}"]
+            t = time.perf_counter()
+            try:
+                section = fn(args, rng, tmp, images)
+            except Exception as e:
+                section = {"error": f"{type(e).__name__}: {e}"}
+            print(f"[{name}] {time.perf_counter() - t:.1f} s")
+            for key, value in section.items():
+                results[f"{name}.{key}"] = value
+                shown = f"{value:.3f}" if isinstance(value, float) else value
+                print(f"  {key:<40} {shown}")
+
+    meta = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "quick": args.quick,
+        "images": args.images or "generated",
+    }
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump({"meta": meta, "results": results}, fh, indent=2)
+    print(f"📝 Results written to {args.out}")
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# Kanan AI – bulk face enrollment from a directory of photos
+# Photos are detected and encoded across a process pool and committed in
+# batches (one store append per batch instead of one per photo). After each
+# commit the batch is recorded in a checkpoint file, so an interrupted
+# import resumes where it stopped: photos in the checkpoint, or already in
+# the store as a row's source, are skipped.
+#
+# The name comes from the photo's folder (photos/Alice/001.jpg -> "Alice"),
+# or from the file name for photos directly in the import folder
+# (photos/Bob.jpg -> "Bob"). The largest face in each photo is enrolled.
+#
+#   python bulk_import.py photos/ --workers 8    # server stopped: into faces_store/
+#   python server.py --import photos/            # while serving: rows match as soon as committed
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from face_worker import PROFILES, largest_face, process_file
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+DEFAULT_BATCH = 64
+DEFAULT_PROFILE = "balanced"      # one jitter: ~3x faster than "accurate" per photo
+CHECKPOINT_NAME = "import_checkpoint.jsonl"
+IN_FLIGHT_PER_WORKER = 4          # queued photos per worker: keeps them busy, bounds memory
+
+
+def scan(folder: str) -> list:
+    """(absolute path, name) for every photo under folder, in a stable order."""
+    folder = os.path.abspath(folder)
+    found = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for fn in sorted(files):
+            if not fn.lower().endswith(IMAGE_EXTS):
+                continue
+            path = os.path.join(root, fn)
+            if root == folder:
+                name = os.path.splitext(fn)[0]
+            else:
+                name = os.path.basename(root)
+            found.append((path, name.strip()))
+    return found
+
+
+class Checkpoint:
+    """Append-only JSONL of finished photos: {"path", "faces"} or {"path", "error"}."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = set()
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        self.done.add(json.loads(line)["path"])
+                    except (ValueError, KeyError):
+                        pass  # torn last line from an interrupted write
+        except OSError:
+            pass
+
+    def record(self, entries) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.write("".join(json.dumps(e) + "\n" for e in entries))
+            fh.flush()
+            os.fsync(fh.fileno())
+        self.done.update(e["path"] for e in entries)
+
+
+def bulk_import(folder, commit, pool, workers, checkpoint, profile=DEFAULT_PROFILE,
+                batch_size=DEFAULT_BATCH, known_sources=(), progress=print) -> dict:
+    """Encode every new photo under folder and hand them to commit(names, encodings, sources)
+    in batches of up to batch_size photos. Returns counters for the run."""
+    skip = checkpoint.done | set(known_sources)
+    photos = scan(folder)
+    new = [(p, n) for p, n in photos if p not in skip]
+    todo = iter(new)
+    stats = {"photos": len(photos), "skipped": len(photos) - len(new), "enrolled": 0,
+             "no_face": 0, "errors": 0}
+    window = max(1, workers * IN_FLIGHT_PER_WORKER)
+    pending = {}
+    batch = []
+    t0 = time.monotonic()
+
+    def flush():
+        items = batch[:]
+        batch.clear()  # detached first: a failed commit is never retried by the finally below
+        names, encs, sources, entries = [], [], [], []
+        for path, name, out in items:
+            if "error" in out:
+                stats["errors"] += 1
+                entries.append({"path": path, "error": out["error"]})
+                continue
+            i = largest_face(out)
+            entries.append({"path": path, "faces": len(out["locations"])})
+            if i is None:
+                stats["no_face"] += 1
+                continue
+            names.append(name)
+            encs.append(out["encodings"][i])
+            sources.append(path)
+        if names:
+            commit(names, encs, sources)  # rows first; on resume their store sources keep them from repeating
+            stats["enrolled"] += len(names)
+        if entries:
+            checkpoint.record(entries)
+        done = stats["enrolled"] + stats["no_face"] + stats["errors"]
+        rate = done / max(time.monotonic() - t0, 1e-9)
+        progress(f"📥 {stats['skipped'] + done}/{stats['photos']} photos • {stats['enrolled']} enrolled, "
+                 f"{stats['no_face']} without a face, {stats['errors']} unreadable • {rate:.1f} photos/s")
+
+    try:
+        while True:
+            while len(pending) < window:
+                nxt = next(todo, None)
+                if nxt is None:
+                    break
+                pending[pool.submit(process_file, nxt[0], profile)] = nxt
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                path, name = pending.pop(fut)
+                # A crashed worker raises here and stops the import; those photos are
+                # not checkpointed, so a resumed run retries them
+                batch.append((path, name, fut.result()))
+            if len(batch) >= batch_size:
+                flush()
+    finally:
+        # Interrupted or not, whatever finished is committed and checkpointed
+        if batch:
+            flush()
+        for fut in pending:
+            fut.cancel()
+    stats["seconds"] = round(time.monotonic() - t0, 2)
+    return stats
+
+
+def main():
+    from gallery_store import GalleryStore
+
+    ap = argparse.ArgumentParser(description="Bulk face enrollment into the server's gallery store")
+    ap.add_argument("folder", help="photos, one sub-folder per person or one file per person")
+    ap.add_argument("--store", default="faces_store", help="GalleryStore folder (server.py FACE_STORE_DIR)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="photos per store commit")
+    ap.add_argument("--profile", choices=sorted(PROFILES), default=DEFAULT_PROFILE)
+    ap.add_argument("--checkpoint", default=None,
+                    help=f"progress file (default: <store>/{CHECKPOINT_NAME})")
+    args = ap.parse_args()
+
+    store = GalleryStore(args.store)
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(args.store, CHECKPOINT_NAME))
+    with ProcessPoolExecutor(max_workers=args.workers,
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        stats = bulk_import(args.folder, store.append, pool, args.workers, checkpoint,
+                            args.profile, args.batch, known_sources=(m["source"] for m in store.meta))
+    print(f"✅ Import done in {stats['seconds']:.1f} s: {stats['enrolled']} enrolled, "
+          f"{stats['skipped']} already imported, {stats['no_face']} without a face, "
+          f"{stats['errors']} unreadable ({len(store)} rows in {args.store})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# Kanan AI – camera capture with a sequence-numbered frame ring buffer
+# The capture thread reads into a small set of preallocated buffers and
+# publishes each frame with a monotonically increasing sequence number and
+# its capture timestamp. Consumers block on wait_newer(seq) instead of
+# polling, and never see the same frame twice.
+# The last working device index can be remembered in a small state file, so
+# a restart opens it directly instead of probing /dev/video0..9 in turn.
+# With max_fps set, every frame is still grabbed (keeping the driver's queue
+# fresh) but only max_fps of them per second are decoded and published.
+
+import os
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+RING_SIZE = 8
+MAX_INDEX = 10
+
+# image is a view into the ring: valid until RING_SIZE - 1 newer frames are
+# captured. Copy it if it must outlive that.
+Frame = namedtuple("Frame", ["seq", "ts", "image"])
+
+
+class Camera:
+    def __init__(self, ring_size: int = RING_SIZE, on_reconnect=None, state_file=None):
+        self.cap = None
+        self.running = False
+        self.device_index = None
+        self.on_reconnect = on_reconnect
+        self.state_file = state_file      # remembers the last working index
+        self.max_fps = None               # publish rate limit (None = every frame)
+        self._ring = [None] * ring_size   # reused frame buffers
+        self._ts = [0.0] * ring_size
+        self._seq = 0                     # sequence number of the newest frame (0 = none yet)
+        self._cond = threading.Condition()
+
+    def _remembered_index(self):
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as fh:
+                return int(fh.read().strip())
+        except (TypeError, OSError, ValueError):
+            return None
+
+    def _remember(self, index: int) -> None:
+        if self.state_file is None or index == self._remembered_index():
+            return
+        try:
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            with open(self.state_file, "w", encoding="utf-8") as fh:
+                fh.write(str(index))
+        except OSError:
+            pass
+
+    def candidates(self) -> list:
+        """Indexes to probe: the remembered one first, then those with a /dev/videoN node."""
+        order = list(range(MAX_INDEX))
+        if os.path.isdir("/dev"):
+            present = [i for i in order if os.path.exists(f"/dev/video{i}")]
+            order = present or order  # no device nodes (e.g. not Linux): probe them all
+        last = self._remembered_index()
+        if last is not None:
+            order = [last] + [i for i in order if i != last]
+        return order
+
+    def find_camera(self):
+        for i in self.candidates():
+            cap = cv2.VideoCapture(i)
+            if cap.isOpened():
+                ret, frame = cap.read()
+                if ret:
+                    self.device_index = i
+                    self._remember(i)
+                    print(f"✅ Camera {i} active (/dev/video{i})")
+                    return cap
+                cap.release()
+        print("❌ No working camera found.")
+        return None
+
+    def open(self):
+        self.cap = self.find_camera()
+        return self.cap is not None
+
+    def start(self):
+        self.running = True
+
+        def loop():
+            fail = 0
+            next_due = 0.0
+            while self.running:
+                if not self.cap:
+                    self.cap = self.find_camera()
+                    time.sleep(1)
+                    continue
+                slot = (self._seq + 1) % len(self._ring)
+                ret = self.cap.grab()
+                ts = time.monotonic()
+                if ret and self.max_fps:
+                    if ts < next_due:
+                        fail = 0
+                        continue  # grabbed, not decoded
+                    next_due = max(next_due + 1.0 / self.max_fps, ts)
+                if ret:
+                    # Decode straight into the slot's existing buffer (OpenCV
+                    # reallocates only if the frame size changed)
+                    ret, f = self.cap.retrieve(self._ring[slot])
+                if not ret:
+                    fail += 1
+                    if fail >= 5:
+                        print("⚠️ Camera feed lost. Reconnecting...")
+                        self.cap.release()
+                        time.sleep(3)
+                        self.cap = self.find_camera()
+                        if self.cap and self.on_reconnect:
+                            self.on_reconnect()
+                        fail = 0
+                        continue
+                    continue
+                fail = 0
+                self._publish(slot, f, ts)
+
+        threading.Thread(target=loop, daemon=True).start()
+
+    def _publish(self, slot, image, ts):
+        with self._cond:
+            self._ring[slot] = image
+            self._ts[slot] = ts
+            self._seq += 1
+            self._cond.notify_all()
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def latest(self):
+        """Newest Frame (zero-copy), or None before the first capture."""
+        with self._cond:
+            return self._frame_locked()
+
+    def wait_newer(self, seq: int, timeout=None):
+        """Block until a frame newer than seq exists; returns it, or None on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > seq or not self.running, timeout):
+                return None
+            return self._frame_locked() if self._seq > seq else None
+
+    def _frame_locked(self):
+        if not self._seq:
+            return None
+        slot = self._seq % len(self._ring)
+        return Frame(self._seq, self._ts[slot], self._ring[slot])
+
+    def read(self):
+        """Copy of the newest frame image (safe to keep), or None."""
+        fr = self.latest()
+        return fr.image.copy() if fr is not None else None
+
+    def close(self):
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self.cap:
+            self.cap.release()
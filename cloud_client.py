@@ -0,0 +1,159 @@
+# Kanan AI – client for the cloud /analyze endpoint (OCR + objects)
+# Uploads go over one keep-alive requests.Session, so only the first request
+# pays for TCP/TLS setup. The JPEG size and quality follow the measured
+# round-trip time: a slow link gets smaller, lower-quality frames, a fast
+# one gets them back. Callers run analyze() on their own worker thread (the
+# kanan_ai cloud stage), which keeps at most one request in flight.
+# MatchClient sends face encodings computed on the device to the face
+# server's /match instead of an image: 512 bytes per face (kanan_ai, when
+# KANAN_MATCH_URL is set, for faces the local gallery does not know).
+
+import collections
+import time
+
+import cv2
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+RTT = metrics.histogram("kanan_cloud_rtt_seconds", "Cloud /analyze round-trip time")
+SENT = metrics.counter("kanan_cloud_bytes_total", "JPEG bytes uploaded to the cloud")
+ERRORS = metrics.counter("kanan_cloud_errors_total", "Failed cloud requests")
+MATCH_SENT = metrics.counter("kanan_match_bytes_total", "Face encoding bytes sent to the server's /match")
+MATCH_ERRORS = metrics.counter("kanan_match_errors_total", "Failed /match requests")
+
+# (width, height, JPEG quality), largest first
+PAYLOAD_LEVELS = [
+    (640, 480, 85),
+    (480, 360, 75),
+    (400, 300, 65),
+    (320, 240, 55),
+]
+DEFAULT_LEVEL = 1        # the previous fixed 480x360 upload
+
+
+class AdaptiveEncoder:
+    """Picks the JPEG level from a smoothed RTT, with hysteresis.
+
+    Steps to a smaller payload when the smoothed RTT is above target * slow,
+    and back up when it is below target * fast, at most once per `hold` uploads.
+    """
+
+    def __init__(self, target_rtt: float = 0.8, levels=PAYLOAD_LEVELS, start: int = DEFAULT_LEVEL,
+                 alpha: float = 0.3, slow: float = 1.25, fast: float = 0.5, hold: int = 3):
+        self.target_rtt = target_rtt
+        self.levels = levels
+        self.level = start
+        self.alpha = alpha
+        self.slow = slow
+        self.fast = fast
+        self.hold = hold
+        self.rtt = None            # smoothed round-trip time, seconds
+        self._since_change = 0
+
+    def encode(self, frame) -> bytes:
+        w, h, quality = self.levels[self.level]
+        ok, buf = cv2.imencode(".jpg", cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA),
+                               [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        return buf.tobytes()
+
+    def observe(self, rtt: float) -> None:
+        """Feed one measured RTT (use the timeout for failed requests)."""
+        self.rtt = rtt if self.rtt is None else self.alpha * rtt + (1 - self.alpha) * self.rtt
+        self._since_change += 1
+        if self._since_change < self.hold:
+            return
+        if self.rtt > self.target_rtt * self.slow and self.level < len(self.levels) - 1:
+            self.level += 1
+            self._since_change = 0
+        elif self.rtt < self.target_rtt * self.fast and self.level > 0:
+            self.level -= 1
+            self._since_change = 0
+
+
+class CloudClient:
+    """POSTs frames to url as multipart `file`; returns the decoded JSON or None."""
+
+    def __init__(self, url: str, timeout: float = 5.0, connect_timeout: float = 2.0,
+                 encoder: AdaptiveEncoder = None):
+        self.url = url
+        self.timeout = (connect_timeout, timeout)
+        self.encoder = encoder or AdaptiveEncoder()
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.rtts = collections.deque(maxlen=200)
+        self.stats = {"uploads": 0, "bytes": 0, "errors": 0}
+
+    def analyze(self, frame):
+        data = self.encoder.encode(frame)
+        self.stats["uploads"] += 1
+        self.stats["bytes"] += len(data)
+        SENT.inc(len(data))
+        t = time.monotonic()
+        try:
+            r = self.session.post(self.url, files={"file": ("frame.jpg", data, "image/jpeg")},
+                                  timeout=self.timeout)
+        except requests.RequestException as e:
+            self.stats["errors"] += 1
+            ERRORS.inc()
+            self.encoder.observe(self.timeout[1])  # a timeout is the strongest "too slow" signal
+            print("[Cloud]", e)
+            return None
+        rtt = time.monotonic() - t
+        self.rtts.append(rtt)
+        RTT.observe(rtt)
+        self.encoder.observe(rtt)
+        if r.status_code != 200:
+            self.stats["errors"] += 1
+            ERRORS.inc()
+            print("[Cloud] HTTP", r.status_code)
+            return None
+        return r.json()
+
+    def report(self) -> str:
+        w, h, q = self.encoder.levels[self.encoder.level]
+        rtt = sorted(self.rtts)
+        median = f"{1000 * rtt[len(rtt) // 2]:.0f} ms" if rtt else "n/a"
+        return (f"cloud: {self.stats['uploads']} uploads, {self.stats['errors']} errors, "
+                f"median RTT {median}, payload {w}x{h} q{q}")
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class MatchClient:
+    """Matches local encodings against the server gallery via /match (raw float32 body)."""
+
+    def __init__(self, url: str, timeout: float = 2.0, connect_timeout: float = 2.0):
+        self.url = url
+        self.timeout = (connect_timeout, timeout)
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
+    def match(self, encodings, top_k: int = 1):
+        """One {"name", "distance", "matches"} per encoding, or None on failure."""
+        body = np.asarray(encodings, dtype="<f4").reshape(-1, 128)
+        try:
+            r = self.session.post(self.url, data=body.tobytes(), params={"top_k": top_k},
+                                  timeout=self.timeout, headers={"Content-Type": "application/octet-stream"})
+            MATCH_SENT.inc(body.nbytes)
+            if r.status_code != 200:
+                raise ValueError(f"HTTP {r.status_code}")
+            results = r.json()["results"]
+            if not isinstance(results, list) or len(results) != len(body):
+                raise ValueError("malformed reply")
+            return results
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            # A failed or malformed reply is a miss, never an exception in the caller
+            MATCH_ERRORS.inc()
+            print("[Match]", e)
+            return None
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,147 @@
+# Kanan AI – persistent face-encoding cache
+# Encodings are keyed by the SHA-1 of the image bytes, with (mtime, size)
+# per file as a fast path, so a rebuild only runs face_encodings on images
+# that are new or changed. Stored as one JSON file, replaced atomically.
+
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+def file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _pack(encoding):
+    if encoding is None:
+        return None  # remembered "no face" so the image is not retried
+    return base64.b64encode(np.asarray(encoding, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def _unpack(blob):
+    if blob is None:
+        return None
+    return np.frombuffer(base64.b64decode(blob), dtype=np.float32).copy()
+
+
+class EncodingCache:
+    """On-disk map of image content -> face encoding (or None for no face).
+
+    `signature` names the encoder settings; a cache written with different
+    settings is discarded instead of returning stale encodings.
+    """
+
+    def __init__(self, path: str, signature: str = "default"):
+        self.path = path
+        self.signature = signature
+        self._lock = threading.Lock()
+        self._files = {}    # filename -> [mtime_ns, size, sha1]
+        self._blobs = {}    # sha1 -> packed encoding or None
+        self._dirty = False
+        self.load()
+
+    # ---------- persistence ----------
+    def load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return
+        if data.get("signature") != self.signature:
+            print("[EncodingCache] Encoder settings changed, starting fresh.")
+            return
+        self._files = data.get("files", {})
+        self._blobs = data.get("encodings", {})
+
+    def save(self) -> None:
+        with self._lock:
+            live = {entry[2] for entry in self._files.values()}
+            self._blobs = {h: b for h, b in self._blobs.items() if h in live}
+            data = {"signature": self.signature, "files": self._files, "encodings": self._blobs}
+            self._dirty = False
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(data, fh)
+            os.replace(tmp, self.path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    # ---------- lookups ----------
+    def _key(self, path: str):
+        """SHA-1 of path, re-hashing only when its mtime/size changed."""
+        st = os.stat(path)
+        name = os.path.basename(path)
+        entry = self._files.get(name)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return entry[2]
+        digest = file_sha1(path)
+        self._files[name] = [st.st_mtime_ns, st.st_size, digest]
+        self._dirty = True
+        return digest
+
+    def get_or_encode(self, path: str, encode_fn):
+        """Cached encoding for path, calling encode_fn(path) only on a miss.
+
+        Returns (encoding or None, was_cached).
+        """
+        with self._lock:
+            digest = self._key(path)
+            if digest in self._blobs:
+                return _unpack(self._blobs[digest]), True
+        encoding = encode_fn(path)
+        with self._lock:
+            self._blobs[digest] = _pack(encoding)
+            self._dirty = True
+        return encoding, False
+
+    def recorded(self, path: str):
+        """Encoding last recorded for path's file name (no stat, so it works before an overwrite), or None."""
+        with self._lock:
+            entry = self._files.get(os.path.basename(path))
+            return _unpack(self._blobs.get(entry[2])) if entry else None
+
+    def put(self, path: str, encoding) -> None:
+        """Record an encoding computed elsewhere (e.g. straight from a camera frame)."""
+        with self._lock:
+            self._blobs[self._key(path)] = _pack(encoding)
+            self._dirty = True
+
+    def sync_dir(self, folder: str, encode_fn):
+        """Encodings for every image in folder, encoding only new/changed files.
+
+        Files that disappeared are dropped from the cache. Returns
+        ([(filename, encoding), ...], stats) where stats counts
+        encoded/cached/removed files; images without a face are omitted.
+        """
+        names = sorted(fn for fn in os.listdir(folder) if fn.lower().endswith(IMAGE_EXTS))
+        with self._lock:
+            gone = set(self._files) - set(names)
+            for fn in gone:
+                del self._files[fn]
+            self._dirty = self._dirty or bool(gone)
+        out = []
+        stats = {"encoded": 0, "cached": 0, "removed": len(gone)}
+        for fn in names:
+            enc, cached = self.get_or_encode(os.path.join(folder, fn), encode_fn)
+            stats["cached" if cached else "encoded"] += 1
+            if enc is not None:
+                out.append((fn, enc))
+        if self._dirty:
+            self.save()
+        return out, stats
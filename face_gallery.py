@@ -0,0 +1,336 @@
+# Kanan AI – shared face gallery
+# One matcher for server.py, kanan_ai.py and image_processing.py.
+# Known encodings live in a contiguous float32 (N, 128) matrix and every
+# probe is scored against every identity in a single batched computation.
+
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+ENCODING_DIM = 128
+DEFAULT_TOLERANCE = 0.6
+ROW_OVERSAMPLE = 4  # rows fetched per requested identity from an approximate index
+
+Match = namedtuple("Match", ["name", "distance"])
+
+
+def _as_matrix(encodings) -> np.ndarray:
+    """Coerce one encoding or a list/array of encodings to float32 (M, 128)."""
+    arr = np.asarray(encodings, dtype=np.float32)
+    if arr.size == 0:
+        return np.empty((0, ENCODING_DIM), dtype=np.float32)
+    if arr.ndim == 1:
+        arr = arr[None, :]
+    if arr.ndim != 2 or arr.shape[1] != ENCODING_DIM:
+        raise ValueError(f"Expected encodings of shape (M, {ENCODING_DIM}), got {arr.shape}")
+    return np.ascontiguousarray(arr)
+
+
+def pairwise_distances(probes: np.ndarray, known: np.ndarray, known_sq=None) -> np.ndarray:
+    """Euclidean distances (P, N) between probe rows and known rows.
+
+    Same metric as face_recognition.face_distance, computed as one matrix
+    product instead of a Python loop over probes.
+    """
+    if known_sq is None:
+        known_sq = np.einsum("ij,ij->i", known, known)
+    probe_sq = np.einsum("ij,ij->i", probes, probes)
+    d2 = probe_sq[:, None] + known_sq[None, :] - 2.0 * (probes @ known.T)
+    np.maximum(d2, 0.0, out=d2)
+    return np.sqrt(d2, out=d2)
+
+
+class FaceGallery:
+    """Known faces: several encodings per name, matched in batches."""
+
+    def __init__(self, tolerance: float = DEFAULT_TOLERANCE, capacity: int = 64):
+        self.tolerance = tolerance
+        self._lock = threading.Lock()
+        self._enc = np.empty((max(capacity, 1), ENCODING_DIM), dtype=np.float32)
+        self._labels = np.empty(max(capacity, 1), dtype=np.int32)
+        self._n = 0
+        self._names = []        # identity id -> name
+        self._ids = {}          # name -> identity id
+        self._view = None       # cached snapshot used by readers
+        self._index = None      # optional ann_index.IVFIndex over the same rows
+        self._epoch = 0         # bumped when rows are removed or renumbered
+
+    @classmethod
+    def from_lists(cls, encodings, names, tolerance: float = DEFAULT_TOLERANCE):
+        """Build a gallery from parallel lists (the old known_faces/known_names)."""
+        gallery = cls(tolerance=tolerance, capacity=len(names))
+        if len(names):
+            gallery.add_many(names, encodings)
+        return gallery
+
+    def enable_index(self, background: bool = False, **kwargs) -> None:
+        """Route matching through an approximate IVF index once it is trained.
+
+        kwargs go to ann_index.IVFIndex (n_lists, n_probe, min_train_size).
+        Small galleries stay on the exact scan until min_train_size rows exist.
+        background=True indexes the existing rows (k-means) on a thread;
+        matching stays exact until the index is ready, so loading does not wait.
+        """
+        from ann_index import IVFIndex
+
+        if background:
+            threading.Thread(target=self._build_index, args=(IVFIndex, kwargs),
+                             name="gallery-index", daemon=True).start()
+            return
+        with self._lock:
+            self._index = IVFIndex(**kwargs)
+            if self._n:
+                self._index.add(self._enc[:self._n])
+
+    def _build_index(self, cls, kwargs) -> None:
+        while True:
+            with self._lock:
+                enc, n, epoch = self._enc, self._n, self._epoch
+            index = cls(**kwargs)
+            if n:
+                index.add(enc[:n])  # rows below n are never rewritten while the epoch holds
+            with self._lock:
+                if epoch != self._epoch:
+                    continue        # rows were removed meanwhile: index the new numbering
+                if self._n > n:
+                    index.add(self._enc[n:self._n])
+                self._index = index
+                return
+
+    def _reindex(self) -> None:
+        old = self._index
+        self._index = type(old)(n_lists=None, n_probe=old.n_probe,
+                                min_train_size=old.min_train_size, seed=old.seed)
+        if self._n:
+            self._index.add(self._enc[:self._n])
+
+    @classmethod
+    def from_matrix(cls, encodings, row_names, tolerance: float = DEFAULT_TOLERANCE):
+        """Adopt an existing (N, 128) float32 matrix (e.g. a memmap) without copying.
+
+        The matrix is only read; the first add() moves rows to a private buffer.
+        """
+        enc = np.asarray(encodings)
+        if enc.dtype != np.float32 or not enc.flags.c_contiguous:
+            return cls.from_lists(enc, row_names, tolerance=tolerance)
+        names = []
+        ids = {}
+        labels = np.empty(len(row_names), dtype=np.int32)
+        for i, name in enumerate(row_names):
+            ident = ids.get(name)
+            if ident is None:
+                ident = ids[name] = len(names)
+                names.append(name)
+            labels[i] = ident
+        return cls.from_labels(enc, labels, names, tolerance=tolerance)
+
+    @classmethod
+    def from_labels(cls, encodings, labels, identities, tolerance: float = DEFAULT_TOLERANCE):
+        """Adopt an (N, 128) float32 matrix and (N,) identity ids (e.g. GalleryStore memmaps).
+
+        identities[label] is each row's name. Nothing is copied or looped
+        over per row; the first add() moves rows to private buffers.
+        """
+        enc = np.asarray(encodings)
+        if enc.dtype != np.float32 or not enc.flags.c_contiguous:
+            enc = _as_matrix(enc)
+        gallery = cls(tolerance=tolerance, capacity=1)
+        gallery._enc, gallery._labels = enc, np.asarray(labels, dtype=np.int32)
+        gallery._n = len(enc)
+        gallery._names = list(identities)
+        gallery._ids = {name: i for i, name in enumerate(gallery._names)}
+        return gallery
+
+    # ---------- mutation ----------
+    def add(self, name: str, encoding) -> None:
+        self.add_many([name], _as_matrix(encoding))
+
+    def add_many(self, names, encodings) -> None:
+        encs = _as_matrix(encodings)
+        if len(names) != len(encs):
+            raise ValueError("names and encodings must have the same length")
+        with self._lock:
+            need = self._n + len(encs)
+            if need > len(self._enc):
+                cap = max(need, 2 * len(self._enc))
+                enc = np.empty((cap, ENCODING_DIM), dtype=np.float32)
+                enc[:self._n] = self._enc[:self._n]
+                labels = np.empty(cap, dtype=np.int32)
+                labels[:self._n] = self._labels[:self._n]
+                self._enc, self._labels = enc, labels
+            for i, name in enumerate(names):
+                ident = self._ids.get(name)
+                if ident is None:
+                    ident = self._ids[name] = len(self._names)
+                    self._names.append(name)
+                self._labels[self._n + i] = ident
+            self._enc[self._n:need] = encs
+            self._n = need
+            if self._index is not None:
+                self._index.add(encs)
+            self._view = None
+
+    def remove(self, name: str) -> int:
+        """Drop every encoding for name. Returns the number of rows removed."""
+        with self._lock:
+            ident = self._ids.get(name)
+            if ident is None:
+                return 0
+            return self._drop(self._labels[:self._n] == ident)
+
+    def remove_encoding(self, name: str, encoding) -> int:
+        """Drop name's rows equal to encoding (e.g. one re-taken photo); other rows stay."""
+        probe = _as_matrix(encoding)[0]
+        with self._lock:
+            ident = self._ids.get(name)
+            if ident is None:
+                return 0
+            same = np.abs(self._enc[:self._n] - probe).max(axis=1) <= 1e-6
+            return self._drop((self._labels[:self._n] == ident) & same)
+
+    def _drop(self, drop) -> int:
+        """Remove the rows where drop is True (caller holds the lock); identities left without rows go too."""
+        removed = int(drop.sum())
+        if not removed:
+            return 0
+        keep = ~drop
+        enc = self._enc[:self._n][keep]
+        labels = self._labels[:self._n][keep]
+        # Renumber identities so the ones that still have rows stay dense, in enrollment order
+        used = np.zeros(len(self._names), dtype=bool)
+        used[labels] = True
+        new_id = np.cumsum(used) - 1
+        labels = new_id[labels].astype(np.int32)
+        self._names = [n for n, u in zip(self._names, used) if u]
+        self._ids = {n: i for i, n in enumerate(self._names)}
+        self._enc = np.empty((max(len(enc), 1), ENCODING_DIM), dtype=np.float32)
+        self._labels = np.empty(max(len(enc), 1), dtype=np.int32)
+        self._enc[:len(enc)] = enc
+        self._labels[:len(enc)] = labels
+        self._n = len(enc)
+        self._epoch += 1
+        if self._index is not None:
+            self._reindex()
+        self._view = None
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            # Fresh buffers: snapshots handed out earlier keep reading the old rows
+            self._enc = np.empty((len(self._enc), ENCODING_DIM), dtype=np.float32)
+            self._labels = np.empty(len(self._enc), dtype=np.int32)
+            self._n = 0
+            self._epoch += 1
+            self._names = []
+            self._ids = {}
+            if self._index is not None:
+                self._reindex()
+            self._view = None
+
+    # ---------- inspection ----------
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def names(self) -> list:
+        """Distinct identity names, in enrollment order."""
+        return list(self._names)
+
+    @property
+    def encodings(self) -> np.ndarray:
+        """The (N, 128) float32 encoding matrix (read-only view)."""
+        return self._snapshot()[0]
+
+    @property
+    def row_names(self) -> list:
+        """Name of every encoding row, parallel to `encodings`."""
+        view = self._snapshot()
+        return [view[2][i] for i in view[1]]
+
+    def _snapshot(self):
+        """Immutable view (enc, labels, names, sq_norms, order, starts) for readers."""
+        view = self._view
+        if view is None:
+            with self._lock:
+                # Rows below _n are never written in place (add appends, remove
+                # and clear reallocate), so readers can share them without a copy
+                enc = self._enc[:self._n].view()
+                enc.flags.writeable = False
+                labels = self._labels[:self._n].copy()
+                order = np.argsort(labels, kind="stable")
+                starts = np.flatnonzero(np.r_[True, np.diff(labels[order]) != 0]) if self._n else order
+                sq = np.einsum("ij,ij->i", enc, enc)
+                view = self._view = (enc, labels, tuple(self._names), sq, order, starts)
+        return view
+
+    # ---------- matching ----------
+    def identity_distances(self, probes):
+        """Distance from every probe to every identity: (P, n_identities).
+
+        Each identity scores as its closest enrolled encoding.
+        """
+        probes = _as_matrix(probes)
+        enc, labels, names, sq, order, starts = self._snapshot()
+        if not len(enc) or not len(probes):
+            return np.empty((len(probes), len(names)), dtype=np.float32), names
+        d = pairwise_distances(probes, enc, sq)
+        per_ident = np.minimum.reduceat(d[:, order], starts, axis=1)
+        return per_ident, tuple(names[labels[order[s]]] for s in starts)
+
+    def match(self, probes, k: int = 1, tolerance=None) -> list:
+        """Top-k identities per probe as lists of Match(name, distance).
+
+        Only identities within tolerance are returned, closest first.
+        """
+        tol = self.tolerance if tolerance is None else tolerance
+        index = self._index
+        if index is not None and index.trained:
+            return self._match_indexed(index, probes, k, tol)
+        dists, names = self.identity_distances(probes)
+        out = []
+        if not dists.size:
+            return [[] for _ in range(len(dists))]
+        k = min(k, dists.shape[1])
+        top = np.argpartition(dists, k - 1, axis=1)[:, :k] if k < dists.shape[1] else \
+            np.broadcast_to(np.arange(dists.shape[1]), dists.shape)
+        for row, idx in zip(dists, top):
+            idx = idx[np.argsort(row[idx], kind="stable")]
+            out.append([Match(names[i], float(row[i])) for i in idx if row[i] <= tol])
+        return out
+
+    def _match_indexed(self, index, probes, k, tol) -> list:
+        """Approximate top-k identities from the IVF index's nearest rows."""
+        _, labels, names, *_ = self._snapshot()
+        dists, rows = index.search(probes, k=k * ROW_OVERSAMPLE)
+        out = []
+        for drow, irow in zip(dists, rows):
+            found = {}
+            for d, i in zip(drow, irow):
+                if i < 0 or d > tol or len(found) == k:
+                    break
+                if i < len(labels):
+                    found.setdefault(names[labels[i]], float(d))
+            out.append([Match(n, d) for n, d in found.items()])
+        return out
+
+    def best(self, probes, tolerance=None) -> list:
+        """Best identity per probe: Match(name or None, distance)."""
+        tol = self.tolerance if tolerance is None else tolerance
+        index = self._index
+        if index is not None and index.trained:
+            nearest = self._match_indexed(index, probes, 1, float("inf"))
+            return [
+                Match(m[0].name if m[0].distance <= tol else None, m[0].distance)
+                if m else Match(None, float("inf"))
+                for m in nearest
+            ]
+        dists, names = self.identity_distances(probes)
+        if not dists.size:
+            return [Match(None, float("inf")) for _ in range(len(dists))]
+        idx = dists.argmin(axis=1)
+        out = []
+        for row, i in zip(dists, idx):
+            d = float(row[i])
+            out.append(Match(names[i] if d <= tol else None, d))
+        return out
@@ -0,0 +1,217 @@
+# Kanan AI – lightweight face tracking between detections
+# Full HOG detection runs every `detect_every` frames (or sooner when flow
+# tracking loses confidence). In between, boxes follow the face with sparse
+# Lucas-Kanade optical flow. Detections are associated with existing tracks
+# by IoU, so a known track keeps its name and only new tracks are encoded.
+
+import itertools
+import threading
+
+import cv2
+import numpy as np
+
+MIN_POINTS = 4          # flow points a track needs to be followed without detection
+
+
+def iou(a, b) -> float:
+    """Intersection over union of two (top, right, bottom, left) boxes."""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    """One face followed across frames."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, box):
+        self.id = next(self._ids)
+        self.box = tuple(float(v) for v in box)   # (top, right, bottom, left)
+        self.name = None                          # None until identified
+        self.distance = None
+        self.points = None                        # flow features inside the box
+        self.confidence = 1.0                     # share of flow points still tracked
+        self.misses = 0                           # detections in a row without a match
+        self.requested = False                    # handed out by pending(), awaiting assign()
+
+    @property
+    def location(self):
+        """Integer (top, right, bottom, left), as face_recognition returns them."""
+        return tuple(int(round(v)) for v in self.box)
+
+
+class FaceTracker:
+    """Keeps identities across frames and limits encoding to new faces.
+
+    detect_fn(rgb) -> [(top, right, bottom, left), ...]
+    identify_fn(rgb, locations) -> [Match(name or None, distance), ...]
+
+    With identify_fn=None identification is left to the caller (e.g. another
+    pipeline stage): pending() hands out unidentified tracks and assign()
+    writes the results back.
+    """
+
+    def __init__(self, detect_fn, identify_fn, detect_every: int = 5,
+                 iou_threshold: float = 0.3, max_misses: int = 2,
+                 min_confidence: float = 0.5):
+        self.detect_fn = detect_fn
+        self.identify_fn = identify_fn
+        self.detect_every = detect_every
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.min_confidence = min_confidence
+        self.tracks = []
+        self._prev_gray = None
+        self._since_detect = detect_every  # detect on the first frame
+        self._lock = threading.Lock()
+        self.stats = {"frames": 0, "detections": 0, "encoded_faces": 0}
+
+    def invalidate(self) -> None:
+        """Forget identities (e.g. after the gallery changed); faces are re-encoded on the next detection."""
+        with self._lock:
+            for t in self.tracks:
+                t.name = None
+                t.distance = None
+                t.requested = False
+            self._since_detect = self.detect_every
+
+    def pending(self) -> list:
+        """(track id, location) of tracks that still need identifying; marks them requested."""
+        with self._lock:
+            out = [(t.id, t.location) for t in self.tracks
+                   if t.name is None and not t.requested and t.misses == 0]
+            for t in self.tracks:
+                if t.name is None and t.misses == 0:
+                    t.requested = True
+            return out
+
+    def assign(self, track_ids, matches, only_unknown: bool = False) -> None:
+        """Store identification results for tracks returned by pending().
+        only_unknown=True leaves tracks that were identified meanwhile alone."""
+        with self._lock:
+            by_id = {t.id: t for t in self.tracks}
+            for tid, m in zip(track_ids, matches):
+                t = by_id.get(tid)
+                if t is not None and not (only_unknown and t.name is not None):
+                    t.name, t.distance = m.name, m.distance
+                    t.requested = False
+
+    def identified(self) -> list:
+        """(name, location) for every track with a known identity."""
+        with self._lock:
+            return [(t.name, t.location) for t in self.tracks if t.name is not None]
+
+    def update(self, rgb) -> list:
+        """Advance one frame; returns the current tracks."""
+        with self._lock:
+            return list(self._update(rgb))
+
+    def _update(self, rgb) -> list:
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        self.stats["frames"] += 1
+        self._since_detect += 1
+        if self._prev_gray is not None and self._prev_gray.shape != gray.shape:
+            # Detection resolution changed: old boxes are in the wrong coordinates
+            self.tracks = []
+            self._prev_gray = None
+            self._since_detect = self.detect_every
+
+        if self.tracks and self._prev_gray is not None:
+            self._follow(gray)
+
+        low_confidence = any(t.confidence < self.min_confidence for t in self.tracks)
+        if self._since_detect >= self.detect_every or low_confidence:
+            self._detect(rgb)
+            self._since_detect = 0
+
+        self._seed_points(gray)
+        self._prev_gray = gray
+        return self.tracks
+
+    # ---------- detection + association ----------
+    def _detect(self, rgb) -> None:
+        self.stats["detections"] += 1
+        locations = self.detect_fn(rgb)
+        pairs = sorted(
+            ((iou(t.box, loc), ti, li) for ti, t in enumerate(self.tracks) for li, loc in enumerate(locations)),
+            reverse=True,
+        )
+        used_t, used_l = set(), set()
+        for score, ti, li in pairs:
+            if score < self.iou_threshold:
+                break
+            if ti in used_t or li in used_l:
+                continue
+            used_t.add(ti)
+            used_l.add(li)
+            track = self.tracks[ti]
+            track.box = tuple(float(v) for v in locations[li])
+            track.points = None  # re-seed features on the fresh box
+            track.confidence = 1.0
+            track.misses = 0
+            track.requested = False  # unknown faces get another try on every detection
+
+        survivors = []
+        for ti, t in enumerate(self.tracks):
+            if ti not in used_t:
+                t.misses += 1
+                if t.misses > self.max_misses:
+                    continue
+            survivors.append(t)
+        self.tracks = survivors + [Track(loc) for li, loc in enumerate(locations) if li not in used_l]
+
+        # Encode only faces without an identity (new tracks, or unknown ones worth a retry)
+        pending = [t for t in self.tracks if t.name is None and t.misses == 0]
+        if pending and self.identify_fn is not None:
+            self.stats["encoded_faces"] += len(pending)
+            for t, m in zip(pending, self.identify_fn(rgb, [t.location for t in pending])):
+                t.name, t.distance = m.name, m.distance
+
+    # ---------- optical flow ----------
+    def _seed_points(self, gray) -> None:
+        h, w = gray.shape
+        for t in self.tracks:
+            if t.points is not None and len(t.points) >= MIN_POINTS:
+                continue
+            top, right, bottom, left = t.location
+            mask = np.zeros_like(gray)
+            mask[max(0, top):min(h, bottom), max(0, left):min(w, right)] = 255
+            t.points = cv2.goodFeaturesToTrack(gray, maxCorners=20, qualityLevel=0.01,
+                                               minDistance=3, mask=mask)
+
+    def _follow(self, gray) -> None:
+        """Shift every track by the median flow of its feature points (one LK call for all)."""
+        live = [t for t in self.tracks if t.points is not None and len(t.points)]
+        for t in self.tracks:
+            if t not in live:
+                t.confidence = 0.0
+        if not live:
+            return
+        pts = np.concatenate([t.points for t in live]).astype(np.float32)
+        nxt, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, pts, None,
+                                                 winSize=(15, 15), maxLevel=2)
+        status = status.ravel() == 1
+        h, w = gray.shape
+        start = 0
+        for t in live:
+            n = len(t.points)
+            ok = status[start:start + n]
+            old, new = pts[start:start + n][ok], nxt[start:start + n][ok]
+            start += n
+            t.confidence = ok.mean() if n else 0.0
+            if len(new) < MIN_POINTS:
+                t.points = None
+                t.confidence = 0.0
+                continue
+            dx, dy = np.median(new - old, axis=0).ravel()
+            top, right, bottom, left = t.box
+            t.box = (
+                float(np.clip(top + dy, 0, h)), float(np.clip(right + dx, 0, w)),
+                float(np.clip(bottom + dy, 0, h)), float(np.clip(left + dx, 0, w)),
+            )
+            t.points = new.reshape(-1, 1, 2)
@@ -0,0 +1,113 @@
+# Kanan AI – detection/encoding work units
+# Kept free of Flask and gallery state so it can run inside worker processes
+# (they import only this module, not server.py).
+
+import io
+import time
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+import face_recognition
+
+# Accuracy/latency profiles, selectable per request.
+#   max_side     longest image side before detection (None = full resolution)
+#   upsample     HOG detector upsample count (0 misses small faces, 1 is dlib's default)
+#   num_jitters  re-sampled encodings averaged per face
+#   model        landmark model: "small" (5 points) or "large" (68 points)
+PROFILES = {
+    "fast":     {"max_side": 480,  "upsample": 0, "num_jitters": 1, "model": "small"},
+    "balanced": {"max_side": 960,  "upsample": 1, "num_jitters": 1, "model": "large"},
+    "accurate": {"max_side": None, "upsample": 1, "num_jitters": 3, "model": "large"},
+}
+DEFAULT_PROFILE = "accurate"  # what /recognize has always done
+
+
+def decode_image(data, max_side=None):
+    """Decode uploaded bytes once, in memory, into the RGB array used for detection.
+
+    With max_side the image is shrunk during decode (JPEG DCT scaling, then a
+    resize), so large uploads never materialise at full size.
+    Returns (rgb array, PIL format, (orig width, orig height)).
+    Raises ValueError for unreadable images, or ones over PIL's pixel limit.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        fmt = img.format
+        orig = img.size
+        if max_side and max(orig) > max_side:
+            scale = max_side / max(orig)
+            target = (max(1, round(orig[0] * scale)), max(1, round(orig[1] * scale)))
+            img.draft("RGB", target)
+            img = img.resize(target, Image.BILINEAR)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        return np.asarray(img), fmt, orig
+    except Image.DecompressionBombError as e:
+        raise ValueError("Image too large") from e
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError("Unreadable image") from e
+
+
+def encode_image(image, num_jitters=3, model="large", upsample=1, timings=None):
+    """Detect faces and encode them. Returns (locations, float32 (M, 128) encodings).
+
+    If timings is a dict, "detect" and "encode" seconds are stored in it.
+    """
+    t = time.perf_counter()
+    locations = face_recognition.face_locations(image, number_of_times_to_upsample=upsample)
+    t_detect = time.perf_counter()
+    if timings is not None:
+        timings["detect"] = t_detect - t
+        timings["encode"] = 0.0
+    if not locations:
+        return [], np.empty((0, 128), dtype=np.float32)
+    encodings = face_recognition.face_encodings(image, locations, num_jitters=num_jitters, model=model)
+    if timings is not None:
+        timings["encode"] = time.perf_counter() - t_detect
+    return locations, np.asarray(encodings, dtype=np.float32)
+
+
+def process_upload(data, profile=DEFAULT_PROFILE):
+    """Worker entry point: bytes in, {"locations", "encodings", ...} or {"error"} out.
+
+    Locations are (top, right, bottom, left) in the original image's pixels.
+    "timings" holds decode/detect/encode seconds, measured where the work ran
+    (the caller records them, since worker processes have their own metrics).
+    """
+    p = PROFILES[profile]
+    t = time.perf_counter()
+    try:
+        image, fmt, orig = decode_image(data, p["max_side"])
+    except ValueError as e:
+        return {"error": str(e)}
+    timings = {"decode": time.perf_counter() - t}
+    locations, encodings = encode_image(image, num_jitters=p["num_jitters"],
+                                        model=p["model"], upsample=p["upsample"], timings=timings)
+    sx, sy = orig[0] / image.shape[1], orig[1] / image.shape[0]
+    if sx != 1 or sy != 1:
+        locations = [(round(t * sy), round(r * sx), round(b * sy), round(l * sx))
+                     for t, r, b, l in locations]
+    return {"locations": locations, "encodings": encodings,
+            "size": orig, "format": fmt, "profile": profile, "timings": timings}
+
+
+def process_file(path, profile=DEFAULT_PROFILE):
+    """process_upload for a file on disk, read inside the worker (no bytes over IPC)."""
+    try:
+        with open(path, "rb") as fh:
+            data = fh.read()
+    except OSError as e:
+        return {"error": str(e)}
+    return process_upload(data, profile)
+
+
+def largest_face(out):
+    """Index of the biggest detected face in a process_upload result, or None."""
+    areas = [(b - t) * (r - l) for t, r, b, l in out.get("locations", ())]
+    return max(range(len(areas)), key=areas.__getitem__) if areas else None
+
+
+def warm_up(_=None):
+    """No-op task used to start workers (and load dlib's models) before serving."""
+    return True
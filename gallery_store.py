@@ -0,0 +1,251 @@
+# Kanan AI – append-only face gallery store
+# Replaces the pickled faces_data.npy with append-only files:
+#   encodings.f32     raw float32 rows (N x 128), opened with np.memmap
+#   labels.i32        raw int32 identity id per row, opened with np.memmap
+#   identities.txt    one UTF-8 line per identity (the name), in first-seen order
+#   index.jsonl       one JSON line per row: {"name", "source", "ts"}
+# Loading maps the two matrices and splits the identities blob, so startup
+# runs no per-row Python; index.jsonl is only parsed when its metadata is
+# asked for (bulk import's already-imported sources).
+#
+# A row exists only once its index line is complete (the other files are
+# written and fsynced first), so a crash mid-append leaves at most a torn
+# tail that is trimmed when the writer next opens it. Only the process that
+# appends may repair: a reader (repair=False) ignores a torn tail instead of
+# truncating rows another process is still writing.
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from face_gallery import ENCODING_DIM, _as_matrix
+
+ROW_BYTES = ENCODING_DIM * 4
+LABEL_BYTES = 4
+
+
+def _complete(path: str) -> bytes:
+    """File contents up to the last newline (anything after it is a torn write)."""
+    if not os.path.exists(path):
+        return b""
+    with open(path, "rb") as fh:
+        raw = fh.read()
+    return raw[:raw.rfind(b"\n") + 1]
+
+
+def _lines(blob: bytes) -> list:
+    """Names from complete newline-terminated UTF-8 lines."""
+    return blob.decode("utf-8").split("\n")[:-1] if blob else []
+
+
+def _blob(names) -> bytes:
+    return "".join(n + "\n" for n in names).encode("utf-8")
+
+
+def _size(path: str) -> int:
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def _truncate(path: str, size: int) -> None:
+    if _size(path) != size:
+        with open(path, "r+b" if os.path.exists(path) else "wb") as fh:
+            fh.truncate(size)
+
+
+def _append(path: str, data: bytes) -> None:
+    with open(path, "ab") as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+class GalleryStore:
+    """Float32 encoding matrix plus per-row identity labels and metadata, append-only."""
+
+    def __init__(self, folder: str, repair: bool = True):
+        self.folder = folder
+        self.repair = repair
+        self.enc_path = os.path.join(folder, "encodings.f32")
+        self.labels_path = os.path.join(folder, "labels.i32")
+        self.identities_path = os.path.join(folder, "identities.txt")
+        self.index_path = os.path.join(folder, "index.jsonl")
+        self._lock = threading.Lock()
+        self._meta = None          # parsed index.jsonl, loaded on first use
+        self._labels = None        # labels rebuilt in memory (reader of a store without labels.i32)
+        os.makedirs(folder, exist_ok=True)
+        self._open()
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _open(self) -> None:
+        index = _complete(self.index_path)
+        self._n = index.count(b"\n")   # committed rows; no JSON parsing
+        self._index_size = len(index)
+        rows = _size(self.enc_path) // ROW_BYTES
+        if rows < self._n:
+            # Index ahead of data should not happen (data is synced first); keep what is backed
+            print(f"⚠️ Gallery store index has {self._n} rows but only {rows} encodings.")
+            self._n = rows
+            if self.repair:
+                self._rewrite_index(self.meta[:rows])
+        if _size(self.labels_path) // LABEL_BYTES < self._n:
+            # Store written before labels.i32 existed: derive labels once from index.jsonl
+            self.identities = self._rebuild_labels()
+        else:
+            self.identities = _lines(_complete(self.identities_path))
+        labels = self.labels()
+        # Identities no committed row uses come from a torn append; ids are first-seen order
+        self.identities = self.identities[:int(labels.max()) + 1 if len(labels) else 0]
+        if self.repair:
+            _truncate(self.index_path, self._index_size)
+            _truncate(self.enc_path, self._n * ROW_BYTES)
+            _truncate(self.labels_path, self._n * LABEL_BYTES)
+            self._rewrite_identities()
+        self._ids = None  # name -> identity id, built by the first append
+
+    def _rebuild_labels(self) -> list:
+        """Labels from the parsed index (written out unless read-only); returns the identities."""
+        ids, identities = {}, []
+        labels = np.empty(self._n, dtype=np.int32)
+        for i, m in enumerate(self.meta[:self._n]):
+            ident = ids.get(m["name"])
+            if ident is None:
+                ident = ids[m["name"]] = len(identities)
+                identities.append(m["name"])
+            labels[i] = ident
+        if not self.repair:
+            self._labels = labels
+            return identities
+        with open(self.labels_path, "wb") as fh:
+            fh.write(labels.tobytes())
+            fh.flush()
+            os.fsync(fh.fileno())
+        self._write_identities(identities)
+        return identities
+
+    def _write_identities(self, identities) -> None:
+        tmp = self.identities_path + ".tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(_blob(identities))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.identities_path)
+
+    def _rewrite_identities(self) -> None:
+        """Drop a torn or unused identities tail (only rewritten when it differs)."""
+        if _size(self.identities_path) != len(_blob(self.identities)):
+            self._write_identities(self.identities)
+
+    def _rewrite_index(self, meta) -> None:
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            for m in meta:
+                fh.write(json.dumps(m) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.index_path)
+        self._meta = list(meta)
+        self._index_size = _size(self.index_path)
+
+    # ---------- reading ----------
+    @property
+    def meta(self) -> list:
+        """{"name", "source", "ts"} per row (parses index.jsonl on first use)."""
+        if self._meta is None:
+            lines = _complete(self.index_path).splitlines()[:self._n]
+            self._meta = [json.loads(line) for line in lines]
+        return self._meta
+
+    @property
+    def names(self) -> list:
+        """Name of every row, in row order."""
+        return [self.identities[i] for i in self.labels()]
+
+    def encodings(self) -> np.ndarray:
+        """Read-only (N, 128) float32 memmap of every committed row."""
+        if not self._n:
+            return np.empty((0, ENCODING_DIM), dtype=np.float32)
+        return np.memmap(self.enc_path, dtype=np.float32, mode="r", shape=(self._n, ENCODING_DIM))
+
+    def labels(self) -> np.ndarray:
+        """Read-only (N,) int32 identity id per row; identities[label] is its name."""
+        if self._labels is not None:
+            return self._labels[:self._n]
+        if not self._n:
+            return np.empty(0, dtype=np.int32)
+        return np.memmap(self.labels_path, dtype=np.int32, mode="r", shape=(self._n,))
+
+    # ---------- writing ----------
+    def append(self, names, encodings, sources=None) -> None:
+        """Append rows without touching existing ones.
+
+        Encodings, labels and new identities are written and fsynced before
+        the index lines, so a row only becomes visible once all are on disk.
+        """
+        encs = _as_matrix(encodings)
+        if len(names) != len(encs):
+            raise ValueError("names and encodings must have the same length")
+        if any("\n" in n or "\r" in n for n in names):
+            raise ValueError("names must be single lines")
+        if not len(encs):
+            return
+        if not self.repair:
+            raise RuntimeError("store opened read-only (repair=False)")
+        now = time.time()
+        sources = sources or [None] * len(names)
+        meta = [{"name": n, "source": src, "ts": now} for n, src in zip(names, sources)]
+        with self._lock:
+            if self._ids is None:
+                self._ids = {name: i for i, name in enumerate(self.identities)}
+            new = []
+            labels = np.empty(len(names), dtype=np.int32)
+            for i, name in enumerate(names):
+                ident = self._ids.get(name)
+                if ident is None:
+                    ident = self._ids[name] = len(self.identities) + len(new)
+                    new.append(name)
+                labels[i] = ident
+            lines = "".join(json.dumps(m) + "\n" for m in meta).encode("utf-8")
+            paths = (self.enc_path, self.labels_path, self.identities_path, self.index_path)
+            sizes = [_size(path) for path in paths]
+            try:
+                _append(self.enc_path, encs.tobytes())
+                _append(self.labels_path, labels.tobytes())
+                if new:
+                    _append(self.identities_path, _blob(new))
+                _append(self.index_path, lines)
+            except BaseException:
+                # e.g. ENOSPC part-way: cut every file back so the next append lines up again
+                for name in new:
+                    del self._ids[name]
+                for path, size in zip(paths, sizes):
+                    try:
+                        _truncate(path, size)
+                    except OSError as e:
+                        print(f"⚠️ Gallery store rollback of {path} failed: {e}")
+                raise
+            self.identities.extend(new)
+            if self._meta is not None:
+                self._meta.extend(meta)
+            self._n += len(names)
+            self._index_size += len(lines)
+
+
+def migrate_npy(npy_path: str, store: GalleryStore) -> int:
+    """One-time import of the legacy pickled {"encodings", "names"} file.
+
+    Does nothing if the store already has rows, so it is safe to call on
+    every startup. The old file is left in place. Returns rows imported.
+    """
+    if len(store) or not os.path.exists(npy_path):
+        return 0
+    data = np.load(npy_path, allow_pickle=True).item()
+    names = list(data["names"])
+    if names:
+        store.append(names, data["encodings"], sources=[os.path.basename(npy_path)] * len(names))
+    print(f"📦 Migrated {len(names)} faces from {npy_path} to {store.folder}")
+    return len(names)
@@ -1,9 +1,9 @@
 import os
 import cv2
 import face_recognition
-import numpy as np
 import bluetooth_audio  
 import time
+from face_gallery import FaceGallery
 
 # Test if the 'speak' function is present in the bluetooth_audio module
 print("Attributes of bluetooth_audio:", dir(bluetooth_audio))  # Debugging the module
@@ -15,8 +15,7 @@ def load_face(image_path):
     return encoding[0] if encoding else None  # Handle case where no face is detected
 
 # Store known faces and names
-known_faces = []
-known_names = []
+gallery = FaceGallery(tolerance=0.6)
 
 # Add known faces
 # Use correct path for uploaded images
@@ -33,8 +32,7 @@ faces_list = [
 for name, img_path in faces_list:
     encoding = load_face(img_path)
     if encoding is not None:
-        known_faces.append(encoding)
-        known_names.append(name)
+        gallery.add(name, encoding)
     else:
         print(f"Warning: No face detected in {img_path}. Skipping.")
 
@@ -56,13 +54,14 @@ while True:
 
     detected_faces = set()  # Temporary storage for currently detected faces
 
-    for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-        face_distances = face_recognition.face_distance(known_faces, face_encoding)
-        best_match_index = np.argmin(face_distances)
+    # Match every face in the frame against the gallery in one batch
+    best_matches = gallery.best(face_encodings) if face_encodings else []
+
+    for (top, right, bottom, left), match in zip(face_locations, best_matches):
         name = "Unknown"
 
-        if face_distances[best_match_index] < 0.6:
-            name = known_names[best_match_index]
+        if match.name is not None:
+            name = match.name
             detected_faces.add(name)  # Add detected name to the set
 
             # Announce only if the face was gone for 3+ seconds or is newly detected
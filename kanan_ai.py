@@ -2,16 +2,44 @@
 # Kanan AI – Faces + OCR + Objects (no "person", no confidence ratios)
 # Local (Pi): camera + faces + TTS (Piper)
 # Cloud (EC2): OCR + object detection via FastAPI (/analyze)
-
-import os, cv2, time, json, queue, threading, requests, numpy as np, re, subprocess, shutil, tempfile
-import face_recognition, datetime, sounddevice as sd
-from vosk import Model as VoskModel, KaldiRecognizer
+#
+# Importing this module has no side effects. main() runs startup(), which
+# loads the camera, face gallery, Vosk model and Piper concurrently and
+# reports how long each phase took, then starts the pipeline.
+# main(["--replay", "clip.mp4"]) runs the same pipeline headless on recorded
+# footage (see replay.py) and logs recognitions and announcements to JSONL.
+
+import os, cv2, time, json, threading, logging, numpy as np, re, shutil, collections, datetime, argparse
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from face_gallery import FaceGallery, Match
+from encoding_cache import EncodingCache
+from face_tracker import FaceTracker
+from roi_detector import MultiResDetector
+from pipeline import LatestQueue, Pipeline, Stage
+from camera import Camera
+from replay import EventLog, ReplaySource
+from battery_monitor import PowerGovernor, battery_source
+from scene_change import SceneChangeDetector
+from piper_tts import PiperTTS
+from cloud_client import CloudClient, MatchClient
+from voice_commands import BLOCK_SIZE, COMMAND_PHRASES, SAMPLE_RATE, CommandListener, CommandTable
+from speech_queue import URGENT, HIGH, NORMAL, LOW
 
 # ---------- CONFIG ----------
-AWS_URL = None  # Cloud endpoint disabled in public repo
+AWS_URL = os.environ.get("KANAN_CLOUD_URL")  # e.g. http://host:8000/analyze; unset = cloud disabled
+MATCH_URL = os.environ.get("KANAN_MATCH_URL")  # e.g. http://host:5000/match; unset = local gallery only
 BASE_DIR = os.path.expanduser("~/FaceRecognition")
 KNOWN_FACES_DIR = os.path.join(BASE_DIR, "uploads")
 VOSK_DIR = os.path.join(BASE_DIR, "vosk-model")
+ENCODING_CACHE_FILE = os.path.join(BASE_DIR, "encodings_cache.json")
+METRICS_LOG = os.path.join(BASE_DIR, "logs", "metrics.jsonl")  # one JSON snapshot per line
+METRICS_INTERVAL = 60.0
+CAMERA_STATE_FILE = os.path.join(BASE_DIR, ".camera_index")      # last working /dev/videoN
+STARTUP_LOG = os.path.join(BASE_DIR, "logs", "startup.jsonl")    # per-phase boot times
+REPLAY_EVENTS = os.path.join(BASE_DIR, "logs", "replay_events.jsonl")
+POWER_INTERVAL = 10.0                          # seconds between battery/temperature/load polls
+POWER_TIER = os.environ.get("KANAN_POWER_TIER")  # pin a tier (performance/balanced/saver/critical)
 
 # Piper config
 PIPER_BIN = shutil.which("piper") or "piper"
@@ -19,201 +47,201 @@ PIPER_MODEL = os.path.join(BASE_DIR, "piper_models", "en_US-ryan-medium.onnx")
 PIPER_LENGTH_SCALE = "1.1"
 PIPER_SILENCE = "0.25"
 
-OBJECT_INTERVAL = 4.0
 TIMEOUT = 5.0
+FACE_TOLERANCE = 0.5
 FACE_COOLDOWN = 5
+DETECT_EVERY = 5  # full HOG detection every N frames; optical flow in between
 OBJECT_COOLDOWN = 6
 TEXT_COOLDOWN = 8
+REMOTE_RETRY = 10.0  # seconds before a track the server did not know is sent to /match again
+
+# Scene-change gating (mean abs. difference of a 32x24 gray thumbnail, 0-255)
+SCENE_FACE_THRESHOLD = 4.0     # below this the detect stage reuses its last result
+SCENE_FACE_MAX_STALE = 2.0     # ...but re-checks a static scene at least this often (s)
+SCENE_CLOUD_THRESHOLD = 6.0    # below this (vs. last upload) the frame is not uploaded
+SCENE_CLOUD_IMMEDIATE = 20.0   # at or above this, upload without waiting for the tier's cloud_interval
+CLOUD_MIN_INTERVAL = 1.0       # hard floor between uploads (s)
+
+# Speech scheduling: kind -> (priority, time-to-live s, may be cut off by more urgent speech)
+SPEECH_KINDS = {
+    "reply":  (URGENT, None, False),   # answers to voice commands, status messages
+    "face":   (HIGH,   3.0,  False),
+    "text":   (NORMAL, 10.0, True),    # OCR readouts can be long
+    "object": (LOW,    4.0,  False),
+}
+
+# KANAN_LOG_LEVEL=DEBUG shows per-event details (configured in main())
+log = logging.getLogger("kanan")
+
+FACE_SECONDS = {step: metrics.histogram("kanan_face_seconds", "Face recognition step time", {"step": step})
+                for step in ("encode", "match", "remote_match")}
+ANNOUNCE_LATENCY = metrics.histogram("kanan_announce_latency_seconds", "Frame capture to speak()")
+
+# ---------- POWER ----------
+# The governor picks a tier from battery, CPU temperature and load (see
+# battery_monitor.py). Detection rate/resolution and the cloud interval are
+# read from governor.tier per frame; the capture rate and HOG cadence are
+# applied when the tier changes. Set KANAN_BATTERY_FILE to test with a fake.
+governor = PowerGovernor(battery_source(), POWER_INTERVAL, pin=POWER_TIER,
+                         on_change=lambda old, new: _apply_tier(new))
+
+def _apply_tier(tier):
+    cam.max_fps = tier.capture_fps
+    face_tracker.detect_every = tier.detect_every
 
-# ---------- BATTERY (PLACEHOLDER) ----------
 def get_battery_status():
-    """
-    Placeholder battery function for testing.
-    Replace later with real hardware logic (INA219, Pico, etc.).
-    """
-    return 75  # fixed test percentage
+    """Battery percent from the governor's last reading, or None when unknown."""
+    b = governor.battery
+    return round(b.percent) if b else None
 
 # ---------- TTS (Piper) ----------
-_tts_q = queue.Queue()
-
-def _piper_available() -> bool:
-    if shutil.which(PIPER_BIN) is None:
-        print("[TTS] Piper binary not found in PATH.")
-        return False
-    if not os.path.isfile(PIPER_MODEL):
-        print(f"[TTS] Piper model missing: {PIPER_MODEL}")
+# One persistent piper process + one raw aplay stream (see piper_tts.py)
+tts = None  # set by init_tts(); speak() prints only until then
+events = None  # EventLog while replaying: announcements and recognitions as JSON lines
+
+def init_tts():
+    global tts
+    engine = PiperTTS(PIPER_BIN, PIPER_MODEL, PIPER_LENGTH_SCALE, PIPER_SILENCE)
+    if not engine.start():
+        print("🔇 Piper not available")
         return False
+    print(f"🔊 Piper ready • Model: {os.path.basename(PIPER_MODEL)}")
+    engine.prefetch(["Text says:", "Faces refreshed", "Camera not ready"])
+    tts = engine
     return True
 
-def _piper_say(text: str):
-    if not _piper_available():
-        print(f"Kanan (text only): {text}")
-        return
-    text = text.strip()
-    if not text:
-        return
-
-    sentences = re.split(r'(?<=[.!?]) +', text)
-    for chunk in sentences:
-        if not chunk.strip():
-            continue
-        os.makedirs("/tmp/kanan_tts", exist_ok=True)
-        with tempfile.NamedTemporaryFile(dir="/tmp/kanan_tts", suffix=".wav", delete=False) as tmpf:
-            wav_path = tmpf.name
-        try:
-            proc = subprocess.run(
-                [PIPER_BIN, "--model", PIPER_MODEL,
-                 "--output_file", wav_path,
-                 "--length_scale", PIPER_LENGTH_SCALE,
-                 "--sentence_silence", PIPER_SILENCE],
-                input=chunk.encode("utf-8"),
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE
-            )
-            if proc.returncode != 0:
-                print(f"[TTS] Piper failed.")
-                if os.path.exists(wav_path):
-                    os.remove(wav_path)
-                continue
-            time.sleep(0.2)
-            subprocess.run(
-                ["aplay", wav_path],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-        except Exception as e:
-            print(f"[TTS ERROR] {e}")
-        finally:
-            if os.path.exists(wav_path):
-                os.remove(wav_path)
-        time.sleep(0.4)
-    time.sleep(0.5)
-
-def _tts_loop():
-    if _piper_available():
-        print(f"🔊 Piper ready • Model: {os.path.basename(PIPER_MODEL)}")
-    else:
-        print("🔇 Piper not available")
-    while True:
-        msg = _tts_q.get()
-        if msg is None:
-            break
-        _piper_say(msg)
-
-threading.Thread(target=_tts_loop, daemon=True).start()
-
-def speak(msg: str):
+def speak(msg: str, kind: str = "reply", key=None, since=None):
+    """Queue msg for speech. Pending messages with the same key are merged;
+    since (time.monotonic() of the triggering frame) starts the TTL clock early."""
     msg = msg.strip()
     if msg:
         print(f"Kanan: {msg}")
-        _tts_q.put(msg)
+        if events is not None:
+            events.write("speech", kind=kind, text=msg)
+        if tts is not None:
+            priority, ttl, interruptible = SPEECH_KINDS[kind]
+            tts.say(msg, priority, ttl, key, interruptible, since)
 
 # ---------- CAMERA ----------
-class Camera:
-    def __init__(self):
-        self.cap = None
-        self.frame = None
-        self.running = False
-        self.device_index = None
-
-    def find_camera(self):
-        for i in range(10):
-            cap = cv2.VideoCapture(i)
-            if cap.isOpened():
-                ret, frame = cap.read()
-                if ret:
-                    self.device_index = i
-                    print(f"✅ Camera {i} active (/dev/video{i})")
-                    return cap
-                cap.release()
-        print("❌ No working camera found.")
-        return None
+cam = Camera(on_reconnect=lambda: speak("Camera reconnected"), state_file=CAMERA_STATE_FILE)
 
-    def open(self):
-        self.cap = self.find_camera()
-        return self.cap is not None
-
-    def start(self):
-        self.running = True
-
-        def loop():
-            fail = 0
-            while self.running:
-                if not self.cap:
-                    self.cap = self.find_camera()
-                    time.sleep(1)
-                    continue
-                ret, f = self.cap.read()
-                if not ret:
-                    fail += 1
-                    if fail >= 5:
-                        print("⚠️ Camera feed lost. Reconnecting...")
-                        self.cap.release()
-                        time.sleep(3)
-                        self.cap = self.find_camera()
-                        if self.cap:
-                            speak("Camera reconnected")
-                        fail = 0
-                        continue
-                    continue
-                fail = 0
-                self.frame = f
-                time.sleep(0.01)
-
-        threading.Thread(target=loop, daemon=True).start()
-
-    def read(self):
-        return self.frame
-
-    def close(self):
-        self.running = False
-        if self.cap:
-            self.cap.release()
-
-cam = Camera()
-if not cam.open():
-    speak("No camera detected.")
-    raise SystemExit(1)
-cam.start()
+def init_camera():
+    """Open the camera (remembered index first) and start capturing."""
+    if not cam.open():
+        return False
+    cam.start()
+    return True
 
 # ---------- FACES ----------
-known_faces = []
-known_names = []
+def _new_gallery():
+    g = FaceGallery(tolerance=FACE_TOLERANCE)
+    g.enable_index()  # exact until the gallery is large enough to need IVF
+    return g
+
+# rebuild_faces swaps in a whole new gallery; readers take one reference and
+# never lock. faces_lock only serialises writers (rebuild vs. snapshot).
+gallery = _new_gallery()
 faces_lock = threading.Lock()
+face_recognition = None  # imported by init_faces(): loading dlib's models is part of that phase
+encoding_cache = None    # EncodingCache, opened by init_faces()
+# Coarse HOG over the detection image plus full-resolution crops where small
+# faces were tracked or something moved (see roi_detector.py)
+roi_detector = MultiResDetector(lambda rgb: face_recognition.face_locations(rgb),
+                                hints=lambda: [t.box for t in face_tracker.tracks])
+face_tracker = FaceTracker(roi_detector, None, detect_every=DETECT_EVERY)
+# Faces the local gallery does not know are matched against the server's
+# (larger) gallery by encoding: 512 bytes per face instead of an image. The
+# remote stage sends them off the recognize path, once per REMOTE_RETRY per track.
+matcher = MatchClient(MATCH_URL, timeout=TIMEOUT) if MATCH_URL else None
+_remote_sent = {}  # track id -> time.monotonic() it was last sent to /match
+
+def identify_faces(rgb, locs, encodings=None):
+    """Encode faces and match them (best, not first) against the gallery in one batch.
+    encodings, if given, receives the encodings (for the remote stage)."""
+    with FACE_SECONDS["encode"].time():
+        encs = face_recognition.face_encodings(rgb, locs)
+    if encodings is not None:
+        encodings.extend(encs)
+    with FACE_SECONDS["match"].time():
+        return gallery.best(encs)
+
+def _encode_image_file(path):
+    enc = face_recognition.face_encodings(face_recognition.load_image_file(path))
+    return enc[0] if enc else None
 
 def rebuild_faces():
-    global known_faces, known_names
+    global gallery
+    os.makedirs(KNOWN_FACES_DIR, exist_ok=True)
     with faces_lock:
-        known_faces = []
-        known_names = []
-        os.makedirs(KNOWN_FACES_DIR, exist_ok=True)
-        for fn in os.listdir(KNOWN_FACES_DIR):
-            if fn.lower().endswith((".jpg", ".jpeg", ".png")):
-                img = face_recognition.load_image_file(
-                    os.path.join(KNOWN_FACES_DIR, fn)
-                )
-                enc = face_recognition.face_encodings(img)
-                if enc:
-                    known_faces.append(enc[0])
-                    known_names.append(os.path.splitext(fn)[0])
-        print(f"📂 {len(known_names)} faces loaded.")
-
-rebuild_faces()
+        # Encode only new/changed images, then swap the gallery in one assignment
+        entries, stats = encoding_cache.sync_dir(KNOWN_FACES_DIR, _encode_image_file)
+        new = _new_gallery()
+        if entries:
+            new.add_many(
+                [os.path.splitext(fn)[0] for fn, _ in entries],
+                [enc for _, enc in entries]
+            )
+        gallery = new
+    face_tracker.invalidate()
+    print(f"📂 {len(gallery)} faces loaded "
+          f"({stats['encoded']} encoded, {stats['cached']} cached, {stats['removed']} removed).")
+    if tts is not None:
+        tts.prefetch(f"{n} is there" for n in gallery.names)
+
+def init_faces():
+    global face_recognition, encoding_cache
+    import face_recognition as fr
+    face_recognition = fr
+    encoding_cache = EncodingCache(ENCODING_CACHE_FILE, signature="face_encodings/small/1")
+    rebuild_faces()
+    return len(gallery)
+
+def _small_rgb(frame, width=320):
+    """RGB copy for detection, `width` pixels wide with the frame's aspect ratio."""
+    h, w = frame.shape[:2]
+    return cv2.cvtColor(cv2.resize(frame, (width, max(1, round(width * h / w)))), cv2.COLOR_BGR2RGB)
+
+def _to_frame(faces, scale):
+    """(name, location) from detection-image to camera-frame pixels (scale: frame px per detection px)."""
+    return [(name, tuple(int(round(v * scale)) for v in loc)) for name, loc in faces]
+
+def _frame_todo(frame, todo, scale):
+    """Full-resolution RGB frame and pending() locations in its pixels, so small faces encode sharply."""
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    return rgb, [(tid, loc) for tid, loc in _to_frame(todo, scale)]
+
+def recognize_tracks(rgb, todo, encodings=None):
+    """Identify tracks handed out by face_tracker.pending() (locations in rgb's pixels); returns their Matches."""
+    if not todo:
+        return []
+    matches = identify_faces(rgb, [loc for _, loc in todo], encodings)
+    face_tracker.assign([tid for tid, _ in todo], matches)
+    return matches
+
+def _remote_due(todo, matches, encs):
+    """(track id, location, encoding) of tracks unknown locally and not sent to /match recently."""
+    now = time.monotonic()
+    for tid in [t for t, sent in _remote_sent.items() if now - sent > REMOTE_RETRY]:
+        del _remote_sent[tid]  # also forgets tracks that are long gone
+    due = [(tid, loc, enc) for (tid, loc), m, enc in zip(todo, matches, encs)
+           if m.name is None and tid not in _remote_sent]
+    for tid, _, _ in due:
+        _remote_sent[tid] = now
+    return due
 
 def check_faces(frame):
+    """Synchronous detect + recognize on one frame: [(name, location in frame pixels)]."""
     try:
-        with faces_lock:
-            if not known_faces:
-                return []
-            small = cv2.resize(frame, (320, 240))
-            rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
-            locs = face_recognition.face_locations(rgb)
-            encs = face_recognition.face_encodings(rgb, locs)
-            out = []
-            for e, loc in zip(encs, locs):
-                matches = face_recognition.compare_faces(known_faces, e, 0.5)
-                if True in matches:
-                    out.append((known_names[matches.index(True)], loc))
-            return out
+        if not len(gallery) and matcher is None:
+            return []
+        rgb = _small_rgb(frame, governor.tier.detect_width)
+        scale = frame.shape[1] / rgb.shape[1]
+        roi_detector.frame = frame
+        face_tracker.update(rgb)
+        todo = face_tracker.pending()
+        if todo:
+            recognize_tracks(*_frame_todo(frame, todo, scale))
+        return _to_frame(face_tracker.identified(), scale)
     except Exception as e:
         print("[FaceDetection ERROR]", e)
         return []
@@ -221,24 +249,32 @@ def check_faces(frame):
 # ---------- CLOUD ----------
 last_send = 0
 object_recognition_enabled = True
+cloud_gate = SceneChangeDetector(threshold=SCENE_CLOUD_THRESHOLD)
+cloud = CloudClient(AWS_URL, timeout=TIMEOUT) if AWS_URL else None
 
 def cloud_detect(frame):
+    """Runs on the cloud pipeline stage: one upload in flight, newer frames replace queued ones."""
     global last_send
+    if cloud is None:
+        return None
+    interval = governor.tier.cloud_interval
     now = time.time()
-    if now - last_send < OBJECT_INTERVAL:
+    if interval is None or now - last_send < CLOUD_MIN_INTERVAL:
+        return None
+    change = cloud_gate.score(frame)
+    if change < SCENE_CLOUD_IMMEDIATE and now - last_send < interval:
+        return None
+    if change < SCENE_CLOUD_THRESHOLD:
+        # Same scene as the last upload: its results still stand
+        cloud_gate.skipped += 1
+        last_send = now
         return None
     last_send = now
+    # Own copy: the upload can outlast the ring slot the camera hands out
+    frame = frame.copy()
+    cloud_gate.accept(frame)
     try:
-        _, buf = cv2.imencode(".jpg", cv2.resize(frame, (480, 360)))
-        r = requests.post(
-            AWS_URL,
-            files={"file": ("frame.jpg", buf.tobytes(), "image/jpeg")},
-            timeout=TIMEOUT
-        )
-        if r.status_code == 200:
-            return r.json()
-        else:
-            print("[Cloud] HTTP", r.status_code)
+        return cloud.analyze(frame)
     except Exception as e:
         print("[Cloud]", e)
     return None
@@ -251,153 +287,533 @@ def take_snapshot(frame, name=None):
         if name else f"picture_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
     )
     path = os.path.join(KNOWN_FACES_DIR, filename)
+    old = encoding_cache.recorded(path)  # what the picture being replaced contributed, if anything
     cv2.imwrite(path, frame)
-    time.sleep(0.3)
     speak(f"Picture saved as {filename}")
-    time.sleep(0.5)
-    rebuild_faces()
+
+    # Enroll just this picture, encoded straight from the frame in memory
+    enc = face_recognition.face_encodings(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    enc = enc[0] if enc else None
+    encoding_cache.put(path, enc)
+    encoding_cache.save()
+    stem = os.path.splitext(filename)[0]
+    with faces_lock:
+        # O(1) append; matching keeps running on the gallery's own snapshot
+        if old is not None:
+            # Only the overwritten picture's row: Alan.png etc. are enrolled as "Alan" too
+            gallery.remove_encoding(stem, old)
+        if enc is not None:
+            gallery.add(stem, enc)
+    face_tracker.invalidate()
     if name:
         speak(f"New face {name.strip()} added successfully")
     return path
 
 # ---------- VOICE ----------
-vosk_model = VoskModel(VOSK_DIR)
-rec = KaldiRecognizer(vosk_model, 16000)
-_audio_q = queue.Queue()
+# Mic blocks -> energy gate -> grammar-constrained Vosk -> command table (voice_commands.py)
+vosk_model = None   # set by init_vosk()
+listener = None     # CommandListener, built once the model and the gallery are loaded
+_audio_q = LatestQueue(30)  # 3 s of 100 ms blocks; oldest audio is dropped if decoding falls behind
 
 def _audio_cb(indata, frames, time_info, status):
     if status:
-        print(status)
+        log.debug(status)
     _audio_q.put(bytes(indata))
 
+def _vocabulary():
+    """Enrolled names, so the grammar can recognise them after "name it"."""
+    return [w for n in gallery.names for w in n.lower().replace("_", " ").split()]
+
+def _cmd_time(arg):
+    speak(datetime.datetime.now().strftime("%I:%M %p"))
+
+def _cmd_rebuild(arg):
+    rebuild_faces()
+    listener.set_vocabulary(_vocabulary())
+    speak("Faces refreshed")
+
+def _cmd_battery(arg):
+    level = get_battery_status()
+    if level is None:
+        speak("Battery level is not available.")
+        return
+    speak(f"Your battery is at {level} percent.")
+
+def _cmd_picture(arg):
+    frame = cam.read()
+    if frame is None:
+        speak("Camera not ready")
+        return
+    if arg:
+        take_snapshot(frame, arg)
+        return
+    # Name not in the command grammar: decode the next phrase with the full vocabulary
+    speak("Say the name")
+    if tts is not None:
+        tts.drain(timeout=5)  # runs on the voice thread, so the mic blocks wait meanwhile...
+    _audio_q.clear()          # ...and the ones that heard the prompt are dropped
+    listener.listen_free(lambda name: take_snapshot(frame, name))
+
+def _cmd_objects_off(arg):
+    global object_recognition_enabled
+    object_recognition_enabled = False
+    speak("Object recognition disabled, but I will continue reading text.")
+
+def _cmd_objects_on(arg):
+    global object_recognition_enabled
+    object_recognition_enabled = True
+    speak("Object recognition enabled.")
+
+def _cmd_shutdown(arg):
+    speak("Shutting down")
+    if tts is not None:
+        tts.drain(timeout=5)
+        tts.close()
+    os._exit(0)
+
+_handlers = {
+    "time": _cmd_time, "rebuild": _cmd_rebuild, "battery": _cmd_battery, "picture": _cmd_picture,
+    "objects_off": _cmd_objects_off, "objects_on": _cmd_objects_on, "shutdown": _cmd_shutdown,
+}
+commands = CommandTable()
+for _name, _phrases in COMMAND_PHRASES.items():
+    commands.add(_name, _phrases, _handlers[_name])
+
+def init_vosk():
+    global vosk_model
+    from vosk import Model as VoskModel
+    vosk_model = VoskModel(VOSK_DIR)
+    return True
+
+def init_listener():
+    """Needs init_vosk() and init_faces() (enrolled names go into the grammar)."""
+    global listener
+    from vosk import KaldiRecognizer
+    listener = CommandListener(vosk_model, KaldiRecognizer, commands, SAMPLE_RATE,
+                               extra_words=_vocabulary())
+    return True
+
 # ---------- VOICE THREAD ----------
 def _voice_thread():
-    global object_recognition_enabled
+    import sounddevice as sd
     with sd.RawInputStream(
-        samplerate=16000,
-        blocksize=8000,
+        samplerate=SAMPLE_RATE,
+        blocksize=BLOCK_SIZE,
         dtype="int16",
         channels=1,
         callback=_audio_cb
     ):
         speak("Hi my name is Kanan, I am your visual assistant.")
         while True:
-            data = _audio_q.get()
-            if rec.AcceptWaveform(data):
-                text = json.loads(rec.Result()).get("text", "").strip().lower()
-                if not text:
-                    continue
-                cmd = text
-
-                if "what time" in cmd:
-                    speak(datetime.datetime.now().strftime("%I:%M %p"))
-
-                elif "rebuild" in cmd:
-                    rebuild_faces()
-                    speak("Faces refreshed")
-
-                # ----- BATTERY STATUS -----
-                # IMPORTANT: no plain "battery" here, to avoid self-trigger!
-                elif ("battery status" in cmd or
-                      "battery level" in cmd or
-                      "what is my battery" in cmd or
-                      "whats my battery" in cmd or
-                      "what's my battery" in cmd or
-                      "power level" in cmd):
-                    level = get_battery_status()
-                    speak(f"Your battery is at {level} percent.")
-
-                # ---------- ONLY CHANGE YOU REQUESTED ----------
-                # removed "hey kanan" entirely
-                elif ("picture" in cmd and ("name it" in cmd or "name" in cmd)):
-                    frame = cam.read()
-                    if frame is None:
-                        speak("Camera not ready")
-                        continue
-
-                    if "name it" in cmd:
-                        parts = cmd.split("name it")
-                    else:
-                        parts = cmd.split("name")
-
-                    name = parts[1].strip() if len(parts) > 1 else "picture"
-                    take_snapshot(frame, name)
-                # ------------------------------------------------
-
-                elif "stop object recognition" in cmd:
-                    object_recognition_enabled = False
-                    speak("Object recognition disabled, but I will continue reading text.")
-
-                elif "start object recognition" in cmd:
-                    object_recognition_enabled = True
-                    speak("Object recognition enabled.")
-
-                elif "shutdown" in cmd or "exit" in cmd:
-                    speak("Shutting down")
-                    _tts_q.put(None)
-                    os._exit(0)
-
-threading.Thread(target=_voice_thread, daemon=True).start()
+            data = _audio_q.get(timeout=0.5)
+            if data is not None:
+                listener.feed(data)
+
+# ---------- PIPELINE ----------
+# capture -> detect (track) -> recognize (new tracks only) -> announce, plus
+# capture -> cloud -> announce. Every hand-off is a bounded LatestQueue, so a
+# slow stage skips stale frames instead of queueing them.
+STATS_INTERVAL = 30.0
+
+detect_q = LatestQueue(1)
+cloud_q = LatestQueue(1)
+recognize_q = LatestQueue(1)
+remote_q = LatestQueue(4)
+announce_q = LatestQueue(8)
+display_q = LatestQueue(1)
 
-# ---------- MAIN LOOP ----------
 last_face_announce = {}
 last_object_announce = 0
 last_text_announce = 0
+_last_seq = 0
+announce_latency = collections.deque(maxlen=200)  # capture -> speak() seconds
+
+def _announced(captured):
+    announce_latency.append(time.monotonic() - captured)
+    ANNOUNCE_LATENCY.observe(announce_latency[-1])
+
+def _capture_stage():
+    """Hand each new camera frame (seq, ts, image) downstream exactly once."""
+    global _last_seq
+    fr = cam.wait_newer(_last_seq, timeout=0.1)
+    if fr is None:
+        return None
+    _last_seq = fr.seq
+    return fr
 
-print("🚀 Kanan AI started (Faces + OCR + Objects except 'person'). Press 'q' to quit.")
-try:
-    while True:
-        f = cam.read()
-        if f is None:
-            time.sleep(0.01)
-            continue
-
-        faces = check_faces(f)
-        for name, loc in faces:
-            top, right, bottom, left = [v * 4 for v in loc]
-            cv2.rectangle(f, (left, top), (right, bottom), (0, 255, 0), 2)
-            cv2.putText(
-                f, name,
-                (left, top - 10),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.6,
-                (0, 255, 0),
-                2
-            )
-            now = time.time()
+face_gate = SceneChangeDetector(threshold=SCENE_FACE_THRESHOLD, max_stale=SCENE_FACE_MAX_STALE)
+detect_times = collections.deque(maxlen=200)
+detect_throttled = 0   # frames skipped to stay under the power tier's detect_fps
+_last_detect_ts = 0.0
+
+def _detect_stage(fr):
+    global detect_throttled, _last_detect_ts
+    if not len(gallery) and matcher is None:
+        return []
+    tier = governor.tier
+    if tier.detect_fps and fr.ts - _last_detect_ts < 1.0 / tier.detect_fps:
+        detect_throttled += 1
+        return None
+    _last_detect_ts = fr.ts
+    if not face_gate.check(fr.image):
+        return None  # unchanged scene: keep the last boxes, skip detection/tracking
+    t = time.perf_counter()
+    # Own copy: HOG plus ROI crops can outlast the ring slot (RING_SIZE frames),
+    # and the crops and encodings must come from the frame the boxes were found in
+    image = fr.image.copy()
+    rgb = _small_rgb(image, tier.detect_width)
+    scale = image.shape[1] / rgb.shape[1]  # travels with the job: the next frame may differ
+    roi_detector.frame = image
+    face_tracker.update(rgb)
+    todo = face_tracker.pending()
+    if todo:
+        recognize_q.put((*_frame_todo(image, todo, scale), fr.seq, scale))
+    faces = _to_frame(face_tracker.identified(), scale)
+    now = time.time()
+    due = [name for name, _ in faces if now - last_face_announce.get(name, 0) > FACE_COOLDOWN]
+    if due:  # only wake the announcer when someone is due, so cloud events are not crowded out
+        announce_q.put(("faces", due, fr.ts))
+    detect_times.append(time.perf_counter() - t)
+    return faces
+
+def _recognize_stage(job):
+    rgb, todo, seq, scale = job
+    encs = []
+    matches = recognize_tracks(rgb, todo, encs)
+    if events is not None:
+        for (tid, loc), m in zip(todo, matches):
+            events.write("recognition", frame=seq, track=tid, name=m.name,
+                         distance=round(m.distance, 4) if np.isfinite(m.distance) else None,
+                         box=list(loc))
+    if matcher is not None:
+        due = _remote_due(todo, matches, encs)
+        if due:
+            remote_q.put((due, seq, scale))
+    return _to_frame(face_tracker.identified(), scale)  # new names reach the display without another detect
+
+def _remote_stage(job):
+    """Match locally unknown tracks against the server's gallery; one request in flight."""
+    due, seq, scale = job
+    with FACE_SECONDS["remote_match"].time():
+        results = matcher.match([enc for _, _, enc in due])
+    hits = [(tid, loc, Match(r["name"], r["distance"])) for (tid, loc, _), r in zip(due, results or [])
+            if isinstance(r, dict) and r.get("name") and r.get("distance") is not None]
+    if hits:
+        face_tracker.assign([tid for tid, _, _ in hits], [m for _, _, m in hits], only_unknown=True)
+    if events is not None:
+        for tid, loc, m in hits:
+            events.write("recognition", frame=seq, track=tid, name=m.name,
+                         distance=round(m.distance, 4), box=list(loc), remote=True)
+    return _to_frame(face_tracker.identified(), scale)
+
+def _cloud_stage(fr):
+    data = cloud_detect(fr.image)
+    if data and events is not None:
+        events.write("cloud", frame=fr.seq, objects=data.get("objects", []), text=data.get("text", ""))
+    return ("cloud", data, fr.ts) if data else None
+
+def _announce_stage(event):
+    global last_object_announce, last_text_announce
+    kind, payload, captured = event
+    now = time.time()
+    if kind == "faces":
+        for name in payload:
             if now - last_face_announce.get(name, 0) > FACE_COOLDOWN:
-                speak(f"{name} is there")
+                speak(f"{name} is there", "face", since=captured)
                 last_face_announce[name] = now
+                _announced(captured)
+        return kind
+
+    objs = payload.get("objects", [])
+    text = payload.get("text", "")
+    if object_recognition_enabled:
+        clean = [
+            re.sub(r'\s*\([^)]*\)', '', o).strip()
+            for o in objs
+            if o and "person" not in o.lower()
+        ]
+        if clean and now - last_object_announce > OBJECT_COOLDOWN:
+            speak("I see " + ", ".join(clean), "object", key="objects", since=captured)
+            last_object_announce = now
+            _announced(captured)
+
+    if text and now - last_text_announce > TEXT_COOLDOWN:
+        clean = text.replace('\n', ' ').strip()
+        if clean:
+            speak("Text says: " + clean, "text", key="text", since=captured)
+            last_text_announce = now
+            _announced(captured)
+    return kind
+
+def pipeline_report():
+    lines = [pipeline.report()]
+    lines.append(f"power: {governor.tier.name} tier ({governor.describe()}), "
+                 f"{detect_throttled} frames over the detection rate skipped")
+    st = roi_detector.stats
+    if st["detections"]:
+        lines.append(f"roi detection: {st['rois']} full-resolution crops over {st['detections']} detections, "
+                     f"{st['roi_faces']} faces found only in crops ({st['coarse_faces']} in the coarse pass)")
+    if detect_times:
+        saved = face_gate.skipped * sum(detect_times) / len(detect_times)
+        lines.append(f"scene gate (faces): skipped {face_gate.skipped}/{face_gate.checked} frames, "
+                     f"~{saved:.1f} s CPU saved")
+    if cloud is not None and cloud.stats["uploads"]:
+        sent = cloud.stats["bytes"]
+        saved = cloud_gate.skipped * sent / cloud.stats["uploads"]
+        lines.append(f"scene gate (cloud): skipped {cloud_gate.skipped} uploads, "
+                     f"~{saved / 1024:.0f} KiB saved ({sent / 1024:.0f} KiB sent)")
+        lines.append(cloud.report())
+    if listener is not None:
+        lines.append(listener.report() + f", {_audio_q.dropped} audio blocks dropped")
+    if tts is not None:
+        st = tts.stats()
+        lines.append(f"speech queue: depth {st['depth']} (max {st['max_depth']}), merged {st['merged']}, "
+                     f"expired {st['expired']}, overflow {st['overflow']}, cut off {st['preempted']}")
+        if tts.first_audio:
+            fa = sorted(tts.first_audio)
+            lines.append(f"event->audio: median {1000 * fa[len(fa) // 2]:.0f} ms, max {1000 * fa[-1]:.0f} ms")
+    if announce_latency:
+        lat = sorted(announce_latency)
+        lines.append(f"capture->announce: median {1000 * lat[len(lat) // 2]:.0f} ms, "
+                     f"max {1000 * lat[-1]:.0f} ms over {len(lat)} announcements")
+    return "\n".join(lines)
+
+pipeline = Pipeline([
+    Stage("capture", _capture_stage, None, [detect_q, cloud_q]),
+    Stage("detect", _detect_stage, detect_q, [display_q]),
+    Stage("recognize", _recognize_stage, recognize_q, [display_q]),
+    Stage("remote", _remote_stage, remote_q, [display_q]),
+    Stage("cloud", _cloud_stage, cloud_q, [announce_q]),
+    Stage("announce", _announce_stage, announce_q),
+])
+
+metrics.gauge("kanan_audio_queue_depth", "Mic blocks waiting for the recognizer", fn=lambda: len(_audio_q))
+metrics.gauge("kanan_audio_dropped", "Mic blocks dropped because decoding fell behind", fn=lambda: _audio_q.dropped)
+metrics.gauge("kanan_gallery_rows", "Encodings in the face gallery", fn=lambda: len(gallery))
+metrics.gauge("kanan_speech_queue_depth", "Messages waiting to be spoken",
+              fn=lambda: len(tts.queue) if tts else 0)
+metrics.gauge("kanan_speech_expired", "Messages dropped after their TTL",
+              fn=lambda: tts.queue.expired if tts else 0)
+
+# ---------- STARTUP ----------
+# Independent resources load side by side; only the command grammar waits for
+# both the Vosk model and the enrolled names. Phase times are printed, kept
+# as metrics and appended to STARTUP_LOG to catch boot-time regressions.
+STARTUP_PHASES = [
+    ("camera", init_camera),
+    ("faces", init_faces),
+    ("vosk", init_vosk),
+    ("piper", init_tts),
+]
+
+def _timed(fn, timings, name):
+    def run():
+        t = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            timings[name] = time.perf_counter() - t
+    return run
+
+def startup(phases=STARTUP_PHASES, record=True):
+    """Run the init phases; returns {phase: result}. Errors in a phase are re-raised.
+    record=False keeps the run out of STARTUP_LOG (replays are not boots)."""
+    t0 = time.perf_counter()
+    timings = {}
+    with ThreadPoolExecutor(max_workers=len(phases), thread_name_prefix="init") as pool:
+        futures = {name: pool.submit(_timed(fn, timings, name)) for name, fn in phases}
+        results = {name: f.result() for name, f in futures.items()}
+    order = [name for name, _ in phases]
+    if "vosk" in results:
+        results["voice"] = _timed(init_listener, timings, "voice")()
+        order.append("voice")
+    if tts is not None:
+        tts.prefetch(f"{n} is there" for n in gallery.names)
+    timings["total"] = time.perf_counter() - t0
+    order.append("total")
+    report_startup({name: timings[name] for name in order}, record)
+    return results
+
+def report_startup(timings, record=True):
+    phases = ", ".join(f"{name} {secs:.2f} s" for name, secs in timings.items() if name != "total")
+    print(f"⏱️ Startup {timings['total']:.2f} s ({phases})")
+    for name, secs in timings.items():
+        metrics.gauge("kanan_startup_seconds", "Time spent in each startup phase", {"phase": name}).set(secs)
+    if not record:
+        return
+    try:
+        os.makedirs(os.path.dirname(STARTUP_LOG), exist_ok=True)
+        with open(STARTUP_LOG, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps({"ts": time.time(), "camera_index": cam.device_index,
+                                 "phases": {k: round(v, 4) for k, v in timings.items()}}) + "\n")
+    except OSError as e:
+        log.warning(f"startup log not written: {e}")
+
+# ---------- REPLAY ----------
+# Headless run over a video file or image directory: no window, no microphone
+# and no Piper; speech and recognitions go to an EventLog instead. Without
+# realtime the source publishes the next frame only once detect has finished
+# the previous one and recognition has caught up, so no frame is dropped and
+# the run takes as long as the pipeline needs. With realtime, frames arrive at
+# the source frame rate and stale ones are dropped as they would be live.
+def _replay_ready():
+    return pipeline.stage("detect").seen >= cam.seq and not len(recognize_q) and not len(remote_q)
+
+def _replay_done():
+    return cam.finished and _last_seq == cam.seq and pipeline.idle()
+
+def replay_summary(elapsed):
+    detect = pipeline.stage("detect")
+    frames = cam.frames_read
+    return {
+        "frames": frames,
+        "seconds": round(elapsed, 3),
+        "fps": round(frames / elapsed, 2) if elapsed else 0.0,
+        "processed": detect.seen - face_gate.skipped - detect_throttled,  # went through detection/tracking
+        "skipped": face_gate.skipped,                    # scene unchanged, last result reused
+        "throttled": detect_throttled,                   # over the power tier's detection rate
+        "dropped": frames - detect.seen,                 # replaced by a newer frame before detect
+        "stages": {
+            s.name: {"done": s.processed,
+                     "mean_ms": round(1000.0 * s.busy / s.processed, 2) if s.processed else 0.0,
+                     "p99_ms": 1000.0 * s.latency.quantile(0.99)}
+            for s in pipeline.stages
+        },
+        "face_ms": {step: round(1000.0 * h.sum / h.count, 2) if h.count else 0.0
+                    for step, h in FACE_SECONDS.items()},
+        "roi": dict(roi_detector.stats),
+        "events": dict(events.counts),
+    }
+
+def print_replay_summary(summary):
+    print(f"🎞️ Replay: {summary['frames']} frames in {summary['seconds']:.1f} s "
+          f"({summary['fps']:.1f} fps) • {summary['processed']} processed, "
+          f"{summary['skipped']} skipped (unchanged scene), {summary['throttled']} throttled, "
+          f"{summary['dropped']} dropped")
+    print(f"{'stage':<10}{'done':>8}{'mean ms':>9}{'p99 ms':>9}")
+    for name, st in summary["stages"].items():
+        print(f"{name:<10}{st['done']:>8}{st['mean_ms']:>9.1f}{st['p99_ms']:>9.0f}")
+    print("face: " + ", ".join(f"{step} {ms:.1f} ms" for step, ms in summary["face_ms"].items()))
+    roi = summary["roi"]
+    print(f"roi: {roi['rois']} crops over {roi['detections']} detections, "
+          f"{roi['roi_faces']} faces only found in crops")
+    print("events: " + (", ".join(f"{n} {kind}" for kind, n in summary["events"].items()) or "none"))
+
+def run_replay(path, events_path=REPLAY_EVENTS, realtime=False, fps=None, speed=1.0):
+    global cam, events
+    cam = ReplaySource(path, realtime, fps, speed, ready=_replay_ready)
+    events = EventLog(events_path)
+    results = startup([("camera", cam.open), ("faces", init_faces)], record=False)
+    if not results["camera"]:
+        events.close()
+        raise SystemExit(1)
+    print(f"🎞️ Replaying {'in real time' if realtime else 'at full speed'} • events -> {events_path}")
+    _apply_tier(governor.tier)  # fixed for the whole replay (KANAN_POWER_TIER to try another)
+    pipeline.start()
+    t0 = time.monotonic()
+    cam.start()
+    last_report = t0
+    try:
+        settled = 0
+        while settled < 2:  # idle on two polls in a row: nothing was between stages
+            time.sleep(0.02)
+            settled = settled + 1 if _replay_done() else 0
+            if time.monotonic() - last_report > STATS_INTERVAL:
+                log.info(f"[Replay] {cam.frames_read} frames read")
+                last_report = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        elapsed = time.monotonic() - t0
+        pipeline.stop()
+        cam.close()
+        if cloud is not None:
+            cloud.close()
+        summary = replay_summary(elapsed)
+        events.write("summary", **summary)
+        events.close()
+        print_replay_summary(summary)
+    return summary
+
+# ---------- MAIN LOOP ----------
+# Only display runs here (cv2.imshow must stay on the main thread): every new
+# camera frame is shown with the newest face boxes from the detect stage.
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Kanan AI visual assistant")
+    ap.add_argument("--replay", metavar="PATH",
+                    help="run headless on a video file or image directory instead of the camera")
+    ap.add_argument("--events", default=REPLAY_EVENTS,
+                    help="JSONL log of recognitions and announcements for --replay")
+    ap.add_argument("--realtime", action="store_true",
+                    help="replay at the source frame rate, like a camera (default: as fast as possible)")
+    ap.add_argument("--fps", type=float, default=None,
+                    help="replay frame rate (default: the video's own, 15 for image directories)")
+    ap.add_argument("--speed", type=float, default=1.0, help="playback speed factor for --realtime")
+    ap.add_argument("--log-level", default=None,
+                    help="DEBUG shows per-event details (default: KANAN_LOG_LEVEL or INFO)")
+    args = ap.parse_args(argv)
+    metrics.setup_logging(args.log_level)
+    if args.replay:
+        run_replay(args.replay, args.events, args.realtime, args.fps, args.speed)
+        return
 
-        cloud_data = cloud_detect(f)
-        if cloud_data:
-            objs = cloud_data.get("objects", [])
-            text = cloud_data.get("text", "")
-            now = time.time()
-
-            if object_recognition_enabled:
-                clean = [
-                    re.sub(r'\s*\([^)]*\)', '', o).strip()
-                    for o in objs
-                    if o and "person" not in o.lower()
-                ]
-                if clean and now - last_object_announce > OBJECT_COOLDOWN:
-                    speak("I see " + ", ".join(clean))
-                    last_object_announce = now
-
-            if text and now - last_text_announce > TEXT_COOLDOWN:
-                clean = text.replace('\n', ' ').strip()
-                if clean:
-                    speak("Text says: " + clean)
-                    last_text_announce = now
-
-        cv2.imshow("Kanan View", f)
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
-
-except KeyboardInterrupt:
-    pass
-finally:
-    cam.close()
-    _tts_q.put(None)
-    cv2.destroyAllWindows()
+    results = startup()
+    if not results["camera"]:
+        speak("No camera detected.")
+        if tts is not None:
+            tts.drain(timeout=5)
+        raise SystemExit(1)
+    threading.Thread(target=_voice_thread, daemon=True).start()
+
+    print("🚀 Kanan AI started (Faces + OCR + Objects except 'person'). Press 'q' to quit.")
+    metrics_log = metrics.SnapshotLogger(METRICS_LOG, METRICS_INTERVAL)
+    _apply_tier(governor.poll())
+    log.info(f"🔋 Power tier {governor.tier.name} ({governor.describe()})")
+    governor.start()
+    pipeline.start()
+    metrics_log.start()
+    last_report = time.monotonic()
+    shown_seq = 0
+    faces = []
+    try:
+        while True:
+            fr = cam.wait_newer(shown_seq, timeout=0.05)
+            latest_faces = display_q.get(timeout=0)
+            if latest_faces is not None:
+                faces = latest_faces
+            if fr is not None:
+                shown_seq = fr.seq
+                f = fr.image.copy()  # ring buffers are shared with the other stages
+                for name, (top, right, bottom, left) in faces:
+                    cv2.rectangle(f, (left, top), (right, bottom), (0, 255, 0), 2)
+                    cv2.putText(
+                        f, name,
+                        (left, top - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX,
+                        0.6,
+                        (0, 255, 0),
+                        2
+                    )
+                cv2.imshow("Kanan View", f)
+            if cv2.waitKey(1) & 0xFF == ord("q"):
+                break
+            if time.monotonic() - last_report > STATS_INTERVAL:
+                log.info("[Pipeline]\n" + pipeline_report())
+                last_report = time.monotonic()
+
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+        governor.stop()
+        metrics_log.stop()
+        print("[Pipeline]\n" + pipeline_report())
+        cam.close()
+        if cloud is not None:
+            cloud.close()
+        if tts is not None:
+            tts.close()
+        cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# Kanan AI – in-process metrics (counters, gauges, latency histograms)
+# Cheap enough to leave on: an observation is a lock, a bucket search and
+# two additions. server.py renders the registry as Prometheus text on
+# /metrics; the device writes periodic JSON snapshots with SnapshotLogger.
+#
+#   DECODE = histogram("kanan_decode_seconds", "Image decode time")
+#   with DECODE.time():
+#       ...
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+# Seconds; covers a fast gallery match up to a slow cloud round trip
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_str(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=None):
+        self.name, self.help, self.labels = name, help_text, labels or {}
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """Set directly, or computed on read from fn (e.g. a queue's length)."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=None, fn=None):
+        self.name, self.help, self.labels = name, help_text, labels or {}
+        self.fn = fn
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def get(self) -> float:
+        if self.fn is not None:
+            try:
+                return float(self.fn())
+            except Exception:
+                return float("nan")
+        return self.value
+
+    def samples(self):
+        yield self.name, self.labels, self.get()
+
+    def snapshot(self):
+        return self.get()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=None, buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, labels or {}
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.buckets) + 1)   # last slot: above the largest bucket
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile (upper bound of the bucket it falls in)."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target, seen = q * self.count, 0
+            for i, c in enumerate(self.counts):
+                seen += c
+                if seen >= target:
+                    return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def samples(self):
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        cumulative = 0
+        for bound, c in zip(self.buckets + (float("inf"),), counts):
+            cumulative += c
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield self.name + "_bucket", dict(self.labels, le=le), cumulative
+        yield self.name + "_sum", self.labels, total
+        yield self.name + "_count", self.labels, count
+
+    def snapshot(self):
+        return {"count": self.count, "sum": round(self.sum, 6),
+                "p50": self.quantile(0.5), "p99": self.quantile(0.99)}
+
+
+class _Timer:
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            m = self._metrics.get(key)
+            if m is None:
+                m = self._metrics[key] = cls(name, help_text, labels, **kwargs)
+            return m
+
+    def counter(self, name, help_text="", labels=None) -> Counter:
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text="", labels=None, fn=None) -> Gauge:
+        g = self._get(Gauge, name, help_text, labels)
+        if fn is not None:
+            g.fn = fn
+        return g
+
+    def histogram(self, name, help_text="", labels=None, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines, described = [], set()
+        for m in metrics:
+            if m.name not in described:
+                described.add(m.name)
+                lines.append(f"# HELP {m.name} {m.help}")
+                lines.append(f"# TYPE {m.name} {m.kind}")
+            for name, labels, value in m.samples():
+                lines.append(f"{name}{_label_str(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name + _label_str(m.labels): m.snapshot() for m in metrics}
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+class SnapshotLogger(threading.Thread):
+    """Appends one JSON line {"ts", "metrics"} to path every `interval` seconds."""
+
+    def __init__(self, path: str, interval: float = 60.0, registry: Registry = REGISTRY):
+        super().__init__(name="metrics-snapshot", daemon=True)
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            self.write()
+
+    def write(self) -> None:
+        line = json.dumps({"ts": time.time(), "metrics": self.registry.snapshot()})
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write(line + "\n")
+        except OSError as e:
+            logging.getLogger("kanan.metrics").warning("metrics snapshot failed: %s", e)
+
+    def stop(self) -> None:
+        self._halt.set()
+        self.write()
+
+
+def setup_logging(level=None) -> None:
+    """Root log level from the argument or KANAN_LOG_LEVEL (default INFO); messages print as-is."""
+    level = (level or os.environ.get("KANAN_LOG_LEVEL", "INFO")).upper()
+    logging.basicConfig(level=getattr(logging, level, logging.INFO), format="%(message)s")
@@ -0,0 +1,161 @@
+# Kanan AI – staged pipeline primitives
+# Stages run on their own threads and hand work over through bounded
+# LatestQueues. A full queue drops its oldest item instead of blocking the
+# producer, so a slow stage always works on the freshest frame rather than
+# falling further and further behind.
+
+import collections
+import threading
+import time
+
+import metrics
+
+
+class LatestQueue:
+    """Bounded queue that drops the oldest item when full (maxlen=1: latest value only)."""
+
+    def __init__(self, maxlen: int = 1):
+        self._items = collections.deque()
+        self._maxlen = maxlen
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item) -> None:
+        with self._cond:
+            if len(self._items) >= self._maxlen:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Oldest pending item, or None on timeout / after close()."""
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+    def clear(self) -> int:
+        """Discard pending items; returns how many."""
+        with self._cond:
+            n = len(self._items)
+            self._items.clear()
+            return n
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class Stage(threading.Thread):
+    """Runs fn on every item from inbox and forwards non-None results to outboxes.
+
+    With inbox=None the stage is a source: fn() is called in a loop and
+    returns the next item (or None when nothing new is available).
+    """
+
+    def __init__(self, name: str, fn, inbox=None, outboxes=(), idle_sleep: float = 0.005):
+        super().__init__(name=name, daemon=True)
+        self.fn = fn
+        self.inbox = inbox
+        self.outboxes = list(outboxes)
+        self.idle_sleep = idle_sleep
+        self.processed = 0
+        self.seen = 0          # inbox items taken, including those that produced no output
+        self.active = False    # True while fn runs on an inbox item
+        self.busy = 0.0
+        self.errors = 0
+        self.latency = metrics.histogram("kanan_stage_seconds", "Pipeline stage time per item", {"stage": name})
+        if inbox is not None:
+            metrics.gauge("kanan_queue_depth", "Items waiting in a stage inbox", {"stage": name},
+                          fn=lambda: len(inbox))
+            metrics.gauge("kanan_queue_dropped", "Stale items dropped from a stage inbox", {"stage": name},
+                          fn=lambda: inbox.dropped)
+        self._running = True
+        self._window = (time.monotonic(), 0)  # (start, processed) for the fps report
+
+    def run(self):
+        while self._running:
+            if self.inbox is None:
+                item = ()
+            else:
+                item = self.inbox.get(timeout=0.1)
+                if item is None:
+                    continue
+                self.active = True
+            t = time.perf_counter()
+            try:
+                out = self.fn() if self.inbox is None else self.fn(item)
+            except Exception as e:
+                self.errors += 1
+                print(f"[{self.name} ERROR] {e}")
+                out = None
+            dt = time.perf_counter() - t
+            if out is not None:
+                self.processed += 1
+                self.busy += dt
+                self.latency.observe(dt)
+                for box in self.outboxes:
+                    box.put(out)
+            elif self.inbox is None:
+                time.sleep(self.idle_sleep)
+            if self.inbox is not None:
+                self.seen += 1
+                self.active = False  # only after forwarding, so idle() never misses an item in transit
+
+    def stop(self) -> None:
+        self._running = False
+
+    def stats(self) -> dict:
+        """Throughput since the previous call, plus lifetime counters."""
+        now = time.monotonic()
+        start, done = self._window
+        self._window = (now, self.processed)
+        return {
+            "stage": self.name,
+            "fps": (self.processed - done) / max(now - start, 1e-9),
+            "processed": self.processed,
+            "mean_ms": 1000.0 * self.busy / self.processed if self.processed else 0.0,
+            "dropped": self.inbox.dropped if self.inbox is not None else 0,
+            "errors": self.errors,
+        }
+
+
+class Pipeline:
+    """A set of stages started, stopped and reported on together."""
+
+    def __init__(self, stages=()):
+        self.stages = list(stages)
+
+    def add(self, stage: Stage) -> Stage:
+        self.stages.append(stage)
+        return stage
+
+    def start(self) -> None:
+        for s in self.stages:
+            s.start()
+
+    def stop(self) -> None:
+        for s in self.stages:
+            s.stop()
+            if s.inbox is not None:
+                s.inbox.close()
+
+    def stage(self, name: str) -> Stage:
+        return next(s for s in self.stages if s.name == name)
+
+    def idle(self) -> bool:
+        """True when no stage is working on an item and every inbox is empty."""
+        return all(not s.active and not len(s.inbox) for s in self.stages if s.inbox is not None)
+
+    def report(self) -> str:
+        lines = [f"{'stage':<10}{'fps':>7}{'mean ms':>9}{'done':>8}{'dropped':>9}"]
+        for st in (s.stats() for s in self.stages):
+            lines.append(f"{st['stage']:<10}{st['fps']:>7.1f}{st['mean_ms']:>9.1f}"
+                         f"{st['processed']:>8}{st['dropped']:>9}")
+        return "\n".join(lines)
@@ -0,0 +1,294 @@
+# Kanan AI – persistent, streaming Piper text-to-speech
+# One long-lived `piper` process keeps the ONNX voice loaded. Each sentence
+# is written to its stdin; piper's --output_dir mode answers with one WAV per
+# line (on tmpfs), which gives clean utterance boundaries for the cache.
+# PCM then streams into one long-lived raw `aplay`, so there is no process
+# start-up, temp file on disk or fixed sleep between sentences. Synthesis of
+# the next sentence overlaps playback of the current one, and repeated
+# phrases come from an LRU cache of ready PCM.
+
+import collections
+import json
+import os
+import queue
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+
+import metrics
+from speech_queue import NORMAL, SpeechQueue
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?:]) +')
+DEFAULT_RATE = 22050
+PLAY_AHEAD = 4           # synthesized sentences allowed to wait for the speaker
+PREFETCH_MAX = 64        # phrases waiting to be synthesized ahead of time; more are ignored
+
+SYNTH = metrics.histogram("kanan_tts_synth_seconds", "Piper synthesis time per sentence (cache misses)")
+PLAY = metrics.histogram("kanan_tts_play_seconds", "Time to hand one sentence to the audio sink")
+FIRST_AUDIO = metrics.histogram("kanan_tts_first_audio_seconds", "Event/say() to first audio")
+
+
+class AplaySink:
+    """Long-lived raw PCM player (16-bit mono)."""
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self.proc = None
+
+    def write(self, pcm: bytes) -> None:
+        if self.proc is None or self.proc.poll() is not None:
+            self.proc = subprocess.Popen(
+                ["aplay", "-q", "-t", "raw", "-f", "S16_LE", "-r", str(self.rate), "-c", "1", "-"],
+                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+        self.proc.stdin.write(pcm)
+        self.proc.stdin.flush()
+
+    def close(self) -> None:
+        if self.proc is not None:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+            self.proc.wait(timeout=5)
+
+
+class PCMCache:
+    """LRU map of sentence text -> PCM bytes, bounded by total size."""
+
+    def __init__(self, max_bytes: int = 16 << 20):
+        self.max_bytes = max_bytes
+        self._items = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            pcm = self._items.get(key)
+            if pcm is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return pcm
+
+    def put(self, key, pcm: bytes) -> None:
+        with self._lock:
+            if key in self._items:
+                self._size -= len(self._items.pop(key))
+            self._items[key] = pcm
+            self._size += len(pcm)
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, old = self._items.popitem(last=False)
+                self._size -= len(old)
+
+    def __contains__(self, key) -> bool:
+        return key in self._items
+
+
+def split_sentences(text: str) -> list:
+    return [s.strip() for s in SENTENCE_SPLIT.split(text.replace("\n", " ")) if s.strip()]
+
+
+def model_sample_rate(model_path: str) -> int:
+    """Sample rate from the voice's .onnx.json config, or Piper's usual 22050."""
+    try:
+        with open(model_path + ".json", "r", encoding="utf-8") as fh:
+            return int(json.load(fh)["audio"]["sample_rate"])
+    except (OSError, ValueError, KeyError):
+        return DEFAULT_RATE
+
+
+class PiperTTS:
+    """Speaks queued text through a persistent piper process.
+
+    sink: object with write(pcm)/close(); defaults to a raw aplay process.
+    """
+
+    def __init__(self, piper_bin: str, model: str, length_scale: str = "1.0",
+                 sentence_silence: str = "0.2", sink=None, cache_bytes: int = 16 << 20):
+        self.piper_bin = piper_bin
+        self.model = model
+        self.length_scale = length_scale
+        self.sentence_silence = sentence_silence
+        self.rate = model_sample_rate(model)
+        self.sink = sink or AplaySink(self.rate)
+        self.cache = PCMCache(cache_bytes)
+        self.first_audio = collections.deque(maxlen=200)  # say() -> first PCM to the sink, seconds
+        self._out_dir = tempfile.mkdtemp(prefix="kanan_tts_", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+        self._proc = None
+        self._piper_lock = threading.Lock()
+        self.queue = SpeechQueue()
+        self._play_q = queue.Queue(maxsize=PLAY_AHEAD)
+        self._prefetch = collections.deque()  # phrases to cache while nothing is queued to speak
+        self._last = None                    # last utterance handed to the player
+        self.audio_end = 0.0                 # monotonic time the sink should finish what it was given
+        self._running = False
+
+    # ---------- public ----------
+    def available(self) -> bool:
+        if not os.path.isfile(self.piper_bin) and not shutil.which(self.piper_bin):
+            print("[TTS] Piper binary not found in PATH.")
+            return False
+        if not os.path.isfile(self.model):
+            print(f"[TTS] Piper model missing: {self.model}")
+            return False
+        return True
+
+    def start(self) -> bool:
+        """Start piper and the synth/playback threads. False if piper is unusable."""
+        if not self.available():
+            return False
+        self._running = True
+        self._ensure_piper()
+        threading.Thread(target=self._synth_loop, daemon=True).start()
+        threading.Thread(target=self._play_loop, daemon=True).start()
+        return True
+
+    def say(self, text: str, priority: int = NORMAL, ttl=None, key=None,
+            interruptible: bool = False, since=None):
+        """Queue text for speaking (see SpeechQueue.put); returns its Utterance."""
+        return self.queue.put(text, priority, ttl, key, interruptible, since=since)
+
+    def prefetch(self, phrases) -> None:
+        """Synthesize phrases into the cache in the background, while nothing is queued to speak.
+
+        Kept out of the speech queue, so warm-up never takes its slots or
+        holds up drain(). At most PREFETCH_MAX phrases wait at a time.
+        """
+        for p in phrases:
+            if len(self._prefetch) >= PREFETCH_MAX:
+                break
+            if p not in self._prefetch and not all(s in self.cache for s in split_sentences(p)):
+                self._prefetch.append(p)
+
+    def drain(self, timeout: float = None) -> bool:
+        """Wait until everything said so far has been played. False on timeout."""
+        end = None if timeout is None else time.monotonic() + timeout
+        while (self.queue.unfinished_tasks or self._play_q.unfinished_tasks
+               or time.monotonic() < self.audio_end):
+            if end is not None and time.monotonic() > end:
+                return False
+            time.sleep(0.02)
+        return True
+
+    def close(self) -> None:
+        self._running = False
+        self.queue.close()
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.terminate()
+        self.sink.close()
+        shutil.rmtree(self._out_dir, ignore_errors=True)
+
+    # ---------- piper ----------
+    def _ensure_piper(self):
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                [self.piper_bin, "--model", self.model,
+                 "--output_dir", self._out_dir,
+                 "--length_scale", self.length_scale,
+                 "--sentence_silence", self.sentence_silence],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                text=True, bufsize=1,
+            )
+
+    def synthesize(self, sentence: str) -> bytes:
+        """PCM for one sentence, from the cache or the running piper process."""
+        pcm = self.cache.get(sentence)
+        if pcm is not None:
+            return pcm
+        t = time.perf_counter()
+        with self._piper_lock:
+            self._ensure_piper()
+            self._proc.stdin.write(sentence + "\n")
+            self._proc.stdin.flush()
+            path = self._proc.stdout.readline().strip()
+        if not path:
+            raise RuntimeError("piper exited")
+        try:
+            with wave.open(path, "rb") as wav:
+                pcm = wav.readframes(wav.getnframes())
+        finally:
+            os.remove(path)
+        self.cache.put(sentence, pcm)
+        SYNTH.observe(time.perf_counter() - t)
+        return pcm
+
+    # ---------- threads ----------
+    def _synth_loop(self):
+        while self._running:
+            utt = self.queue.get(timeout=0.05 if self._prefetch else 0.5)
+            if utt is None:
+                self._prefetch_one()
+                continue
+            try:
+                last = self._last
+                if (utt.play and last is not None and last.interruptible and last.queued
+                        and not last.cancelled and last.outranked_by(utt)):
+                    last.cancelled = True  # drop its sentences still waiting for the speaker
+                    self.queue.preempted += 1
+                for i, sentence in enumerate(split_sentences(utt.text)):
+                    if utt.cancelled:
+                        break
+                    if i and utt.interruptible and self.queue.outranks(utt):
+                        utt.cancelled = True
+                        self.queue.preempted += 1
+                        break
+                    try:
+                        pcm = self.synthesize(sentence)
+                    except Exception as e:
+                        print(f"[TTS ERROR] {e}")
+                        continue
+                    if utt.play:
+                        utt.queued += 1
+                        self._last = utt
+                        self._play_q.put((utt, pcm, i == 0))
+            finally:
+                self.queue.task_done()
+
+    def _prefetch_one(self):
+        try:
+            phrase = self._prefetch.popleft()
+        except IndexError:
+            return
+        for sentence in split_sentences(phrase):
+            try:
+                self.synthesize(sentence)
+            except Exception as e:
+                print(f"[TTS ERROR] prefetch: {e}")
+                return
+
+    def _play_loop(self):
+        while self._running:
+            utt, pcm, first = self._play_q.get()
+            utt.queued -= 1
+            try:
+                if first and utt.expired():
+                    # Went stale while earlier speech was playing
+                    utt.cancelled = True
+                    self.queue.expired += 1
+                if utt.cancelled:
+                    continue
+                if first:
+                    self.first_audio.append(time.monotonic() - utt.created)
+                    FIRST_AUDIO.observe(self.first_audio[-1])
+                start = time.monotonic()
+                with PLAY.time():
+                    self.sink.write(pcm)
+                # write() returns once the PCM is in aplay's pipe, not once it is heard
+                self.audio_end = max(self.audio_end, start) + len(pcm) / 2 / self.rate
+            except (OSError, ValueError) as e:
+                print(f"[TTS ERROR] playback: {e}")
+            finally:
+                self._play_q.task_done()
+
+    def stats(self) -> dict:
+        """Speech queue counters plus cache hit counts."""
+        return dict(self.queue.stats(), playing=self._play_q.qsize(),
+                    cache_hits=self.cache.hits, cache_misses=self.cache.misses)
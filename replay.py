@@ -0,0 +1,130 @@
+# Kanan AI – headless replay of recorded footage
+# ReplaySource stands in for Camera (same ring buffer, seq numbers and
+# wait_newer), reading a video file or a directory of images instead of a
+# device. By default it runs as fast as the pipeline allows: the next frame
+# is published only once ready() says the consumer took the previous one,
+# so nothing is dropped. With realtime=True frames arrive at the source
+# frame rate, as from a camera, and slow stages skip frames as they would
+# live. EventLog writes recognitions and announcements as JSON lines.
+
+import glob
+import json
+import os
+import threading
+import time
+
+import cv2
+
+from camera import Camera
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+DEFAULT_FPS = 15.0       # pacing for image directories in real-time mode
+
+
+class ReplaySource(Camera):
+    """Camera-compatible frame source backed by a video file or image directory.
+
+    realtime  pace frames at fps * speed instead of as fast as possible
+    fps       frame rate for pacing (default: the video's own, else DEFAULT_FPS)
+    ready     callable; in as-fast-as-possible mode the next frame waits until it returns True
+    """
+
+    def __init__(self, path: str, realtime: bool = False, fps=None, speed: float = 1.0, ready=None):
+        super().__init__()
+        self.path = path
+        self.realtime = realtime
+        self.fps = fps
+        self.speed = speed
+        self.ready = ready
+        self.finished = False
+        self.frames_read = 0
+        self.started_at = None
+        self.finished_at = None
+        self._images = None
+
+    def open(self):
+        if os.path.isdir(self.path):
+            self._images = sorted(p for p in glob.glob(os.path.join(self.path, "*"))
+                                  if p.lower().endswith(IMAGE_EXTS))
+            ok = bool(self._images)
+        else:
+            self.cap = cv2.VideoCapture(self.path)
+            ok = self.cap.isOpened()
+            if ok and not self.fps:
+                self.fps = self.cap.get(cv2.CAP_PROP_FPS) or None
+        self.fps = self.fps or DEFAULT_FPS
+        print(f"{'🎞️' if ok else '❌'} Replay source: {self.path}"
+              + (f" ({len(self._images)} images)" if self._images else ""))
+        return ok
+
+    def _read(self, slot):
+        """Next frame into ring slot (reusing its buffer for video), or None at the end."""
+        if self._images is not None:
+            while self.frames_read < len(self._images):
+                img = cv2.imread(self._images[self.frames_read])
+                self.frames_read += 1
+                if img is not None:
+                    return img
+            return None
+        ret, frame = self.cap.read(self._ring[slot])
+        if not ret:
+            return None
+        self.frames_read += 1
+        return frame
+
+    def start(self):
+        self.running = True
+
+        def loop():
+            self.started_at = time.monotonic()
+            interval = 1.0 / (self.fps * self.speed)
+            next_due = self.started_at
+            while self.running:
+                if self.realtime:
+                    delay = next_due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_due += interval
+                elif self.ready is not None and self._seq:
+                    while self.running and not self.ready():
+                        time.sleep(0.001)
+                slot = (self._seq + 1) % len(self._ring)
+                frame = self._read(slot)
+                if frame is None:
+                    break
+                self._publish(slot, frame, time.monotonic())
+            self.finished_at = time.monotonic()
+            self.finished = True
+            with self._cond:
+                self._cond.notify_all()
+
+        threading.Thread(target=loop, daemon=True).start()
+
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+
+class EventLog:
+    """Thread-safe JSONL writer; every record gets "t", seconds since the log was opened."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._fh = open(path, "w", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._t0 = time.monotonic()
+        self.counts = {}
+
+    def write(self, event: str, **fields) -> None:
+        record = {"t": round(time.monotonic() - self._t0, 4), "event": event}
+        record.update(fields)
+        line = json.dumps(record, default=float)
+        with self._lock:
+            self.counts[event] = self.counts.get(event, 0) + 1
+            self._fh.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
@@ -0,0 +1,140 @@
+# Kanan AI – bounded, TTL-evicted caches for recognition results
+# Level 1 maps the SHA-1 of an uploaded image (plus profile and top_k) to
+# the finished /recognize response, so a retry or a double tap skips
+# decode, detection and encoding. Level 2 maps a quantized encoding to its
+# gallery matches, so a face seen again (the same photo re-encoded, a
+# device re-sending a tracked face to /match) skips the gallery search.
+#
+# Both levels are cleared when the gallery changes. A generation number
+# guards the race with in-flight requests: a result computed against the
+# old gallery is not stored after an invalidation.
+
+import collections
+import hashlib
+import threading
+import time
+
+import numpy as np
+
+# Quantization step per encoding dimension for level 2. Encodings sharing a
+# key differ by less than one step per dimension (< 0.12 in distance, far
+# less in practice), small next to the 0.5 match tolerance; the cached
+# distances are those of the first encoding seen with that key.
+QUANT_STEP = 0.01
+# Real encodings stay well inside +-1 per dimension. Anything outside this
+# bound is not cached, so a crafted probe cannot share a key with a real face.
+MAX_ABS = 2.0
+
+
+class TTLCache:
+    """LRU map with a size bound and a per-entry time-to-live."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items = collections.OrderedDict()   # key -> (expires, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def get(self, key):
+        """Cached value, or None (values themselves are never None)."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] < now:
+                if item is not None:
+                    del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                self.evicted += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses,
+                "evicted": self.evicted, "hit_rate": round(self.hit_rate(), 4)}
+
+
+class RecognitionCache:
+    """Upload hash -> response (level 1) and quantized encoding -> matches (level 2)."""
+
+    def __init__(self, max_uploads: int = 1024, upload_ttl: float = 60.0,
+                 max_encodings: int = 8192, encoding_ttl: float = 600.0, step: float = QUANT_STEP,
+                 max_abs: float = MAX_ABS):
+        self.uploads = TTLCache(max_uploads, upload_ttl)
+        self.encodings = TTLCache(max_encodings, encoding_ttl)
+        self.step = step
+        self.max_abs = max_abs
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    # ---------- level 1 ----------
+    @staticmethod
+    def upload_key(data: bytes, *params) -> tuple:
+        return (hashlib.sha1(data).hexdigest(),) + params
+
+    def get_upload(self, key):
+        return self.uploads.get(key)
+
+    def put_upload(self, key, value, generation: int) -> None:
+        """Store value unless the gallery changed since generation was read."""
+        with self._lock:
+            if generation == self.generation:
+                self.uploads.put(key, value)
+
+    # ---------- level 2 ----------
+    def encoding_key(self, encoding, k: int):
+        """Cache key, or None for an encoding outside +-max_abs (never cached)."""
+        e = np.asarray(encoding, dtype=np.float32)
+        if not np.isfinite(e).all() or np.abs(e).max(initial=0.0) > self.max_abs:
+            return None
+        return np.round(e / self.step).astype(np.int32).tobytes(), k
+
+    def match(self, encodings, k: int, match_fn) -> list:
+        """match_fn(encodings, k) for the cache misses only, in one call; cached rows for the rest."""
+        generation = self.generation
+        keys = [self.encoding_key(e, k) for e in encodings]
+        results = [self.encodings.get(key) if key is not None else None for key in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            fresh = match_fn(np.asarray(encodings)[missing], k)
+            with self._lock:
+                store = generation == self.generation
+                for i, r in zip(missing, fresh):
+                    results[i] = r
+                    if store and keys[i] is not None:
+                        self.encodings.put(keys[i], r)
+        return results
+
+    # ---------- invalidation ----------
+    def invalidate(self) -> None:
+        """Drop both levels; call whenever the gallery changes."""
+        with self._lock:
+            self.generation += 1
+            self.uploads.clear()
+            self.encodings.clear()
+
+    def stats(self) -> dict:
+        return {"uploads": self.uploads.stats(), "encodings": self.encodings.stats(),
+                "generation": self.generation}
@@ -0,0 +1,121 @@
+# Kanan AI – multi-resolution face detection
+# HOG finds faces down to about 40 px, so on a 320-wide thumbnail of a
+# 1280-wide frame anyone more than a few metres away is invisible, while a
+# full-resolution pass costs 16x as much. MultiResDetector runs the usual
+# coarse pass over the thumbnail, then a few full-resolution crops around
+# (1) faces seen before that are small in the thumbnail and (2) regions that
+# moved since the last detection. Crops share a pixel budget relative to the
+# coarse pass, so a detection costs at most (1 + ROI_BUDGET) of today's.
+#
+# It is a drop-in detect_fn for FaceTracker: called with the thumbnail, it
+# returns boxes in thumbnail coordinates; set .frame to the full-resolution
+# BGR frame the thumbnail was made from before each tracker update.
+
+import cv2
+
+from face_tracker import iou
+
+ROI_BUDGET = 0.5        # crop pixels per detection, as a share of the coarse pass
+MAX_ROIS = 3
+SMALL_FACE = 48         # thumbnail px: faces below this height get a full-resolution look
+ROI_PAD = 1.0           # crop = box grown by this share of its size on every side
+MOTION_THRESHOLD = 25   # gray level change that counts as motion
+MIN_MOTION_AREA = 12    # thumbnail px^2; smaller blobs are noise
+
+
+class MultiResDetector:
+    """Coarse detection plus full-resolution region-of-interest crops.
+
+    detect_fn(rgb) -> [(top, right, bottom, left), ...] (e.g. face_recognition.face_locations)
+    hints()        -> boxes (thumbnail coordinates) where faces were last seen
+    """
+
+    def __init__(self, detect_fn, hints=None, budget: float = ROI_BUDGET, max_rois: int = MAX_ROIS,
+                 small_face: int = SMALL_FACE, pad: float = ROI_PAD):
+        self.detect_fn = detect_fn
+        self.hints = hints
+        self.budget = budget
+        self.max_rois = max_rois
+        self.small_face = small_face
+        self.pad = pad
+        self.frame = None         # full-resolution BGR frame for the next call
+        self._prev_gray = None
+        self.stats = {"detections": 0, "coarse_faces": 0, "rois": 0, "roi_faces": 0}
+
+    def __call__(self, rgb) -> list:
+        self.stats["detections"] += 1
+        boxes = [tuple(float(v) for v in loc) for loc in self.detect_fn(rgb)]
+        self.stats["coarse_faces"] += len(boxes)
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        frame, self.frame = self.frame, None
+        if frame is not None:
+            scale = frame.shape[1] / rgb.shape[1]   # frame px per thumbnail px
+            if scale > 1.0:
+                for box in self._scan_rois(frame, scale, self._regions(gray, boxes), rgb.shape):
+                    if all(iou(box, b) < 0.3 and not _inside(box, b) for b in boxes):
+                        boxes.append(box)
+                        self.stats["roi_faces"] += 1
+        self._prev_gray = gray
+        return boxes
+
+    # ---------- regions of interest ----------
+    def _regions(self, gray, found) -> list:
+        """Candidate boxes (thumbnail coordinates), most promising first."""
+        regions = []
+        for box in (self.hints() if self.hints else ()):
+            # Big faces are the coarse pass's job; small or lost ones get a closer look
+            if box[2] - box[0] < self.small_face and not any(iou(box, b) >= 0.3 for b in found):
+                regions.append(box)
+        if self._prev_gray is not None and self._prev_gray.shape == gray.shape:
+            diff = cv2.absdiff(gray, self._prev_gray)
+            _, mask = cv2.threshold(diff, MOTION_THRESHOLD, 255, cv2.THRESH_BINARY)
+            mask = cv2.dilate(mask, None, iterations=2)
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            blobs = [cv2.boundingRect(c) for c in contours]
+            blobs = sorted((b for b in blobs if b[2] * b[3] >= MIN_MOTION_AREA),
+                           key=lambda b: b[2] * b[3], reverse=True)
+            regions += [(float(y), float(x + w), float(y + h), float(x)) for x, y, w, h in blobs]
+        return regions
+
+    def _scan_rois(self, frame, scale, regions, thumb_shape):
+        """Detect in full-resolution crops of regions; yields boxes in thumbnail coordinates."""
+        fh, fw = frame.shape[:2]
+        left_px = self.budget * thumb_shape[0] * thumb_shape[1]
+        crops = []
+        for top, right, bottom, left in regions:
+            if len(crops) >= self.max_rois or left_px <= 0:
+                break
+            ph, pw = (bottom - top) * self.pad, (right - left) * self.pad
+            y0, y1 = max(0, int((top - ph) * scale)), min(fh, int((bottom + ph) * scale) + 1)
+            x0, x1 = max(0, int((left - pw) * scale)), min(fw, int((right + pw) * scale) + 1)
+            if y1 - y0 < 8 or x1 - x0 < 8:
+                continue
+            if any(c[0] <= (y0 + y1) / 2 <= c[1] and c[2] <= (x0 + x1) / 2 <= c[3] for c in crops):
+                continue  # centred in a crop already taken
+            # Shrink crops that would blow the budget; skip them once no sharper than the coarse pass
+            area = (y1 - y0) * (x1 - x0)
+            shrink = min(1.0, (left_px / area) ** 0.5)
+            if shrink * scale <= 1.5:
+                continue
+            left_px -= area * shrink * shrink
+            crops.append((y0, y1, x0, x1, shrink))
+
+        for y0, y1, x0, x1, shrink in crops:
+            self.stats["rois"] += 1
+            crop = frame[y0:y1, x0:x1]
+            if shrink < 1.0:
+                crop = cv2.resize(crop, (max(1, int((x1 - x0) * shrink)), max(1, int((y1 - y0) * shrink))),
+                                  interpolation=cv2.INTER_AREA)
+            sy, sx = (y1 - y0) / crop.shape[0], (x1 - x0) / crop.shape[1]
+            for t, r, b, l in self.detect_fn(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)):
+                yield ((y0 + t * sy) / scale, (x0 + r * sx) / scale,
+                       (y0 + b * sy) / scale, (x0 + l * sx) / scale)
+
+
+def _inside(a, b, share: float = 0.6) -> bool:
+    """True if at least `share` of box a lies inside box b."""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0.0, bottom - top) * max(0.0, right - left)
+    area = (a[2] - a[0]) * (a[1] - a[3])
+    return area > 0 and inter / area >= share
@@ -0,0 +1,59 @@
+# Kanan AI – cheap scene-change detection
+# Frames are reduced to a tiny grayscale thumbnail and compared with the
+# thumbnail of the last frame that was actually processed. If the mean
+# absolute difference stays under the threshold the scene is "unchanged" and
+# the caller can reuse its previous results instead of re-running detection
+# or re-uploading.
+
+import time
+
+import cv2
+import numpy as np
+
+THUMB_SIZE = (32, 24)
+
+
+def thumbnail(frame, size=THUMB_SIZE) -> np.ndarray:
+    """Tiny float32 grayscale signature of a BGR frame."""
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small.astype(np.float32)
+
+
+class SceneChangeDetector:
+    """Gate that opens when the scene moved away from the last accepted frame.
+
+    threshold  mean absolute thumbnail difference (0-255) that counts as a change
+    max_stale  seconds after which a frame is accepted even if unchanged (None = never)
+    """
+
+    def __init__(self, threshold: float = 6.0, max_stale=None, size=THUMB_SIZE):
+        self.threshold = threshold
+        self.max_stale = max_stale
+        self.size = size
+        self._ref = None
+        self._ref_time = 0.0
+        self.checked = 0
+        self.skipped = 0
+
+    def score(self, frame) -> float:
+        """Difference from the reference frame (inf when there is none yet)."""
+        if self._ref is None:
+            return float("inf")
+        return float(np.mean(np.abs(thumbnail(frame, self.size) - self._ref)))
+
+    def accept(self, frame) -> None:
+        """Make frame the new reference (call when its results were computed)."""
+        self._ref = thumbnail(frame, self.size)
+        self._ref_time = time.monotonic()
+
+    def check(self, frame) -> bool:
+        """True (and frame becomes the reference) if the scene changed enough to reprocess."""
+        self.checked += 1
+        stale = self.max_stale is not None and time.monotonic() - self._ref_time > self.max_stale
+        if stale or self.score(frame) >= self.threshold:
+            self.accept(frame)
+            return True
+        self.skipped += 1
+        return False
@@ -1,39 +1,105 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 import face_recognition
 import numpy as np
 import os
-from PIL import Image
+import io
+import hashlib
+import zipfile
+import argparse
+import functools
+import logging
+import re
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from face_gallery import FaceGallery
+from face_worker import PROFILES, DEFAULT_PROFILE, largest_face, process_upload, warm_up
+from gallery_store import GalleryStore, migrate_npy
+from bulk_import import CHECKPOINT_NAME, Checkpoint, bulk_import
+from bulk_import import DEFAULT_PROFILE as IMPORT_PROFILE
+from result_cache import RecognitionCache
+import metrics
 
 app = Flask(__name__)
+log = logging.getLogger("kanan.server")
 
 # Define storage paths
 UPLOAD_FOLDER = "uploads"
-FACE_DATA_FILE = "faces_data.npy"
+FACE_DATA_FILE = "faces_data.npy"  # legacy pickle, migrated once into FACE_STORE_DIR
+FACE_STORE_DIR = "faces_store"
+RECEIVED_FOLDER = os.path.join(UPLOAD_FOLDER, "received")  # opt-in copies of /recognize uploads
+SAVE_UPLOADS = os.environ.get("KANAN_SAVE_UPLOADS") == "1"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# Global storage for known faces
-known_faces = []
-known_names = []
+MATCH_TOLERANCE = 0.5  # Stricter matching
+TOP_K = 3
+TOP_K_MAX = 20           # one request cannot make the (shared, batched) match allocate N x k
+ANN_N_PROBE = 8          # IVF lists scanned per query (higher = better recall, slower)
+ANN_MIN_SIZE = 1024      # galleries smaller than this are scanned exactly
+BATCH_WORKERS = os.cpu_count() or 1
+MAX_BATCH_IMAGES = 256
+MAX_ARCHIVE_BYTES = 256 << 20  # uncompressed images in one /recognize_batch zip...
+MAX_ARCHIVE_IMAGE = 32 << 20   # ...and per image, checked before anything is inflated
+MAX_MATCH_ENCODINGS = 1024  # per /match request
+ENCODING_BYTES = 128 * 4     # one little-endian float32 encoding in a /match body
+MAX_ENCODING_ABS = 2.0       # face_recognition encodings stay well inside +-1 per dimension
+SERVER_PROFILE = os.environ.get("KANAN_PROFILE", DEFAULT_PROFILE)  # used when a request names none
+RETRY_AFTER = 1          # seconds suggested to clients rejected with 503
+CACHE_UPLOADS = 1024     # /recognize responses kept by upload hash...
+CACHE_UPLOAD_TTL = 60.0  # ...for this many seconds (retries, double taps)
+CACHE_MATCHES = 8192     # gallery matches kept by quantized encoding...
+CACHE_MATCH_TTL = 600.0  # ...for this many seconds
+
+def new_gallery(store=None):
+    """Gallery over the store's rows (mapped, not copied) that switches to the
+    approximate index once it grows large. The index is built in the
+    background; until it is ready, matching scans exactly."""
+    if store is not None and len(store):
+        g = FaceGallery.from_labels(store.encodings(), store.labels(), store.identities,
+                                    tolerance=MATCH_TOLERANCE)
+    else:
+        g = FaceGallery(tolerance=MATCH_TOLERANCE)
+    g.enable_index(background=len(g) > 0, n_probe=ANN_N_PROBE, min_train_size=ANN_MIN_SIZE)
+    return g
+
+# Global storage for known faces, set up by open_state(). Worker processes
+# re-import this module as __mp_main__ and never call it: a second store
+# opened there would repair (truncate) files the parent is appending to.
+store = None         # GalleryStore
+gallery = None       # FaceGallery
+result_cache = None  # RecognitionCache
+enroll_lock = threading.Lock()  # keeps store rows and gallery rows in the same order
+
+def open_state():
+    """Open the store and create the empty gallery and result cache (serving process only)."""
+    global store, gallery, result_cache
+    store = GalleryStore(FACE_STORE_DIR)
+    gallery = new_gallery()
+    result_cache = RecognitionCache(CACHE_UPLOADS, CACHE_UPLOAD_TTL, CACHE_MATCHES, CACHE_MATCH_TTL)
+
+def enroll(names, encodings, sources=None):
+    """Persist new rows and add them to the live gallery: they match from the next request on."""
+    with enroll_lock:
+        store.append(names, encodings, sources=sources)  # Append-only, no rewrite
+        gallery.add_many(names, encodings)
+        result_cache.invalidate()  # cached "Not Recognized" answers may now have a name
+    ENROLLED.inc(len(names))
 
 # Load known faces
 def load_faces():
-    """Load stored face encodings and names from a file."""
-    global known_faces, known_names
-    if os.path.exists(FACE_DATA_FILE):
-        data = np.load(FACE_DATA_FILE, allow_pickle=True).item()
-        known_faces = data["encodings"]
-        known_names = data["names"]
-        print(f"📂 Loaded {len(known_faces)} known faces: {known_names}")
+    """Map the stored encodings (no unpickling, no full read) into the gallery."""
+    global gallery
+    migrate_npy(FACE_DATA_FILE, store)
+    if len(store):
+        gallery = new_gallery(store)
+        result_cache.invalidate()
+        names = gallery.names
+        shown = names if len(names) <= 20 else names[:20] + [f"... {len(names) - 20} more"]
+        print(f"📂 Loaded {len(gallery)} known faces: {shown}")
     else:
         print("⚠️ No known faces found. Please register at least one face.")
 
-# Save known faces
-def save_faces():
-    """Save face encodings and names to a file."""
-    data = {"encodings": known_faces, "names": known_names}
-    np.save(FACE_DATA_FILE, data)
-    print("✅ Face data saved.")
-
 # Register a face manually
 def register_face(name, image_path):
     """Register a new face manually from an image."""
@@ -45,67 +111,440 @@ def register_face(name, image_path):
     encoding = face_recognition.face_encodings(image, num_jitters=3, model="large")
 
     if encoding:
-        known_faces.append(encoding[0])
-        known_names.append(name)
-        save_faces()  # Save after registering a new face
+        enroll([name], encoding[:1], sources=[os.path.basename(image_path)])
         print(f"✅ Face registered: {name}")
     else:
         print(f"❌ No face detected in {image_path}")
 
-# Load faces at startup
-load_faces()
+def persist_upload(data, fmt):
+    """Save an upload under its content hash (never over an enrolled photo)."""
+    os.makedirs(RECEIVED_FOLDER, exist_ok=True)
+    ext = (fmt or "bin").lower().replace("jpeg", "jpg")
+    path = os.path.join(RECEIVED_FOLDER, f"{hashlib.sha1(data).hexdigest()}.{ext}")
+    if not os.path.exists(path):
+        with open(path, "wb") as fh:
+            fh.write(data)
+    return path
+
+def save_enrollment_photo(name, data, fmt):
+    """Keep a registered photo in UPLOAD_FOLDER as <name>_<hash>.<ext>; returns the file name."""
+    ext = (fmt or "bin").lower().replace("jpeg", "jpg")
+    stem = re.sub(r"[^\w\- ]", "", name).strip().replace(" ", "_") or "face"
+    filename = f"{stem}_{hashlib.sha1(data).hexdigest()[:10]}.{ext}"
+    path = os.path.join(UPLOAD_FOLDER, filename)
+    if not os.path.exists(path):
+        with open(path, "wb") as fh:
+            fh.write(data)
+    return filename
+
+# ---------- SERVING ----------
+# Set by main() in --production mode; the dev server leaves them as None
+admission = None   # serving.AdmissionControl
+batcher = None     # serving.MatchBatcher
+HEAVY_ENDPOINTS = {"recognize", "recognize_batch", "register_face"}
+
+_pool = None
+
+# ---------- METRICS ----------
+REQUEST_SECONDS = {}  # endpoint -> histogram, created on first use
+STAGE_SECONDS = {stage: metrics.histogram("kanan_server_stage_seconds", "Per-stage processing time",
+                                          {"stage": stage})
+                 for stage in ("decode", "detect", "encode", "match")}
+FACES = metrics.counter("kanan_server_faces_total", "Faces detected in uploads")
+ENROLLED = metrics.counter("kanan_server_enrolled_total", "Encodings added to the gallery since start")
+metrics.gauge("kanan_server_gallery_rows", "Encodings in the gallery", fn=lambda: len(gallery))
+metrics.gauge("kanan_server_in_flight", "Recognition requests admitted (running + queued)",
+              fn=lambda: admission.in_flight if admission else 0)
+metrics.gauge("kanan_server_rejected", "Requests rejected with 503 since start",
+              fn=lambda: admission.rejected if admission else 0)
+metrics.gauge("kanan_server_match_batches", "Micro-batched gallery matches run",
+              fn=lambda: batcher.batches if batcher else 0)
+
+def cache_gauges(cache):
+    for level, c in (("upload", cache.uploads), ("match", cache.encodings)):
+        labels = {"level": level}
+        metrics.gauge("kanan_server_cache_hits", "Result cache hits", labels, fn=lambda c=c: c.hits)
+        metrics.gauge("kanan_server_cache_misses", "Result cache misses", labels, fn=lambda c=c: c.misses)
+        metrics.gauge("kanan_server_cache_hit_ratio", "Result cache hits / lookups", labels, fn=c.hit_rate)
+        metrics.gauge("kanan_server_cache_entries", "Entries in the result cache", labels,
+                      fn=lambda c=c: len(c))
+        metrics.gauge("kanan_server_cache_evicted", "Entries evicted to respect the size bound", labels,
+                      fn=lambda c=c: c.evicted)
+
+# Load faces at startup (skipped in batch worker processes, which re-import
+# the main module as __mp_main__ and only need face_worker)
+if __name__ != "__mp_main__":
+    open_state()
+    cache_gauges(result_cache)
+    load_faces()
+
+    # Ensure faces are saved and loaded properly
+    if len(gallery) == 0:
+        print("⚠️ No registered faces found! Registering default faces now.")
+
+        register_face("Alan", "uploads/Alan.jpg")
+        register_face("Grandma", "uploads/Grandma.jpg")
+        register_face("Jessika", "uploads/Jessika.jpg")
+        register_face("Lilah", "uploads/Lilah.jpeg")
+        register_face("Elayna", "uploads/Elayna.jpg")
+
+def record_timings(out):
+    """Stage times measured by face_worker (possibly in a worker process)."""
+    for stage, secs in out.get("timings", {}).items():
+        STAGE_SECONDS[stage].observe(secs)
+
+@app.before_request
+def _start_timer():
+    g.start = time.perf_counter()
+
+@app.after_request
+def _observe(resp):
+    endpoint = request.endpoint or "unknown"
+    metrics.counter("kanan_server_requests_total", "HTTP requests",
+                    {"endpoint": endpoint, "status": str(resp.status_code)}).inc()
+    if "start" in g and endpoint != "metrics_endpoint":
+        if endpoint not in REQUEST_SECONDS:
+            REQUEST_SECONDS[endpoint] = metrics.histogram(
+                "kanan_server_request_seconds", "Request latency", {"endpoint": endpoint})
+        REQUEST_SECONDS[endpoint].observe(time.perf_counter() - g.start)
+    return resp
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition of the server's metrics."""
+    return Response(metrics.REGISTRY.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+def get_pool():
+    """Lazily start the worker processes (spawned, so they never fork Flask's threads)."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS,
+                                    mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def run_upload(data, profile):
+    """Decode, detect and encode one upload: in a worker process when serving in production."""
+    if admission is not None:
+        return get_pool().submit(process_upload, data, profile).result()
+    return process_upload(data, profile)
+
+def request_profile():
+    """Profile named by the request (form field or query string), else the server default."""
+    return request.values.get("profile", SERVER_PROFILE)
+
+def clamp_top_k(value):
+    """top_k limited to 1..TOP_K_MAX; ValueError unless it is an integer."""
+    if isinstance(value, bool) or not isinstance(value, (int, np.integer)):
+        raise ValueError("top_k must be an integer")
+    return min(max(1, int(value)), TOP_K_MAX)
+
+def _gallery_match(encodings, k):
+    if batcher is not None:
+        return batcher.match(encodings, k)
+    return gallery.match(encodings, k=k)
 
-# Ensure faces are saved and loaded properly
-if len(known_faces) == 0:
-    print("⚠️ No registered faces found! Registering default faces now.")
+def match_encodings(encodings, k):
+    """Gallery match through the result cache; misses are micro-batched with
+    concurrent requests when serving in production."""
+    with STAGE_SECONDS["match"].time():
+        return result_cache.match(encodings, k, _gallery_match)
 
-    register_face("Alan", "uploads/Alan.jpg")
-    register_face("Grandma", "uploads/Grandma.jpg")
-    register_face("Jessika", "uploads/Jessika.jpg")
-    register_face("Lilah", "uploads/Lilah.jpeg")
-    register_face("Elayna", "uploads/Elayna.jpg")
+@app.before_request
+def _admit():
+    """Reject recognition work fast once the bounded request queue is full."""
+    if admission is None or request.endpoint not in HEAVY_ENDPOINTS:
+        return None
+    if not admission.enter():
+        resp = jsonify({"error": "Server busy, retry later"})
+        resp.status_code = 503
+        resp.headers["Retry-After"] = str(RETRY_AFTER)
+        return resp
+    g.admitted = True
+    return None
 
-    save_faces()  # Save all registered faces
-    load_faces()  # Reload after saving
+@app.teardown_request
+def _release(exc):
+    if g.pop("admitted", False):
+        admission.leave()
 
 @app.route('/recognize', methods=['POST'])
 def recognize():
     """Receive an image, process it, and return the recognized name."""
     if 'file' not in request.files:
-        print("❌ No file provided")
+        log.warning("❌ No file provided")
         return jsonify({"error": "No file provided"}), 400
 
+    profile = request_profile()
+    if profile not in PROFILES:
+        return jsonify({"error": f"Unknown profile, use one of {sorted(PROFILES)}"}), 400
+
     file = request.files['file']
-    filepath = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(filepath)
+    data = file.read()
+    log.debug(f"📸 Image received: {file.filename} (profile: {profile})")
+    top_k = clamp_top_k(request.form.get("top_k", TOP_K, type=int))
+
+    # Same bytes, profile, top_k and save as a recent request: reuse its answer.
+    # save is in the key so an upload first sent without it is still persisted.
+    save = SAVE_UPLOADS or request.form.get("save") == "1"
+    generation = result_cache.generation
+    cache_key = result_cache.upload_key(data, profile, top_k, save)
+    cached = result_cache.get_upload(cache_key)
+    if cached is not None:
+        log.debug("✅ Upload cache hit")
+        return jsonify(cached)
 
-    print(f"📸 Image received: {file.filename}")
+    # Decode once, in memory; no temp file and no second decode
+    out = run_upload(data, profile)
+    if "error" in out:
+        log.warning(f"❌ {out['error']}")
+        return jsonify({"error": "Invalid image"}), 400
+    record_timings(out)
+    log.debug(f"📏 Image size: {out['size']}, Format: {out['format']}")
 
-    # Check image properties
-    img = Image.open(filepath)
-    print(f"📏 Image size: {img.size}, Format: {img.format}")
+    if save:
+        persist_upload(data, out["format"])
 
-    # Load image for face recognition
-    image = face_recognition.load_image_file(filepath)
-    face_encodings = face_recognition.face_encodings(image, num_jitters=3, model="large")
+    face_encodings = out["encodings"]
 
-    print(f"🔍 Detected Faces: {len(face_encodings)}")
+    FACES.inc(len(face_encodings))
+    log.debug(f"🔍 Detected Faces: {len(face_encodings)}")
 
     detected_name = "Not Recognized"
-    if face_encodings:
-        for encoding in face_encodings:
-            face_distances = face_recognition.face_distance(known_faces, encoding)
+    best_distance = float("inf")
+    faces = []
+    if len(face_encodings):
+        # Score every detected face against every identity in one batch
+        for matches in match_encodings(face_encodings, top_k):
+            # Debugging: log the closest identities (formatted only when DEBUG is on)
+            if log.isEnabledFor(logging.DEBUG):
+                for m in matches:
+                    log.debug(f"📏 Distance from {m.name}: {m.distance}")
+
+            if matches and matches[0].distance < best_distance:
+                best_distance = matches[0].distance
+                detected_name = matches[0].name
+            faces.append({"matches": [{"name": m.name, "distance": m.distance} for m in matches]})
+
+    log.debug(f"✅ Recognized Name: {detected_name}")
+    result = {"name": detected_name, "faces": faces, "profile": profile}
+    result_cache.put_upload(cache_key, result, generation)
+    return jsonify(result)
+
+# ---------- MATCH ----------
+def _match_inputs():
+    """(N, 128) float32 encodings from a raw little-endian float32 body or JSON {"encodings": [...]}."""
+    if request.is_json:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            raise ValueError('JSON body must be an object: {"encodings": [...]}')
+        encs = np.asarray(body.get("encodings", []), dtype=np.float32)
+        if encs.ndim == 1 and encs.size:
+            encs = encs[None, :]  # a single encoding
+        if encs.ndim != 2 or (encs.size and encs.shape[1] != 128):
+            raise ValueError("encodings must be 128-value lists")
+        return encs.reshape(-1, 128), body.get("top_k")
+    data = request.get_data()
+    if len(data) % ENCODING_BYTES:
+        raise ValueError(f"body must be a multiple of {ENCODING_BYTES} bytes (128 float32 per face)")
+    return np.frombuffer(data, dtype="<f4").reshape(-1, 128), None
+
+@app.route('/match', methods=['POST'])
+def match():
+    """Match encodings computed on the device: no image upload, decode or detection."""
+    try:
+        encodings, top_k = _match_inputs()
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    if not len(encodings):
+        return jsonify({"error": "No encodings provided"}), 400
+    if len(encodings) > MAX_MATCH_ENCODINGS:
+        return jsonify({"error": f"Too many encodings (max {MAX_MATCH_ENCODINGS})"}), 413
+    if not np.isfinite(encodings).all():
+        return jsonify({"error": "Encodings must be finite"}), 400
+    if np.abs(encodings).max() > MAX_ENCODING_ABS:
+        return jsonify({"error": f"Encoding values must be within +-{MAX_ENCODING_ABS}"}), 400
+
+    try:
+        top_k = clamp_top_k(request.args.get("top_k", TOP_K if top_k is None else top_k, type=int))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    results = []
+    for m in match_encodings(encodings, top_k):
+        results.append({
+            "name": m[0].name if m else "Not Recognized",
+            "distance": m[0].distance if m else None,
+            "matches": [{"name": x.name, "distance": x.distance} for x in m],
+        })
+    return jsonify({"results": results})
+
+# ---------- ENROLLMENT ----------
+@app.route('/register_face', methods=['POST'])
+def register_face_endpoint():
+    """Enroll the largest face in an uploaded photo (form fields: name, image)."""
+    name = request.form.get("name", "").strip()
+    upload = request.files.get("image") or request.files.get("file")
+    if not name:
+        return jsonify({"error": "No name provided"}), 400
+    if not name.isprintable():
+        return jsonify({"error": "Name must be a single line of printable text"}), 400
+    if upload is None:
+        return jsonify({"error": "No image provided"}), 400
+
+    profile = request_profile()
+    if profile not in PROFILES:
+        return jsonify({"error": f"Unknown profile, use one of {sorted(PROFILES)}"}), 400
+
+    data = upload.read()
+    out = run_upload(data, profile)
+    if "error" in out:
+        log.warning(f"❌ {out['error']}")
+        return jsonify({"error": "Invalid image"}), 400
+    record_timings(out)
+    i = largest_face(out)
+    if i is None:
+        return jsonify({"error": "No face detected"}), 400
+
+    filename = save_enrollment_photo(name, data, out["format"])
+    enroll([name], out["encodings"][i:i + 1], sources=[filename])
+    log.info(f"✅ Face registered: {name} ({filename})")
+    return jsonify({"message": f"Face registered for {name}", "name": name,
+                    "faces_in_image": len(out["locations"])})
 
-            # Debugging: Print all face distances
-            for i, distance in enumerate(face_distances):
-                print(f"📏 Distance from {known_names[i]}: {distance}")
+@app.route('/known_faces', methods=['GET'])
+def known_faces():
+    """Names of every enrolled identity."""
+    return jsonify({"faces": gallery.names, "encodings": len(gallery)})
+
+def start_import(folder, profile=IMPORT_PROFILE):
+    """Bulk-import folder on a background thread; each committed batch is searchable at once."""
+    def run():
+        checkpoint = Checkpoint(os.path.join(FACE_STORE_DIR, CHECKPOINT_NAME))
+        stats = bulk_import(folder, enroll, get_pool(), BATCH_WORKERS, checkpoint, profile,
+                            known_sources=[m["source"] for m in store.meta], progress=log.info)
+        log.info(f"✅ Import of {folder} done in {stats['seconds']:.1f} s: {stats['enrolled']} enrolled, "
+                 f"{stats['skipped']} already imported, {stats['no_face']} without a face")
+    threading.Thread(target=run, name="bulk-import", daemon=True).start()
+
+# ---------- BATCH ----------
+def _batch_inputs():
+    """(filename, bytes) pairs from multipart files and/or a zip archive.
+
+    Raises ValueError when there are too many images or the archive would
+    inflate beyond its limits (decided from the zip directory, before reading).
+    """
+    files = [f for key in ("files", "file") for f in request.files.getlist(key)]
+    archive = request.files.get("archive")
+    members = []
+    zf = None
+    if archive is not None:
+        zf = zipfile.ZipFile(io.BytesIO(archive.read()))
+        members = [info for info in zf.infolist()
+                   if not info.is_dir() and info.filename.lower().endswith((".jpg", ".jpeg", ".png"))]
+    try:
+        if len(files) + len(members) > MAX_BATCH_IMAGES:
+            raise ValueError(f"Too many images (max {MAX_BATCH_IMAGES})")
+        # zipfile never inflates a member past its declared file_size, so these bounds hold
+        if any(info.file_size > MAX_ARCHIVE_IMAGE for info in members):
+            raise ValueError(f"Archive image too large (max {MAX_ARCHIVE_IMAGE >> 20} MiB each)")
+        if sum(info.file_size for info in members) > MAX_ARCHIVE_BYTES:
+            raise ValueError(f"Archive too large (max {MAX_ARCHIVE_BYTES >> 20} MiB uncompressed)")
+        items = [(f.filename, f.read()) for f in files]
+        items += [(info.filename, zf.read(info)) for info in members]
+    finally:
+        if zf is not None:
+            zf.close()
+    return items
+
+@app.route('/recognize_batch', methods=['POST'])
+def recognize_batch():
+    """Recognize every face in many images; detection/encoding fan out over the worker pool."""
+    try:
+        items = _batch_inputs()
+    except zipfile.BadZipFile:
+        return jsonify({"error": "Invalid archive"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 413
+    if not items:
+        return jsonify({"error": "No files provided"}), 400
+
+    profile = request_profile()
+    if profile not in PROFILES:
+        return jsonify({"error": f"Unknown profile, use one of {sorted(PROFILES)}"}), 400
+
+    top_k = clamp_top_k(request.form.get("top_k", TOP_K, type=int))
+    work = functools.partial(process_upload, profile=profile)
+    outputs = list(get_pool().map(work, [data for _, data in items]))
+    for out in outputs:
+        record_timings(out)
+        FACES.inc(len(out.get("locations", ())))
+    log.debug(f"📸 Batch of {len(items)} images processed")
+
+    # One gallery match for every face in every image
+    encs = [o["encodings"] for o in outputs if "encodings" in o]
+    all_encs = np.concatenate(encs) if encs else np.empty((0, 128), dtype=np.float32)
+    matches = iter(match_encodings(all_encs, top_k) if len(all_encs) else [])
+
+    results = []
+    for (filename, _), out in zip(items, outputs):
+        if "error" in out:
+            results.append({"filename": filename, "error": out["error"]})
+            continue
+        faces = []
+        for top, right, bottom, left in out["locations"]:
+            m = next(matches)
+            faces.append({
+                "box": {"top": top, "right": right, "bottom": bottom, "left": left},
+                "name": m[0].name if m else "Not Recognized",
+                "distance": m[0].distance if m else None,
+                "matches": [{"name": x.name, "distance": x.distance} for x in m],
+            })
+        results.append({"filename": filename, "faces": faces})
+    return jsonify({"results": results, "profile": profile})
+
+def main():
+    global admission, batcher, BATCH_WORKERS, SERVER_PROFILE
+    ap = argparse.ArgumentParser(description="Kanan face recognition server")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=5000)
+    ap.add_argument("--production", action="store_true",
+                    help="worker processes, bounded queue with 503s, micro-batched matching")
+    ap.add_argument("--workers", type=int, default=BATCH_WORKERS,
+                    help="detection/encoding worker processes")
+    ap.add_argument("--queue", type=int, default=None,
+                    help="requests allowed to wait for a worker (default: 2 x workers)")
+    ap.add_argument("--batch-wait-ms", type=float, default=5.0,
+                    help="how long the matcher waits to batch concurrent requests")
+    ap.add_argument("--profile", choices=sorted(PROFILES), default=SERVER_PROFILE,
+                    help="detection/encoding profile for requests that do not name one")
+    ap.add_argument("--log-level", default=None,
+                    help="DEBUG shows per-request details (default: KANAN_LOG_LEVEL or INFO)")
+    ap.add_argument("--import", dest="import_dir", metavar="DIR", default=None,
+                    help="bulk-enroll a photo folder in the background while serving (resumable)")
+    ap.add_argument("--import-profile", choices=sorted(PROFILES), default=IMPORT_PROFILE,
+                    help="detection/encoding profile for --import")
+    args = ap.parse_args()
+    metrics.setup_logging(args.log_level)
+    SERVER_PROFILE = args.profile
+
+    if not args.production:
+        # The debug reloader runs main() in a watcher process too; import only in the serving one
+        if args.import_dir and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            start_import(args.import_dir, args.import_profile)
+        app.run(host=args.host, port=args.port, debug=True)
+        return
 
-            if len(face_distances) > 0 and np.min(face_distances) < 0.5:  # Stricter matching
-                best_match_index = np.argmin(face_distances)
-                detected_name = known_names[best_match_index]
+    from werkzeug.serving import make_server
+    from serving import AdmissionControl, MatchBatcher
 
-    print(f"✅ Recognized Name: {detected_name}")
-    return jsonify({"name": detected_name})
+    BATCH_WORKERS = args.workers
+    queue_size = args.queue if args.queue is not None else 2 * args.workers
+    admission = AdmissionControl(args.workers + queue_size)
+    batcher = MatchBatcher(lambda: gallery, max_wait=args.batch_wait_ms / 1000.0)
+    list(get_pool().map(warm_up, range(args.workers)))  # start workers before accepting traffic
+    if args.import_dir:
+        start_import(args.import_dir, args.import_profile)
+    print(f"🚀 Serving on {args.host}:{args.port} • {args.workers} workers, queue {queue_size}")
+    make_server(args.host, args.port, app, threaded=True).serve_forever()
 
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    main()
@@ -0,0 +1,92 @@
+# Kanan AI – production serving helpers for server.py
+# AdmissionControl bounds the number of recognition requests in the server
+# (running + queued) so overload turns into a fast 503 instead of an
+# unbounded backlog. MatchBatcher folds encodings from concurrent requests
+# into one gallery match.
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class AdmissionControl:
+    """Non-blocking counting gate: enter() fails once `limit` requests are inside."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def enter(self) -> bool:
+        with self._lock:
+            if self.in_flight >= self.limit:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+
+class MatchBatcher:
+    """Collects match requests for up to max_wait seconds and runs them as one batch.
+
+    get_gallery is called per batch so a gallery swapped by the server is
+    picked up without restarting the batcher.
+    """
+
+    def __init__(self, get_gallery, max_wait: float = 0.005, max_batch: int = 512):
+        self.get_gallery = get_gallery
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self._q = queue.Queue()
+        self.batches = 0
+        self.batched_requests = 0
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def match(self, encodings, k: int = 1) -> list:
+        """Same result as gallery.match(encodings, k), computed in a shared batch."""
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, 128)
+        if not len(encodings):
+            return []
+        fut = Future()
+        self._q.put((encodings, k, fut))
+        return fut.result()
+
+    def _loop(self):
+        while True:
+            pending = [self._q.get()]
+            rows = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while rows < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                rows += len(item[0])
+            self._run(pending)
+
+    def _run(self, pending):
+        try:
+            k = max(item[1] for item in pending)
+            results = self.get_gallery().match(np.concatenate([item[0] for item in pending]), k=k)
+        except Exception as e:
+            for _, _, fut in pending:
+                fut.set_exception(e)
+            return
+        self.batches += 1
+        self.batched_requests += len(pending)
+        start = 0
+        for encs, req_k, fut in pending:
+            fut.set_result([m[:req_k] for m in results[start:start + len(encs)]])
+            start += len(encs)
@@ -0,0 +1,135 @@
+# Kanan AI – speech scheduling
+# Replaces a plain FIFO in front of the TTS engine. Messages carry a priority,
+# an optional time-to-live and a dedupe key: the highest-priority message is
+# spoken first, a message whose key is already pending updates that entry
+# instead of queueing again, and anything older than its TTL is dropped
+# rather than spoken about a person or object that has already gone.
+
+import itertools
+import threading
+import time
+
+# Lower value = spoken first
+URGENT, HIGH, NORMAL, LOW, IDLE = range(5)
+
+
+class Utterance:
+    """One queued message. `cancelled` is set when it is cut off mid-readout."""
+
+    _seq = itertools.count()
+
+    def __init__(self, text, priority, ttl, key, interruptible, play, since):
+        self.text = text
+        self.priority = priority
+        self.key = key if key is not None else text
+        self.interruptible = interruptible
+        self.play = play                      # False: synthesize into the cache only
+        self.created = since if since is not None else time.monotonic()
+        self.deadline = None if ttl is None else self.created + ttl
+        self.cancelled = False
+        self.queued = 0                       # synthesized sentences waiting for the speaker
+        self.order = next(self._seq)
+
+    def expired(self, now=None) -> bool:
+        return self.deadline is not None and (now or time.monotonic()) > self.deadline
+
+    def outranked_by(self, other) -> bool:
+        return other.priority < self.priority
+
+
+class SpeechQueue:
+    """Priority queue with per-key deduplication and TTL expiry.
+
+    maxlen bounds the pending messages; when full, the lowest-priority,
+    oldest one is dropped.
+    """
+
+    def __init__(self, maxlen: int = 32):
+        self.maxlen = maxlen
+        self._pending = []
+        self._cond = threading.Condition()
+        self.closed = False
+        self.unfinished_tasks = 0             # pending + handed out, not yet task_done()
+        self.merged = 0                       # duplicates folded into a pending entry
+        self.expired = 0                      # dropped for exceeding their TTL
+        self.overflow = 0                     # dropped because the queue was full
+        self.preempted = 0                    # readouts cut short by something more urgent
+        self.max_depth = 0
+
+    def put(self, text, priority=NORMAL, ttl=None, key=None, interruptible=False,
+            play=True, since=None) -> Utterance:
+        """Queue text; `since` (time.monotonic()) backdates the TTL to the triggering event."""
+        utt = Utterance(text, priority, ttl, key, interruptible, play, since)
+        with self._cond:
+            for old in self._pending:
+                if old.key == utt.key and old.play == utt.play:
+                    # Keep the queue position, take the newest text and the more generous limits
+                    old.text = utt.text
+                    old.priority = min(old.priority, utt.priority)
+                    old.deadline = None if None in (old.deadline, utt.deadline) else max(old.deadline, utt.deadline)
+                    self.merged += 1
+                    return old
+            self._purge_locked()
+            if len(self._pending) >= self.maxlen:
+                victim = max(self._pending, key=lambda u: (u.priority, -u.order))
+                if victim.priority < utt.priority:
+                    self.overflow += 1
+                    return utt
+                self._pending.remove(victim)
+                self.unfinished_tasks -= 1
+                self.overflow += 1
+            self._pending.append(utt)
+            self.unfinished_tasks += 1
+            self.max_depth = max(self.max_depth, len(self._pending))
+            self._cond.notify()
+        return utt
+
+    def get(self, timeout=None):
+        """Most urgent live Utterance, or None on timeout / after close()."""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._purge_locked()
+                if self._pending:
+                    utt = min(self._pending, key=lambda u: (u.priority, u.order))
+                    self._pending.remove(utt)
+                    return utt
+                if self.closed:
+                    return None
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def outranks(self, utt) -> bool:
+        """True if a pending message should cut in on utt."""
+        with self._cond:
+            return any(p.play and utt.outranked_by(p) for p in self._pending)
+
+    def task_done(self) -> None:
+        with self._cond:
+            self.unfinished_tasks -= 1
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def _purge_locked(self) -> None:
+        now = time.monotonic()
+        live = [u for u in self._pending if not u.expired(now)]
+        dropped = len(self._pending) - len(live)
+        if dropped:
+            self.expired += dropped
+            self.unfinished_tasks -= dropped
+            self._pending = live
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._pending), "max_depth": self.max_depth,
+            "merged": self.merged, "expired": self.expired,
+            "overflow": self.overflow, "preempted": self.preempted,
+        }
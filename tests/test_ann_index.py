@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from ann_index import IVFIndex
+from face_gallery import pairwise_distances
+
+
+def clusters(rng, centres, per, spread=0.02):
+    """per rows around each centre, like several photos of each person."""
+    return np.concatenate([c + rng.normal(0, spread, (per, 128)) for c in centres]).astype(np.float32)
+
+
+def brute_force(index, data, probes, k, n_probe):
+    """Exact top-k over the rows in each probe's n_probe closest lists."""
+    row_list = pairwise_distances(data, index.centroids).argmin(axis=1)
+    probed = np.argsort(pairwise_distances(probes, index.centroids), axis=1)[:, :n_probe]
+    out = []
+    for probe, lists in zip(probes, probed):
+        rows = np.flatnonzero(np.isin(row_list, lists))
+        d = pairwise_distances(probe[None, :], data[rows])[0]
+        out.append(rows[np.argsort(d, kind="stable")[:k]])
+    return out
+
+
+@pytest.mark.parametrize("n_probe", [1, 3, 7, 8])
+def test_search_with_empty_lists_matches_brute_force(n_probe):
+    rng = np.random.default_rng(1)
+    centres = rng.normal(0, 0.09, (8, 128)).astype(np.float32)
+    index = IVFIndex(n_lists=8, n_probe=n_probe, min_train_size=10**9)
+    index.train(clusters(rng, centres, 20))
+    # Only half of the clusters get rows: the other lists stay empty
+    data = clusters(rng, centres[:4], 10)
+    index.add(data)
+    assert sum(b.n == 0 for b in index._state[1]) >= 4
+
+    probes = clusters(rng, centres, 3, spread=0.03)
+    dists, ids = index.search(probes, k=5)
+    for got, want in zip(ids, brute_force(index, data, probes, 5, n_probe)):
+        assert list(got[:len(want)]) == list(want)
+        assert (got[len(want):] == -1).all()
+    assert np.isfinite(dists[ids >= 0]).all()
+
+
+def test_search_all_lists_is_exact():
+    rng = np.random.default_rng(2)
+    data = rng.normal(0, 0.09, (600, 128)).astype(np.float32)
+    index = IVFIndex(n_lists=16, min_train_size=100)
+    index.add(data)
+    assert index.trained
+    probes = data[:20] + rng.normal(0, 0.01, (20, 128)).astype(np.float32)
+    dists, ids = index.search(probes, k=3, n_probe=16)
+    exact = pairwise_distances(probes, data)
+    assert (ids == np.argsort(exact, axis=1)[:, :3]).all()
+    assert np.allclose(dists, np.sort(exact, axis=1)[:, :3], atol=1e-5)
+
+
+def test_untrained_index_is_exact_and_numbers_rows_in_order():
+    rng = np.random.default_rng(3)
+    index = IVFIndex(min_train_size=1000)
+    a, b = rng.normal(0, 0.09, (2, 5, 128)).astype(np.float32)
+    assert list(index.add(a)) == [0, 1, 2, 3, 4]
+    assert list(index.add(b)) == [5, 6, 7, 8, 9]
+    assert not index.trained
+    _, ids = index.search(b[2], k=1)
+    assert ids[0, 0] == 7
+
+
+def test_empty_index_returns_missing():
+    dists, ids = IVFIndex().search(np.zeros((2, 128), dtype=np.float32), k=2)
+    assert (ids == -1).all() and np.isinf(dists).all()
+
+
+def test_retrain_keeps_rows():
+    rng = np.random.default_rng(4)
+    data = rng.normal(0, 0.09, (300, 128)).astype(np.float32)
+    index = IVFIndex(n_lists=8, min_train_size=100)
+    index.add(data)
+    index.train(data[:200])
+    assert sum(b.n for b in index._state[1]) == 300
+    _, ids = index.search(data[250], k=1, n_probe=8)
+    assert ids[0, 0] == 250
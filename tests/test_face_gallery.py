@@ -0,0 +1,91 @@
+import threading
+
+import numpy as np
+
+from face_gallery import FaceGallery
+
+
+def people(n, rng, photos=1, spread=0.02):
+    """(names, encodings) for n people with `photos` noisy encodings each."""
+    centres = rng.normal(0, 0.09, (n, 128)).astype(np.float32)
+    encs = np.repeat(centres, photos, axis=0) + rng.normal(0, spread, (n * photos, 128)).astype(np.float32)
+    names = [f"p{i}" for i in range(n) for _ in range(photos)]
+    return names, encs.astype(np.float32), centres
+
+
+def test_indexed_matches_exact():
+    rng = np.random.default_rng(0)
+    names, encs, centres = people(400, rng, photos=3)
+    exact = FaceGallery.from_lists(encs, names, tolerance=0.6)
+    indexed = FaceGallery.from_lists(encs, names, tolerance=0.6)
+    indexed.enable_index(n_probe=64, min_train_size=500)
+    assert indexed._index.trained
+
+    probes = centres[:50] + rng.normal(0, 0.01, (50, 128)).astype(np.float32)
+    assert [m.name for m in indexed.best(probes)] == [m.name for m in exact.best(probes)]
+    for got, want in zip(indexed.match(probes, k=3), exact.match(probes, k=3)):
+        assert [m.name for m in got] == [m.name for m in want]
+        assert np.allclose([m.distance for m in got], [m.distance for m in want], atol=1e-5)
+
+
+def test_index_follows_add_and_remove():
+    rng = np.random.default_rng(1)
+    names, encs, centres = people(300, rng)
+    gallery = FaceGallery.from_lists(encs, names)
+    gallery.enable_index(n_probe=32, min_train_size=200)
+    new = rng.normal(0, 0.09, 128).astype(np.float32)
+    gallery.add("newcomer", new)
+    assert gallery.best(new)[0].name == "newcomer"
+    assert gallery.remove("p7") == 1
+    assert gallery.best(centres[7])[0].name is None
+    assert gallery.best(centres[8])[0].name == "p8"
+
+
+def test_background_index_build():
+    rng = np.random.default_rng(2)
+    names, encs, centres = people(600, rng)
+    gallery = FaceGallery.from_lists(encs, names)
+    gallery.enable_index(background=True, min_train_size=500)
+    for t in threading.enumerate():
+        if t.name == "gallery-index":
+            t.join()
+    assert gallery._index is not None and gallery._index.trained
+    assert gallery.best(centres[5])[0].name == "p5"
+
+
+def test_match_while_adding():
+    """Matching stays correct while another thread enrolls past the index's training size."""
+    rng = np.random.default_rng(3)
+    names, encs, centres = people(1000, rng)
+    gallery = FaceGallery.from_lists(encs, names)
+    gallery.enable_index(n_probe=16, min_train_size=1024)
+    extra = rng.normal(0, 0.09, (4000, 128)).astype(np.float32)
+    errors = []
+    done = threading.Event()
+
+    def add():
+        try:
+            for i, enc in enumerate(extra):
+                gallery.add(f"x{i}", enc)
+        except Exception as e:  # noqa: BLE001 - surfaced by the assert below
+            errors.append(e)
+        finally:
+            done.set()
+
+    def match():
+        try:
+            while not done.is_set():
+                for m in gallery.best(centres[:8]):
+                    assert m.name is not None
+                gallery.match(centres[:8], k=2)
+        except Exception as e:  # noqa: BLE001
+            errors.append(e)
+
+    threads = [threading.Thread(target=add)] + [threading.Thread(target=match) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors[:3]
+    assert len(gallery) == 5000 and gallery._index.trained
+    assert gallery.best(extra[123])[0].name == "x123"
@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+import pytest
+
+import gallery_store
+from gallery_store import GalleryStore, migrate_npy
+
+
+def rows(n, seed=0):
+    return np.random.default_rng(seed).normal(0, 0.09, (n, 128)).astype(np.float32)
+
+
+def sizes(store):
+    return [os.path.getsize(p) for p in (store.enc_path, store.labels_path, store.identities_path,
+                                         store.index_path)]
+
+
+def test_append_and_reopen(tmp_path):
+    store = GalleryStore(str(tmp_path))
+    store.append(["a", "b", "a"], rows(3), sources=["a.jpg", "b.jpg", "a2.jpg"])
+    store.append(["c"], rows(1, seed=1))
+    again = GalleryStore(str(tmp_path))
+    assert len(again) == 4
+    assert again.names == ["a", "b", "a", "c"]
+    assert again.identities == ["a", "b", "c"]
+    assert np.array_equal(again.encodings()[:3], rows(3))
+    assert [m["source"] for m in again.meta] == ["a.jpg", "b.jpg", "a2.jpg", None]
+
+
+def test_torn_tail_is_trimmed_on_reopen(tmp_path):
+    store = GalleryStore(str(tmp_path))
+    store.append(["a", "b"], rows(2))
+    clean = sizes(store)
+    # A crash mid-append: data and labels written, index line half written
+    with open(store.enc_path, "ab") as fh:
+        fh.write(rows(1, seed=2).tobytes()[:300])
+    with open(store.labels_path, "ab") as fh:
+        fh.write(b"\x02\x00")
+    with open(store.identities_path, "ab") as fh:
+        fh.write(b"torn\nhalf")
+    with open(store.index_path, "ab") as fh:
+        fh.write(b'{"name": "to')
+
+    reader = GalleryStore(str(tmp_path), repair=False)
+    assert len(reader) == 2 and reader.names == ["a", "b"]
+    assert sizes(reader) != clean  # readers never truncate
+
+    writer = GalleryStore(str(tmp_path))
+    assert len(writer) == 2 and writer.names == ["a", "b"]
+    assert sizes(writer) == clean
+    writer.append(["c"], rows(1, seed=3))
+    again = GalleryStore(str(tmp_path))
+    assert again.names == ["a", "b", "c"]
+    assert np.array_equal(again.encodings()[2], rows(1, seed=3)[0])
+
+
+def test_failed_append_is_rolled_back(tmp_path, monkeypatch):
+    store = GalleryStore(str(tmp_path))
+    store.append(["a"], rows(1))
+    before = sizes(store)
+    real = gallery_store._append
+
+    def no_space(path, data):
+        if path == store.identities_path:
+            raise OSError(28, "No space left on device")
+        real(path, data)
+
+    monkeypatch.setattr(gallery_store, "_append", no_space)
+    with pytest.raises(OSError):
+        store.append(["b", "c"], rows(2, seed=1))
+    assert sizes(store) == before and len(store) == 1
+    monkeypatch.setattr(gallery_store, "_append", real)
+
+    store.append(["c"], rows(1, seed=2))
+    again = GalleryStore(str(tmp_path))
+    assert again.names == ["a", "c"] and again.identities == ["a", "c"]
+    assert np.array_equal(again.encodings()[1], rows(1, seed=2)[0])
+
+
+def test_reader_refuses_to_append(tmp_path):
+    GalleryStore(str(tmp_path)).append(["a"], rows(1))
+    with pytest.raises(RuntimeError):
+        GalleryStore(str(tmp_path), repair=False).append(["b"], rows(1))
+
+
+def test_store_without_labels_file(tmp_path):
+    """Stores written before labels.i32 existed get their labels from index.jsonl."""
+    store = GalleryStore(str(tmp_path))
+    store.append(["a", "b", "a"], rows(3))
+    os.remove(store.labels_path)
+    os.remove(store.identities_path)
+    assert GalleryStore(str(tmp_path), repair=False).names == ["a", "b", "a"]
+    assert not os.path.exists(store.labels_path)
+    assert GalleryStore(str(tmp_path)).names == ["a", "b", "a"]
+    assert os.path.exists(store.labels_path)
+
+
+def test_names_must_be_single_lines(tmp_path):
+    with pytest.raises(ValueError):
+        GalleryStore(str(tmp_path)).append(["a\nb"], rows(1))
+
+
+def test_migrate_npy_once(tmp_path):
+    npy = tmp_path / "faces_data.npy"
+    np.save(npy, {"encodings": list(rows(2)), "names": ["a", "b"]}, allow_pickle=True)
+    store = GalleryStore(str(tmp_path / "store"))
+    assert migrate_npy(str(npy), store) == 2
+    assert migrate_npy(str(npy), store) == 0
+    assert GalleryStore(str(tmp_path / "store")).names == ["a", "b"]
@@ -0,0 +1,56 @@
+import numpy as np
+
+from result_cache import RecognitionCache, TTLCache
+
+
+def test_ttl_cache_bound_and_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("result_cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(max_entries=2, ttl=10.0)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.put("c", 3)
+    assert cache.get("a") is None and cache.evicted == 1
+    assert cache.get("b") == 2
+    now[0] += 11
+    assert cache.get("c") is None
+
+
+def test_match_calls_through_for_misses_only():
+    cache = RecognitionCache()
+    calls = []
+
+    def match_fn(encs, k):
+        calls.append(len(encs))
+        return [[("row", float(e[0]))] for e in encs]
+
+    encs = np.random.default_rng(0).normal(0, 0.09, (3, 128)).astype(np.float32)
+    first = cache.match(encs, 1, match_fn)
+    second = cache.match(encs, 1, match_fn)
+    assert first == second and calls == [3]
+    cache.invalidate()
+    cache.match(encs[:1], 1, match_fn)
+    assert calls == [3, 1]
+
+
+def test_out_of_range_encodings_are_never_cached():
+    cache = RecognitionCache()
+    wild = np.full(128, 50.0, dtype=np.float32)
+    assert cache.encoding_key(wild, 1) is None
+    assert cache.encoding_key(np.full(128, np.nan, dtype=np.float32), 1) is None
+    calls = []
+    for _ in range(2):
+        cache.match(wild[None, :], 1, lambda e, k: calls.append(1) or [[]])
+    assert len(calls) == 2
+
+
+def test_result_from_before_an_invalidation_is_not_stored():
+    cache = RecognitionCache()
+    enc = np.zeros((1, 128), dtype=np.float32)
+
+    def racing(encs, k):
+        cache.invalidate()  # an enrollment lands while this match runs
+        return [["stale"]]
+
+    cache.match(enc, 1, racing)
+    assert len(cache.encodings) == 0
@@ -0,0 +1,89 @@
+import importlib
+import io
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("face_recognition")
+pytest.importorskip("flask")
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    """server.py imported inside an empty working directory (its own store and uploads)."""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("server"))
+    try:
+        sys.modules.pop("server", None)
+        yield importlib.import_module("server")
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+
+def people(n, rng, prefix="p"):
+    return [f"{prefix}{i}" for i in range(n)], rng.normal(0, 0.09, (n, 128)).astype(np.float32)
+
+
+def test_match_while_importing(server, client):
+    """Batches committed by an import match at once, and matching never fails meanwhile."""
+    rng = np.random.default_rng(0)
+    names, encs = people(1000, rng)
+    server.enroll(names, encs)
+    more_names, more = people(2000, rng, prefix="q")
+    errors = []
+
+    def import_batches():
+        try:
+            for s in range(0, len(more), 64):   # bulk_import commits batches of 64 through enroll()
+                server.enroll(more_names[s:s + 64], more[s:s + 64])
+        except Exception as e:  # noqa: BLE001 - surfaced by the assert below
+            errors.append(e)
+
+    importer = threading.Thread(target=import_batches)
+    importer.start()
+    statuses = []
+    while importer.is_alive():
+        pick = rng.integers(0, len(encs), 8)
+        resp = client.post("/match", json={"encodings": encs[pick].tolist()})
+        statuses.append(resp.status_code)
+        if resp.status_code == 200:
+            assert [r["name"] for r in resp.get_json()["results"]] == [names[i] for i in pick]
+    importer.join()
+
+    assert not errors, errors
+    assert statuses and set(statuses) == {200}
+    assert server.gallery._index.trained and len(server.gallery) == 3000
+    resp = client.post("/match", json={"encodings": [more[1999].tolist()]})
+    assert resp.get_json()["results"][0]["name"] == "q1999"
+
+
+@pytest.mark.parametrize("body", [[1, 2], "x", 3, None])
+def test_match_rejects_non_object_json(client, body):
+    resp = client.post("/match", data=json.dumps(body), content_type="application/json")
+    assert resp.status_code == 400
+
+
+def test_recognize_cache_still_saves(server, client):
+    """A repeat upload with save=1 is persisted even if the same bytes were answered from cache."""
+    import cv2
+
+    ok, jpg = cv2.imencode(".jpg", np.full((64, 64, 3), 120, np.uint8))
+    data = jpg.tobytes()
+
+    def post(**form):
+        return client.post("/recognize", data={"file": (io.BytesIO(data), "f.jpg"), **form},
+                           content_type="multipart/form-data")
+
+    assert post().status_code == 200
+    assert not os.path.isdir(server.RECEIVED_FOLDER) or not os.listdir(server.RECEIVED_FOLDER)
+    assert post(save="1").status_code == 200
+    assert len(os.listdir(server.RECEIVED_FOLDER)) == 1
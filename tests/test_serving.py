@@ -0,0 +1,53 @@
+import threading
+
+import numpy as np
+
+from face_gallery import FaceGallery
+from serving import AdmissionControl, MatchBatcher
+
+
+def test_admission_control_rejects_over_limit():
+    gate = AdmissionControl(2)
+    assert gate.enter() and gate.enter()
+    assert not gate.enter() and gate.rejected == 1
+    gate.leave()
+    assert gate.enter() and gate.in_flight == 2
+
+
+def test_batcher_matches_like_the_gallery():
+    rng = np.random.default_rng(0)
+    encs = rng.normal(0, 0.09, (200, 128)).astype(np.float32)
+    gallery = FaceGallery.from_lists(encs, [f"p{i}" for i in range(200)])
+    batcher = MatchBatcher(lambda: gallery, max_wait=0.02)
+    probes = [encs[i * 10:i * 10 + 3] for i in range(8)]
+    ks = [1, 2, 3, 1, 2, 3, 1, 2]
+    results = [None] * 8
+
+    def ask(i):
+        results[i] = batcher.match(probes[i], ks[i])
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for i in range(8):
+        want = gallery.match(probes[i], k=ks[i])
+        assert [[m.name for m in row] for row in results[i]] == [[m.name for m in row] for row in want]
+        for got_row, want_row in zip(results[i], want):
+            assert np.allclose([m.distance for m in got_row], [m.distance for m in want_row], atol=1e-3)
+    assert batcher.batched_requests == 8 and batcher.batches < 8
+
+
+def test_batcher_passes_errors_to_every_caller():
+    class Broken:
+        def match(self, encs, k):
+            raise RuntimeError("boom")
+
+    batcher = MatchBatcher(Broken)
+    try:
+        batcher.match(np.zeros((1, 128)))
+    except RuntimeError as e:
+        assert str(e) == "boom"
+    else:
+        raise AssertionError("expected RuntimeError")
@@ -0,0 +1,205 @@
+# Kanan AI – offline voice commands (Vosk)
+# Microphone blocks pass an energy gate first: Vosk only decodes speech
+# segments (plus a short pre-roll so the first syllable is not lost), and a
+# segment is finalised when the speaker pauses. The recognizer is built with
+# a grammar of the supported command phrases, so it searches a few dozen
+# words instead of the full vocabulary. Recognised text is dispatched through
+# a table of (phrases -> handler) entries, checked in order.
+
+import collections
+import json
+import time
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+BLOCK_SIZE = 1600            # 100 ms blocks: the gate reacts quickly to start/end of speech
+FILLER_WORDS = ["kanan", "please", "take", "a", "and", "the", "what", "is", "my", "hey"]
+
+# Command name -> trigger phrases, in dispatch order (kanan_ai binds the handlers)
+COMMAND_PHRASES = {
+    "time": ["what time"],
+    "rebuild": ["rebuild"],
+    # IMPORTANT: no plain "battery" here, to avoid self-trigger!
+    "battery": ["battery status", "battery level", "what is my battery",
+                "whats my battery", "what's my battery", "power level"],
+    "picture": ["picture and name it", "picture name it", "picture named", "picture name"],
+    "objects_off": ["stop object recognition"],
+    "objects_on": ["start object recognition"],
+    "shutdown": ["shutdown", "exit"],
+}
+
+
+class EnergyVAD:
+    """RMS energy gate with an adaptive noise floor.
+
+    A block is speech when its RMS exceeds max(min_rms, noise_floor * ratio).
+    `hangover` seconds of quiet end a segment; `preroll` seconds before the
+    first loud block are replayed to the recognizer. A segment is cut after
+    `max_segment` seconds, and past `adapt_after` seconds the noise floor
+    creeps towards the current level, so a fan or TV that got louder cannot
+    hold the gate open forever.
+    """
+
+    def __init__(self, rate: int = SAMPLE_RATE, block: int = BLOCK_SIZE, min_rms: float = 300.0,
+                 ratio: float = 3.0, hangover: float = 0.6, preroll: float = 0.3,
+                 max_segment: float = 8.0, adapt_after: float = 3.0):
+        self.min_rms = min_rms
+        self.ratio = ratio
+        self.hangover_blocks = max(1, int(round(hangover * rate / block)))
+        self.max_blocks = max(1, int(round(max_segment * rate / block)))
+        self.adapt_blocks = max(1, int(round(adapt_after * rate / block)))
+        self._preroll = collections.deque(maxlen=max(1, int(round(preroll * rate / block))))
+        self.noise_floor = None
+        self.in_speech = False
+        self._quiet = 0
+        self._blocks = 0          # blocks in the current segment
+        self.forced = 0           # segments cut at max_segment
+
+    def rms(self, data: bytes) -> float:
+        samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+        return float(np.sqrt(np.mean(samples * samples))) if len(samples) else 0.0
+
+    def process(self, data: bytes):
+        """Returns (blocks to decode, segment_ended)."""
+        level = self.rms(data)
+        floor = self.noise_floor if self.noise_floor is not None else level
+        loud = level > max(self.min_rms, floor * self.ratio)
+        if not self.in_speech:
+            # Track background noise only while nobody is talking
+            self.noise_floor = level if self.noise_floor is None else 0.95 * self.noise_floor + 0.05 * level
+            if not loud:
+                self._preroll.append(data)
+                return [], False
+            self.in_speech = True
+            self._quiet = 0
+            self._blocks = 1
+            blocks = list(self._preroll) + [data]
+            self._preroll.clear()
+            return blocks, False
+        self._blocks += 1
+        if self._blocks > self.adapt_blocks:
+            # Nobody talks this long: let the floor follow slowly (speech itself barely moves it)
+            self.noise_floor = 0.98 * self.noise_floor + 0.02 * level
+        if self._blocks >= self.max_blocks:
+            self.in_speech = False
+            self.forced += 1
+            return [data], True
+        if loud:
+            self._quiet = 0
+            return [data], False
+        self._quiet += 1
+        if self._quiet >= self.hangover_blocks:
+            self.in_speech = False
+            return [data], True
+        return [data], False
+
+
+class CommandTable:
+    """Ordered (phrases -> handler) table; the first entry with a phrase in the text wins.
+
+    handler(arg) gets the text after the matched phrase ("" if none), so
+    "take a picture name it alice" with phrase "picture name it" passes "alice".
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def add(self, name: str, phrases, handler) -> None:
+        self.entries.append((name, [p.lower() for p in phrases], handler))
+
+    def phrases(self) -> list:
+        return [p for _, ps, _ in self.entries for p in ps]
+
+    def grammar(self, extra_words=()) -> str:
+        """Vosk grammar (JSON list) covering every command phrase."""
+        items = self.phrases() + FILLER_WORDS + [w.lower() for w in extra_words] + ["[unk]"]
+        return json.dumps(sorted(set(items)))
+
+    def match(self, text: str):
+        """(name, handler, arg) for the first matching entry, or None."""
+        text = text.lower()
+        for name, phrases, handler in self.entries:
+            for p in phrases:
+                i = text.find(p)
+                if i >= 0:
+                    return name, handler, text[i + len(p):].strip()
+        return None
+
+    def dispatch(self, text: str):
+        """Run the matching handler; returns the command name or None."""
+        hit = self.match(text)
+        if hit is None:
+            return None
+        name, handler, arg = hit
+        handler(arg)
+        return name
+
+
+class CommandListener:
+    """VAD-gated, grammar-constrained recognizer feeding a CommandTable.
+
+    model is a vosk.Model; recognizer_cls is vosk.KaldiRecognizer (passed in so
+    this module imports without vosk). listen_free(callback) decodes the next
+    speech segment with the full vocabulary, e.g. to capture a new name.
+    """
+
+    def __init__(self, model, recognizer_cls, table: CommandTable, rate: int = SAMPLE_RATE,
+                 vad: EnergyVAD = None, use_grammar: bool = True, extra_words=()):
+        self.model = model
+        self.recognizer_cls = recognizer_cls
+        self.table = table
+        self.rate = rate
+        self.vad = vad if vad is not None else EnergyVAD(rate)
+        self.use_grammar = use_grammar
+        self._free_callback = None
+        self.set_vocabulary(extra_words)
+        self.stats = {"audio_s": 0.0, "decoded_s": 0.0, "decode_cpu_s": 0.0,
+                      "segments": 0, "commands": 0, "unmatched": 0}
+
+    def set_vocabulary(self, extra_words=()) -> None:
+        """Rebuild the command recognizer, e.g. after new names were enrolled."""
+        if self.use_grammar:
+            self.rec = self.recognizer_cls(self.model, self.rate, self.table.grammar(extra_words))
+        else:
+            self.rec = self.recognizer_cls(self.model, self.rate)
+        self._free_rec = None
+
+    def listen_free(self, callback) -> None:
+        if self._free_rec is None:
+            self._free_rec = self.recognizer_cls(self.model, self.rate)
+        self._free_callback = callback
+
+    def feed(self, data: bytes):
+        """Process one audio block; returns the recognised text when a segment ends, else None."""
+        self.stats["audio_s"] += len(data) / 2 / self.rate
+        blocks, ended = self.vad.process(data)
+        if not blocks:
+            return None
+        rec = self._free_rec if self._free_callback is not None else self.rec
+        t = time.thread_time()
+        for b in blocks:
+            rec.AcceptWaveform(b)
+            self.stats["decoded_s"] += len(b) / 2 / self.rate
+        text = json.loads(rec.FinalResult()).get("text", "").strip().lower() if ended else None
+        self.stats["decode_cpu_s"] += time.thread_time() - t
+        if not ended:
+            return None
+        self.stats["segments"] += 1
+        text = text.replace("[unk]", "").strip()
+        if not text:
+            return None
+        if self._free_callback is not None:
+            callback, self._free_callback = self._free_callback, None
+            callback(text)
+        elif self.table.dispatch(text):
+            self.stats["commands"] += 1
+        else:
+            self.stats["unmatched"] += 1
+        return text
+
+    def report(self) -> str:
+        s = self.stats
+        rtf = s["decode_cpu_s"] / s["audio_s"] if s["audio_s"] else 0.0
+        return (f"voice: decoded {s['decoded_s']:.0f}/{s['audio_s']:.0f} s of audio, RTF {rtf:.3f}, "
+                f"{s['commands']} commands, {s['unmatched']} unmatched segments")